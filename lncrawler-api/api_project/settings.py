@@ -188,6 +188,92 @@ LNCRAWL_FULL_URL = SITE_URL.rstrip("/") + "/" + LNCRAWL_URL.rstrip("/") + "/"
 
 IMPORT_FOLDER_PATH = os.path.join(BASE_DIR.parent, 'imports')
 
+# Downloader search cache: identical queries (case and whitespace folded) reuse the
+# results of a previous search instead of crawling every source again
+DOWNLOADER_SEARCH_CACHE_TTL = int(os.environ.get("DOWNLOADER_SEARCH_CACHE_TTL", 3600))  # seconds
+DOWNLOADER_SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("DOWNLOADER_SEARCH_CACHE_MAX_ENTRIES", 500))
+
+# Downloads of the same novel are shared: a request made while a download is in flight
+# attaches to it, and a request made shortly after it completed reuses its output
+DOWNLOADER_DOWNLOAD_FRESHNESS = int(os.environ.get("DOWNLOADER_DOWNLOAD_FRESHNESS", 3600))  # seconds
+# Running jobs hold a lease renewed by their worker, a job whose lease expired is resumed
+DOWNLOADER_JOB_LEASE = int(os.environ.get("DOWNLOADER_JOB_LEASE", 120))  # seconds
+DOWNLOADER_MAX_RESUMES = int(os.environ.get("DOWNLOADER_MAX_RESUMES", 3))
+# A job that never got a lease and has not been updated for this long is considered dead
+DOWNLOADER_STALE_JOB_TIMEOUT = int(os.environ.get("DOWNLOADER_STALE_JOB_TIMEOUT", 600))  # seconds
+# Where downloads write their chapters: "files" (one json/NNNNN.json per chapter) or
+# "pack" (straight into the compressed json.zip store of the source, see utils/chapter_store.py)
+DOWNLOADER_CHAPTER_STORAGE = os.environ.get("DOWNLOADER_CHAPTER_STORAGE", "files")
+# Similarity (0 to 1) above which a downloaded novel is considered to be a library novel with another title,
+# its source is then added to that novel instead of creating a new one (see services/title_index.py)
+DOWNLOADER_TITLE_MATCH_THRESHOLD = float(os.environ.get("DOWNLOADER_TITLE_MATCH_THRESHOLD", 0.75))
+# Database connections the downloader jobs of one process may hold at once (3 per running job),
+# a job waits up to DOWNLOADER_DB_CONNECTION_TIMEOUT for free connections (see services/db_pool.py).
+# Keep the timeout below DOWNLOADER_STALE_JOB_TIMEOUT, a waiting job has no lease yet
+DOWNLOADER_DB_CONNECTIONS = int(os.environ.get("DOWNLOADER_DB_CONNECTIONS", 30))
+DOWNLOADER_DB_CONNECTION_TIMEOUT = int(os.environ.get("DOWNLOADER_DB_CONNECTION_TIMEOUT", 300))  # seconds
+# Job retention: finished jobs older than JOB_COMPACT_AFTER_DAYS have their search results moved to a
+# compressed archive, jobs older than JOB_RETENTION_DAYS are deleted (0 keeps them forever)
+JOB_COMPACT_AFTER_DAYS = int(os.environ.get("JOB_COMPACT_AFTER_DAYS", 7))
+JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", 180))
+
+# Chapter views are counted in memory and written every VIEW_COUNT_FLUSH_INTERVAL seconds, or sooner once
+# VIEW_COUNT_MAX_PENDING novels have views waiting (see services/view_counts.py). A worker that is killed
+# loses at most the views of its last interval, 0 writes every view with its request
+VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get("VIEW_COUNT_FLUSH_INTERVAL", 10))  # seconds
+VIEW_COUNT_MAX_PENDING = int(os.environ.get("VIEW_COUNT_MAX_PENDING", 1000))
+# While the database is unreachable the views stay in memory, up to this many novels, the others are dropped
+VIEW_COUNT_MAX_BUFFERED = int(os.environ.get("VIEW_COUNT_MAX_BUFFERED", 50000))
+# Above 1, the views of each novel are spread over this many rows and added to its counts by the
+# fold_view_shards task every minute, for novels read by so many workers that their count row is contended
+VIEW_COUNT_SHARDS = int(os.environ.get("VIEW_COUNT_SHARDS", 1))
+
+# Public documents of the novel and source detail pages (see services/public_documents.py), a new
+# version is stored whenever the novel changes, the lists of similar novels and reading lists expire after the TTL
+PAGE_CACHE_TTL = int(os.environ.get("PAGE_CACHE_TTL", 600))  # seconds
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", 5000))
+
+# Chapter navigation index of each source, kept in the memory of every worker (see services/chapter_index.py)
+# Rebuilt after each import of the source, CHAPTER_INDEX_TTL bounds the staleness of the other content changes
+CHAPTER_INDEX_TTL = int(os.environ.get("CHAPTER_INDEX_TTL", 300))  # seconds
+CHAPTER_INDEX_MAX_SOURCES = int(os.environ.get("CHAPTER_INDEX_MAX_SOURCES", 2000))
+
+# Auto refresh of ongoing novels: how many sources one run may check and how many at once
+AUTO_REFRESH_BUDGET = int(os.environ.get("AUTO_REFRESH_BUDGET", 20))
+AUTO_REFRESH_WORKERS = int(os.environ.get("AUTO_REFRESH_WORKERS", 3))
+
+# Seconds one scheduled run of refresh_ongoing_novels or retry_failed_chapters may take, kept below the
+# 30 minutes lock of the scheduled tasks so that no other worker starts the same task while it runs
+SCHEDULED_DOWNLOADS_TIME_BUDGET = int(os.environ.get("SCHEDULED_DOWNLOADS_TIME_BUDGET", 1500))
+
+# Retry of failed chapters: sources retried at the same time overall and per host (external source)
+CHAPTER_RETRY_WORKERS = int(os.environ.get("CHAPTER_RETRY_WORKERS", 4))
+CHAPTER_RETRY_PER_HOST = int(os.environ.get("CHAPTER_RETRY_PER_HOST", 1))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Database backed so that every gunicorn worker shares the same entries
+    # The table is created by `python manage.py createcachetable`
+    'downloader': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'lncrawler_downloader_cache',
+        'TIMEOUT': DOWNLOADER_SEARCH_CACHE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': DOWNLOADER_SEARCH_CACHE_MAX_ENTRIES,
+        },
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'lncrawler_page_cache',
+        'TIMEOUT': PAGE_CACHE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': PAGE_CACHE_MAX_ENTRIES,
+        },
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
@@ -1,18 +1,18 @@
 from django.contrib import admin
-from ..models import Job
+from ..models import Job, JobMetrics, SourceMetrics
 
 
 @admin.register(Job)
 class JobAdmin(admin.ModelAdmin):
     list_display = ("id", "status", "query", "created_at", "updated_at", "progress", "total_items")
-    list_filter = ("status", "created_at", "updated_at")
-    search_fields = ("query", "output_path", "error_message", "import_message")
-    readonly_fields = ("id", "created_at", "updated_at")
+    list_filter = ("status", "download_mode", "created_at", "updated_at", "compacted_at")
+    search_fields = ("query", "novel_url", "output_path", "error_message", "import_message")
+    readonly_fields = ("id", "created_at", "updated_at", "compacted_at")
 
     fieldsets = (
         (
             "Job Information",
-            {"fields": ("id", "status", "query", "created_at", "updated_at")},
+            {"fields": ("id", "status", "download_mode", "query", "novel_url", "created_at", "updated_at", "compacted_at")},
         ),
         ("Progress", {"fields": ("progress", "total_items")}),
         (
@@ -29,3 +29,53 @@ class JobAdmin(admin.ModelAdmin):
         ),
         ("Error Information", {"fields": ("error_message",)}),
     )
+
+    def get_queryset(self, request):
+        # The change list only shows the list fields, the results are loaded by the change form when needed
+        return super().get_queryset(request).defer("search_results", "selected_novel", "output_files")
+
+
+@admin.register(JobMetrics)
+class JobMetricsAdmin(admin.ModelAdmin):
+    list_display = (
+        "job",
+        "source_name",
+        "search_time",
+        "download_time",
+        "import_time",
+        "chapters",
+        "chapters_failed",
+        "chapters_empty",
+        "chapters_per_second",
+        "failed_requests",
+        "created_at",
+    )
+    list_filter = ("created_at",)
+    search_fields = ("source_name", "job__query", "job__novel_url")
+    raw_id_fields = ("job",)
+    readonly_fields = [field.name for field in JobMetrics._meta.fields] + ["chapters_per_second"]
+
+
+@admin.register(SourceMetrics)
+class SourceMetricsAdmin(admin.ModelAdmin):
+    list_display = (
+        "source_name",
+        "date",
+        "searches",
+        "search_failures",
+        "downloads",
+        "download_failures",
+        "chapters",
+        "chapters_failed",
+        "chapters_empty",
+        "requests",
+        "failed_requests",
+        "bytes_downloaded",
+        "chapter_retries",
+        "chapters_recovered",
+        "download_time",
+    )
+    list_filter = ("date",)
+    search_fields = ("source_name",)
+    date_hierarchy = "date"
+    readonly_fields = [field.name for field in SourceMetrics._meta.fields]
@@ -92,6 +92,9 @@ class NovelAdmin(admin.ModelAdmin):
         "sources_count",
         "view_count_display",
         "comment_count",
+        "rating_count",
+        "rating_avg",
+        "preferred_source",
     )
     inlines = [NovelFromSourceInline, NovelCommentInline, NovelReviewInline]
 
@@ -129,6 +129,14 @@ class SourceVoteAdmin(admin.ModelAdmin):
 
 @admin.register(ExternalSource)
 class ExternalSourceAdmin(admin.ModelAdmin):
-    list_display = ("source_name", "status")
-    search_fields = ("source_name",)
-    list_filter = ("status",)
\ No newline at end of file
+    list_display = ("source_name", "status", "availability", "avg_latency", "consecutive_failures", "last_probe_at")
+    search_fields = ("source_name", "base_url")
+    list_filter = ("status",)
+    readonly_fields = (
+        "avg_latency",
+        "latency_deviation",
+        "availability",
+        "consecutive_failures",
+        "last_probe_at",
+        "last_probe_error",
+    )
\ No newline at end of file
@@ -0,0 +1,154 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from lncrawler_api.models import Job, Novel, NovelFromSource, ExternalSource
+from lncrawler_api.services.downloader_service import DownloaderService
+from lncrawler_api.utils.fake_source import FakeNovelSite, register_fake_crawler
+import os
+import shutil
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the downloader end to end (search, download, import) against a local fake source '
+        'and reports chapters/s, import time and peak memory'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chapters',
+            type=int,
+            default=200,
+            help='Number of chapters of the fake novel',
+        )
+        parser.add_argument(
+            '--chapter-size',
+            type=int,
+            default=8000,
+            help='Size of each chapter in bytes',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.0,
+            help='Seconds the fake source waits before answering each request',
+        )
+        parser.add_argument(
+            '--storage',
+            choices=['files', 'pack'],
+            default=settings.DOWNLOADER_CHAPTER_STORAGE,
+            help='Chapter storage used by the download (see DOWNLOADER_CHAPTER_STORAGE)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=1800,
+            help='Seconds to wait for the download',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the imported novel, its files and the jobs instead of deleting them',
+        )
+
+    def handle(self, *args, **options):
+        chapters = options['chapters']
+        settings.DOWNLOADER_CHAPTER_STORAGE = options['storage']
+
+        try:
+            # Puts the crawler package on the path, the way the download process does
+            DownloaderService._import_python_api_bot()
+            from lncrawl.core.sources import prepare_crawler
+        except ImportError as e:
+            raise CommandError(f'The crawler package is not available: {e}')
+
+        site = FakeNovelSite(
+            chapters=chapters,
+            chapter_size=options['chapter_size'],
+            latency=options['latency'],
+        )
+        with site:
+            register_fake_crawler(site)
+            self.stdout.write(
+                f'Fake source at {site.url}: {chapters} chapters of {options["chapter_size"]} bytes, '
+                f'{options["latency"] * 1000:.0f} ms latency, {options["storage"]} storage'
+            )
+
+            # Search, restricted to the fake source
+            search_job = Job.objects.create(status=Job.STATUS_SEARCHING, query=site.title)
+            start = time.monotonic()
+            DownloaderService._run_source_search(search_job, site.title, [site.url], prepare_crawler)
+            search_time = time.monotonic() - start
+
+            search_job.refresh_from_db()
+            results = (search_job.search_results or {}).get('results') or []
+            if not results:
+                raise CommandError('The search did not find the fake novel')
+            novel_url = results[0]['sources'][0]['url']
+
+            # Download, the service imports the novel into the database once it is downloaded
+            start = time.monotonic()
+            response = DownloaderService.start_direct_download(novel_url, reuse_recent=False)
+            if response['status'] != 'success':
+                raise CommandError(f'Could not start the download: {response.get("message")}')
+            download_job = DownloaderService.wait_for_download(
+                response['job_id'], timeout=options['timeout'], poll_interval=0.2
+            )
+            download_time = time.monotonic() - start
+            download_rss = peak_rss_mb()
+
+            if download_job is None or download_job.status != Job.STATUS_DOWNLOAD_COMPLETED:
+                raise CommandError(
+                    f'The download did not complete: {download_job.error_message if download_job else "timed out"}'
+                )
+
+            # Import again from scratch to time from_meta_json on its own
+            source = NovelFromSource.objects.select_related('novel').get(source_url=download_job.selected_novel['url'])
+            novel = source.novel
+            source.delete()
+            start = time.monotonic()
+            source = NovelFromSource.from_meta_json(os.path.join(download_job.output_path, 'meta.json'))
+            import_time = time.monotonic() - start
+            import_rss = peak_rss_mb()
+
+        imported_chapters = source.chapters.count()
+        with_content = source.chapters.filter(has_content=True).count()
+
+        if not options['keep']:
+            external_source = source.external_source
+            source.delete()
+            if not novel.sources.exists():
+                Novel.objects.filter(pk=novel.pk).delete()
+            if not external_source.novels.exists():
+                ExternalSource.objects.filter(pk=external_source.pk).delete()
+            shutil.rmtree(download_job.output_path, ignore_errors=True)
+            Job.objects.filter(id__in=[search_job.id, download_job.id]).delete()
+
+        self.stdout.write(f'Search: {search_time:.2f}s')
+        self.stdout.write(
+            f'Download and import: {download_time:.2f}s, {chapters / download_time:.1f} chapters/s '
+            f'({site.requests} requests served)'
+        )
+        self.stdout.write(
+            f'Import (from_meta_json): {import_time:.2f}s, {imported_chapters / max(import_time, 1e-6):.0f} chapters/s, '
+            f'{with_content}/{imported_chapters} chapters with content'
+        )
+        if download_rss is not None:
+            self.stdout.write(f'Peak RSS: {download_rss:.0f} MB after the download, {import_rss:.0f} MB after the import')
+
+        style = self.style.SUCCESS if with_content == chapters else self.style.WARNING
+        self.stdout.write(
+            style(f'Benchmark completed: {chapters} chapters in {search_time + download_time + import_time:.2f}s')
+        )
@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connection
+from lncrawler_api.models import Novel, NovelViewCount, NovelViewShard, WeeklyNovelView
+from lncrawler_api.services.novel_cards import current_year_week
+from lncrawler_api.services.view_counts import add_views, fold_shards
+import threading
+import time
+import uuid
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test of the view counts of a single novel: concurrent readers add views as fast as they can, '
+        'with and without sharded counts (VIEW_COUNT_SHARDS), and the views/s are reported per number of readers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--readers',
+            default='1,2,4,8,16',
+            help='Comma separated numbers of concurrent readers to measure',
+        )
+        parser.add_argument(
+            '--seconds',
+            type=float,
+            default=3.0,
+            help='Duration of each measure',
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=16,
+            help='Number of shards of the sharded measures',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            readers = [int(value) for value in options['readers'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError('--readers must be a comma separated list of numbers')
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite allows a single writer at a time, the results only mean something on PostgreSQL'
+            ))
+
+        novel = Novel.objects.create(title='View count benchmark', slug=f'view-count-benchmark-{uuid.uuid4().hex[:8]}')
+        shards_setting = settings.VIEW_COUNT_SHARDS
+        try:
+            self.stdout.write(f'{"readers":>8} {"unsharded views/s":>18} {"sharded views/s":>16} {"errors":>7}')
+            for count in readers:
+                rates = []
+                errors = 0
+                for shards in (1, options['shards']):
+                    settings.VIEW_COUNT_SHARDS = shards
+                    views, failed = self.measure(novel, count, options['seconds'])
+                    errors += failed
+                    rates.append(views / options['seconds'])
+                self.stdout.write(f'{count:>8} {rates[0]:>18.0f} {rates[1]:>16.0f} {errors:>7}')
+
+            # Every view written must be in the counts once the shards are folded
+            fold_shards()
+            total = NovelViewCount.objects.get(novel=novel).views
+            weekly = WeeklyNovelView.objects.get(novel=novel, year_week=current_year_week()).views
+            if total != weekly:
+                raise CommandError(f'The all-time count ({total}) and the weekly count ({weekly}) differ')
+            self.stdout.write(self.style.SUCCESS(f'{total} views counted, none lost'))
+        finally:
+            settings.VIEW_COUNT_SHARDS = shards_setting
+            NovelViewShard.objects.filter(novel=novel).delete()
+            novel.delete()
+
+    def measure(self, novel, readers, seconds):
+        """Add views from readers threads for seconds, returns the number of views added and of failures"""
+        year_week = current_year_week()
+        counts = [0] * readers
+        failures = [0] * readers
+        start = threading.Barrier(readers + 1)
+        deadline = []
+
+        def read(index):
+            start.wait()
+            try:
+                while time.monotonic() < deadline[0]:
+                    try:
+                        add_views({novel.id: 1}, {(novel.id, year_week): 1})
+                        counts[index] += 1
+                    except Exception:
+                        failures[index] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=read, args=(index,)) for index in range(readers)]
+        for thread in threads:
+            thread.start()
+        deadline.append(time.monotonic() + seconds)
+        start.wait()
+        for thread in threads:
+            thread.join()
+        return sum(counts), sum(failures)
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.utils import timezone
+from datetime import timedelta
+from lncrawler_api.models import Job, JobArchive
+import time
+
+
+class Command(BaseCommand):
+    help = 'Applies the job retention policy: compacts old finished jobs and deletes the expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.JOB_COMPACT_AFTER_DAYS,
+            help='Compact the finished jobs created more than this many days ago',
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=settings.JOB_RETENTION_DAYS,
+            help='Delete the finished jobs created more than this many days ago (0 keeps them forever)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of jobs compacted per batch',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many jobs would be compacted and deleted without changing them',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = max(1, options['batch_size'])
+        finished = [Job.STATUS_SEARCH_COMPLETED, Job.STATUS_DOWNLOAD_COMPLETED, Job.STATUS_FAILED]
+
+        to_compact = Job.objects.filter(
+            status__in=finished,
+            compacted_at__isnull=True,
+            created_at__lt=now - timedelta(days=options['days']),
+        )
+        to_delete = Job.objects.none()
+        if options['retention_days'] > 0:
+            to_delete = Job.objects.filter(
+                status__in=finished,
+                created_at__lt=now - timedelta(days=options['retention_days']),
+            )
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Would compact {to_compact.count()} jobs and delete {to_delete.count()} jobs'
+                )
+            )
+            return
+
+        start_time = time.time()
+
+        # Expired jobs are deleted first so they are not compacted for nothing
+        deleted = 0
+        if options['retention_days'] > 0:
+            while True:
+                ids = list(to_delete.values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                Job.objects.filter(id__in=ids).delete()
+                deleted += len(ids)
+
+        compacted = 0
+        failed_ids = []
+        while True:
+            # Only the fields compact() needs, the finished jobs are not touched by the workers anymore
+            jobs = list(
+                to_compact.exclude(id__in=failed_ids).only('id', 'search_results', 'compacted_at')[:batch_size]
+            )
+            if not jobs:
+                break
+            for job in jobs:
+                try:
+                    job.compact()
+                    compacted += 1
+                except Exception as e:
+                    failed_ids.append(job.id)
+                    self.stderr.write(f'Error compacting job {job.id}: {e}')
+
+        elapsed = time.time() - start_time
+        archives = JobArchive.objects.aggregate(stored=Sum('original_size'), count=Count('job'))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Compacted {compacted} jobs and deleted {deleted} jobs in {elapsed:.1f} seconds '
+                f'({archives["count"] or 0} archives holding {(archives["stored"] or 0) / 1024 / 1024:.1f} MB of results)'
+            )
+        )
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from lncrawler_api.models import Novel, WeeklyNovelView
-from lncrawler_api.utils import chapter_utils
+from lncrawler_api.utils import chapter_utils, chapter_store
 from pathlib import Path
 from datetime import datetime
 import time
@@ -107,6 +107,8 @@ class Command(BaseCommand):
                             )
                     elif compressed_file_path.exists():
                         self.stdout.write(f'    Source {source.external_source.source_name} already compressed')
+                    elif chapter_store.store_path(source_path).exists():
+                        self.stdout.write(f'    Source {source.external_source.source_name} is stored in the chapter store')
                     else:
                         self.stdout.write(f'    No json folder found for {source.external_source.source_name}')
         
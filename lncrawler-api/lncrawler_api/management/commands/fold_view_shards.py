@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from lncrawler_api.services.view_counts import fold_shards
+
+
+class Command(BaseCommand):
+    help = 'Adds the views of the view count shards (VIEW_COUNT_SHARDS) to the view counts of the novels'
+
+    def handle(self, *args, **options):
+        views = fold_shards()
+        self.stdout.write(self.style.SUCCESS(f'Folded {views} views.'))
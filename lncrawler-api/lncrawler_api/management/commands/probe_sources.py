@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from lncrawler_api.models import ExternalSource
+from lncrawler_api.services import source_probe
+import time
+
+
+class Command(BaseCommand):
+    help = 'Measures the availability and latency of every external source and updates their health stats'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=10,
+            help='Number of sources probed at the same time',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=source_probe.PROBE_TIMEOUT,
+            help='Seconds before a probe counts as failed',
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            help='Only probe this external source (source name)',
+        )
+
+    def handle(self, *args, **options):
+        sources = ExternalSource.objects.all()
+        if options['source']:
+            sources = sources.filter(source_name=options['source'])
+
+        start_time = time.time()
+        results = source_probe.probe_sources(list(sources), workers=options['workers'], timeout=options['timeout'])
+
+        for source, ok, latency, error in results:
+            if ok:
+                self.stdout.write(
+                    f'{source.source_name}: {latency * 1000:.0f} ms '
+                    f'(avg {source.avg_latency * 1000:.0f} ms, search timeout {source.search_timeout:.0f}s)'
+                )
+            else:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'{source.source_name}: failed ({error}), {source.consecutive_failures} failures in a row'
+                        f'{" - marked dead" if source.status == "dead" else ""}'
+                    )
+                )
+
+        elapsed = time.time() - start_time
+        alive = sum(1 for source, *_ in results if source.status == 'alive')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Probed {len(results)} sources in {elapsed:.1f} seconds: {alive} alive, {len(results) - alive} dead'
+            )
+        )
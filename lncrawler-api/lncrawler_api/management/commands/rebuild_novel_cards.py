@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from lncrawler_api.services import novel_cards
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the cards read by the novel list endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of novels whose cards are built per batch',
+        )
+        parser.add_argument(
+            '--stale',
+            action='store_true',
+            help='Only build the missing and outdated cards and reset the weekly views of the past weeks',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        if options['stale']:
+            built, rolled_over = novel_cards.refresh_stale_cards(batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'Built {built} missing or outdated cards, reset the weekly views of {rolled_over} cards.'
+            ))
+            return
+        built = novel_cards.rebuild_all_cards(batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {built} novel cards.'))
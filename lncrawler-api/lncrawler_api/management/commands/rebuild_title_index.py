@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from lncrawler_api.services import title_index
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the normalised-title index used to match downloads with the library novels'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of novels indexed per batch',
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        indexed = title_index.rebuild_index(batch_size=max(1, options['batch_size']))
+        elapsed = time.time() - start_time
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed the titles of {indexed} novels in {elapsed:.1f} seconds')
+        )
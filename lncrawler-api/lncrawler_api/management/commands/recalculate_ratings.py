@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from lncrawler_api.models import Novel, NovelRating
+from lncrawler_api.services.novel_cards import refresh_counters
+
+
+class Command(BaseCommand):
+    help = 'Reconciles the rating aggregates stored on the novels with their ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of novels updated per query',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the novels whose aggregates are wrong without fixing them',
+        )
+
+    def handle(self, *args, **options):
+        ratings = NovelRating.objects.filter(novel=OuterRef('pk')).order_by().values('novel')
+        rating_sum = Coalesce(Subquery(ratings.annotate(value=Sum('rating')).values('value')), Value(0))
+        rating_count = Coalesce(Subquery(ratings.annotate(value=Count('pk')).values('value')), Value(0))
+        rating_avg = Coalesce(Subquery(ratings.annotate(value=Avg('rating')).values('value')), Value(0.0))
+
+        drifted = Novel.objects.annotate(actual_sum=rating_sum, actual_count=rating_count).exclude(
+            rating_sum=F('actual_sum'), rating_count=F('actual_count')
+        )
+        novel_ids = list(drifted.values_list('id', flat=True))
+
+        if options['dry_run']:
+            for novel in drifted.only('title', 'rating_sum', 'rating_count'):
+                self.stdout.write(
+                    f'"{novel.title}": stored {novel.rating_sum}/{novel.rating_count}, '
+                    f'actual {novel.actual_sum}/{novel.actual_count}'
+                )
+            self.stdout.write(self.style.SUCCESS(f'{len(novel_ids)} novels have wrong rating aggregates'))
+            return
+
+        batch_size = max(1, options['batch_size'])
+        for start in range(0, len(novel_ids), batch_size):
+            batch = novel_ids[start:start + batch_size]
+            Novel.objects.filter(id__in=batch).update(
+                rating_sum=rating_sum, rating_count=rating_count, rating_avg=rating_avg
+            )
+            refresh_counters(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Rating recalculation complete. Updated {len(novel_ids)} novels.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from lncrawler_api.models import Job
+from lncrawler_api.services import DownloaderService
+from lncrawler_api.services.job_lease import expired_lease_filter
+
+
+class Command(BaseCommand):
+    help = 'Resumes the searches and downloads whose worker died (expired lease)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the jobs that would be resumed without resuming them',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            dead_jobs = Job.objects.filter(
+                expired_lease_filter(),
+                status__in=[Job.STATUS_CREATED, Job.STATUS_SEARCHING, Job.STATUS_DOWNLOADING],
+            )
+            for job in dead_jobs:
+                self.stdout.write(
+                    f'Would resume: {job} ({job.query}) - resumed {job.resume_count} times, '
+                    f'lease expired at {job.lease_expires_at}'
+                )
+            self.stdout.write(self.style.SUCCESS(f'Found {len(dead_jobs)} jobs to resume'))
+            return
+
+        resumed = DownloaderService.recover_jobs()
+        self.stdout.write(self.style.SUCCESS(f'Resumed {resumed} jobs'))
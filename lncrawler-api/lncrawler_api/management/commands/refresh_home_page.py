@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from lncrawler_api.services.home_page import refresh_home_page
+
+
+class Command(BaseCommand):
+    help = 'Serializes the home page for an anonymous visitor and stores it as the snapshot served by the home endpoint'
+
+    def handle(self, *args, **options):
+        data = refresh_home_page()
+        self.stdout.write(self.style.SUCCESS(f'Home page snapshot refreshed ({len(data)} bytes).'))
@@ -0,0 +1,142 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from lncrawler_api.models import NovelFromSource, Job
+from lncrawler_api.services.downloader_service import DownloaderService
+import time
+
+
+class Command(BaseCommand):
+    help = 'Downloads the new chapters of ongoing novels whose refresh is due'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget',
+            type=int,
+            default=settings.AUTO_REFRESH_BUDGET,
+            help='Maximum number of sources to check in this run',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.AUTO_REFRESH_WORKERS,
+            help='Number of sources checked at the same time',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=1200,
+            help='Seconds to wait for the update of a single source',
+        )
+        parser.add_argument(
+            '--time-budget',
+            type=int,
+            default=settings.SCHEDULED_DOWNLOADS_TIME_BUDGET,
+            help='Seconds this run may take, the sources not refreshed in time are left for the next run',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show which sources are due without downloading anything',
+        )
+
+    def handle(self, *args, **options):
+        budget = options['budget']
+        workers = max(1, options['workers'])
+        timeout = options['timeout']
+        deadline = time.monotonic() + options['time_budget']
+        dry_run = options['dry_run']
+
+        # Sources that were never refreshed come first, then the most overdue ones
+        due_sources = list(
+            NovelFromSource.objects.filter(status__iexact='Ongoing')
+            .filter(Q(next_refresh_at__isnull=True) | Q(next_refresh_at__lte=timezone.now()))
+            .select_related('external_source')
+            .order_by(F('next_refresh_at').asc(nulls_first=True))[:budget]
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'Found {len(due_sources)} ongoing sources due for a refresh'))
+
+        if dry_run:
+            for source in due_sources:
+                self.stdout.write(
+                    f'Would refresh: {source.title} ({source.external_source.source_name}) - '
+                    f'interval {source.refresh_interval}s'
+                )
+            return
+
+        start_time = time.time()
+        updated = 0
+        failed = 0
+        skipped = 0
+        new_chapters_total = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.refresh_source, source, timeout, deadline): source for source in due_sources}
+            for future in as_completed(futures):
+                source = futures[future]
+                new_chapters = future.result()
+                if new_chapters is self.SKIPPED:
+                    skipped += 1
+                    continue
+                if new_chapters is None:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'Failed to refresh {source.title} ({source.external_source.source_name})'))
+                    continue
+
+                updated += 1
+                new_chapters_total += new_chapters
+                self.stdout.write(
+                    f'{source.title} ({source.external_source.source_name}): {new_chapters} new chapters, '
+                    f'next refresh in {source.refresh_interval}s'
+                )
+
+        elapsed = time.time() - start_time
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Refreshed {updated} sources in {elapsed:.1f} seconds ({failed} failed, '
+                f'{skipped} left for the next run).\n'
+                f'New chapters: {new_chapters_total}'
+            )
+        )
+
+    # Returned by refresh_source for a source left due because the time budget of the run ran out
+    SKIPPED = 'skipped'
+
+    def refresh_source(self, source, timeout, deadline):
+        """
+        Run an incremental download of the source and schedule its next refresh
+        Returns the number of new chapters, None if the refresh failed, or SKIPPED if the
+        deadline (time.monotonic()) of the run came first
+        """
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self.SKIPPED
+
+            chapters_before = source.chapters.filter(has_content=True).count()
+
+            result = DownloaderService.start_direct_download(source.source_url, update_only=True)
+            job = None
+            if result['status'] == 'success':
+                job = DownloaderService.wait_for_download(result['job_id'], timeout=min(timeout, remaining))
+                if job is None and remaining < timeout:
+                    # The download goes on without us, the next run joins it or sees its chapters
+                    return self.SKIPPED
+
+            if job is None or job.status != Job.STATUS_DOWNLOAD_COMPLETED:
+                source.schedule_next_refresh(None)
+                return None
+
+            new_chapters = max(0, source.chapters.filter(has_content=True).count() - chapters_before)
+            source.schedule_next_refresh(new_chapters)
+            return new_chapters
+        except Exception as e:
+            self.stderr.write(f'Error refreshing {source.title}: {e}')
+            return None
+        finally:
+            # Each worker thread opens its own database connection
+            connection.close()
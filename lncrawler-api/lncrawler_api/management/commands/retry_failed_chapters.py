@@ -0,0 +1,201 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict
+from lncrawler_api.models import NovelFromSource, Chapter, Job
+from lncrawler_api.services.crawler_metrics import record_chapter_retry
+from lncrawler_api.services.downloader_service import DownloaderService
+from lncrawler_api.utils import chapter_utils
+import time
+
+
+class Command(BaseCommand):
+    help = 'Downloads again the chapters that failed to download (has_content=False), grouped by source'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget',
+            type=int,
+            default=50,
+            help='Maximum number of sources to retry in this run',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.CHAPTER_RETRY_WORKERS,
+            help='Number of sources retried at the same time',
+        )
+        parser.add_argument(
+            '--per-host',
+            type=int,
+            default=settings.CHAPTER_RETRY_PER_HOST,
+            help='Number of sources of the same external source retried at the same time',
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            help='Only retry the novels of this external source (source name)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=1200,
+            help='Seconds to wait for the retry of a single source',
+        )
+        parser.add_argument(
+            '--time-budget',
+            type=int,
+            default=settings.SCHEDULED_DOWNLOADS_TIME_BUDGET,
+            help='Seconds this run may take, the sources not retried in time are left for the next run',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the sources with failed chapters without retrying them',
+        )
+
+    def handle(self, *args, **options):
+        budget = options['budget']
+        workers = max(1, options['workers'])
+        per_host = max(1, options['per_host'])
+        timeout = options['timeout']
+        deadline = time.monotonic() + options['time_budget']
+        dry_run = options['dry_run']
+
+        # Sources with failed chapters whose retry is due, dead external sources are skipped
+        sources_query = (
+            NovelFromSource.objects.annotate(failed_count=Count('chapters', filter=Q(chapters__has_content=False)))
+            .filter(failed_count__gt=0)
+            .exclude(external_source__status='dead')
+            .filter(Q(next_chapter_retry_at__isnull=True) | Q(next_chapter_retry_at__lte=timezone.now()))
+            .select_related('external_source')
+            .order_by(F('next_chapter_retry_at').asc(nulls_first=True), '-failed_count')
+        )
+        if options['source']:
+            sources_query = sources_query.filter(external_source__source_name=options['source'])
+        sources = list(sources_query[:budget])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Found {len(sources)} sources with {sum(s.failed_count for s in sources)} failed chapters to retry'
+            )
+        )
+
+        if dry_run:
+            for source in sources:
+                self.stdout.write(
+                    f'Would retry: {source.title} ({source.external_source.source_name}) - '
+                    f'{source.failed_count} failed chapters, retried {source.chapter_retry_count} times'
+                )
+            return
+
+        lanes = self.split_lanes(sources, per_host)
+
+        start_time = time.time()
+        report = defaultdict(lambda: {'sources': 0, 'recovered': 0, 'still_failing': 0})
+        retried = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.retry_lane, lane, timeout, deadline) for lane in lanes]
+            for future in as_completed(futures):
+                for source, recovered, still_failing in future.result():
+                    retried += 1
+                    entry = report[source.external_source.source_name]
+                    entry['sources'] += 1
+                    entry['recovered'] += recovered
+                    entry['still_failing'] += still_failing
+                    self.stdout.write(
+                        f'{source.title} ({source.external_source.source_name}): '
+                        f'{recovered} recovered, {still_failing} still failing'
+                    )
+
+        # Report per external source
+        elapsed = time.time() - start_time
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Retried {retried} sources in {elapsed:.1f} seconds '
+                f'({len(sources) - retried} left for the next run)'
+            )
+        )
+        for source_name, entry in sorted(report.items()):
+            style = self.style.SUCCESS if entry['still_failing'] == 0 else self.style.WARNING
+            self.stdout.write(
+                style(
+                    f'{source_name}: {entry["recovered"]} recovered, {entry["still_failing"]} still failing '
+                    f'({entry["sources"]} novels)'
+                )
+            )
+
+    @staticmethod
+    def split_lanes(sources, per_host):
+        """
+        Split the sources of each host (external source) in at most per_host lanes,
+        each lane is retried sequentially
+        """
+        by_host = defaultdict(list)
+        for source in sources:
+            by_host[source.external_source.source_name].append(source)
+        lanes = []
+        for host_sources in by_host.values():
+            lanes.extend(host_sources[i::per_host] for i in range(min(per_host, len(host_sources))))
+        return lanes
+
+    def retry_lane(self, sources, timeout, deadline):
+        """Retry the sources of the lane until the deadline (time.monotonic()) of the run"""
+        try:
+            results = []
+            for source in sources:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # The other sources of the lane stay due for the next run
+                    break
+                results.append(self.retry_source(source, min(timeout, remaining)))
+            return results
+        finally:
+            # Each worker thread opens its own database connection
+            connection.close()
+
+    def retry_source(self, source, timeout):
+        """
+        Download the failed chapters of the source again and update them in bulk
+        Returns (source, recovered, still_failing)
+        """
+        failed_chapters = list(source.chapters.filter(has_content=False).only('id', 'chapter_id', 'has_content', 'word_count'))
+
+        try:
+            # A recent download of this source already had its chance, always start a new one
+            result = DownloaderService.start_direct_download(source.source_url, update_only=True, reuse_recent=False)
+            if result['status'] == 'success':
+                job = DownloaderService.wait_for_download(result['job_id'], timeout=timeout)
+                if job is None or job.status != Job.STATUS_DOWNLOAD_COMPLETED:
+                    self.stderr.write(f'Retry download of {source.title} did not complete')
+            else:
+                self.stderr.write(f'Could not start the retry of {source.title}: {result.get("message")}')
+        except Exception as e:
+            self.stderr.write(f'Error retrying {source.title}: {e}')
+
+        # Check the chapters on disk even if the download failed, part of them may have been fetched
+        source_path = source.absolute_source_path
+        recovered = []
+        for chapter in failed_chapters:
+            if not chapter_utils.check_chapter_has_content(source_path, chapter.chapter_id):
+                continue
+            chapter_data = chapter_utils.get_chapter(source_path, chapter.chapter_id) or {}
+            body = chapter_data.get('body') or ''
+            chapter.has_content = True
+            chapter.word_count = body.count(' ')
+            recovered.append(chapter)
+
+        if recovered:
+            Chapter.objects.bulk_update(recovered, ['has_content', 'word_count'], batch_size=500)
+            # New chapters to read: rebuilds the chapter index and the card of the source
+            source.last_chapter_update = timezone.now()
+            source.save(update_fields=['last_chapter_update'])
+
+        still_failing = len(failed_chapters) - len(recovered)
+        source.schedule_chapter_retry(still_failing)
+        record_chapter_retry(source.source_url, len(failed_chapters), len(recovered))
+        return source, len(recovered), still_failing
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0038_scheduledtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='novel_url',
+            field=models.CharField(blank=True, db_index=True, max_length=512, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'downloading')), fields=('novel_url',), name='unique_in_flight_download_per_novel_url'),
+        ),
+    ]
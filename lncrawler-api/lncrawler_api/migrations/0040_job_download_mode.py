@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0039_job_novel_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='download_mode',
+            field=models.CharField(choices=[('full', 'Full download'), ('update', 'Update only new chapters')], default='full', max_length=10),
+        ),
+    ]
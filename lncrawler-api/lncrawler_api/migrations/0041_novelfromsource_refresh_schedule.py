@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0040_job_download_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novelfromsource',
+            name='last_refresh_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='novelfromsource',
+            name='next_refresh_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='novelfromsource',
+            name='refresh_interval',
+            field=models.IntegerField(default=86400),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0042_job_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novelfromsource',
+            name='chapter_retry_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='novelfromsource',
+            name='next_chapter_retry_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0043_novelfromsource_chapter_retry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='externalsource',
+            name='availability',
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.AddField(
+            model_name='externalsource',
+            name='avg_latency',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='externalsource',
+            name='base_url',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='externalsource',
+            name='consecutive_failures',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='externalsource',
+            name='last_probe_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='externalsource',
+            name='last_probe_error',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='externalsource',
+            name='latency_deviation',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
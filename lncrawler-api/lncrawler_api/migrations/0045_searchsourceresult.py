@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0044_externalsource_health'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchSourceResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_url', models.CharField(max_length=512)),
+                ('results', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='source_results', to='lncrawler_api.job')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'id'], name='lncrawler_a_job_id_54116b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 23:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from lncrawler_api.services import title_index
+
+
+def index_novel_titles(apps, schema_editor):
+    """
+    Index the titles of the existing novels
+    """
+    title_index.rebuild_index(
+        novel_model=apps.get_model('lncrawler_api', 'Novel'),
+        bucket_model=apps.get_model('lncrawler_api', 'NovelTitleBucket'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0047_job_cancel_requested'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NovelTitleBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True)),
+                ('novel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='title_buckets', to='lncrawler_api.novel')),
+            ],
+        ),
+        migrations.RunPython(index_novel_titles, migrations.RunPython.noop),
+    ]
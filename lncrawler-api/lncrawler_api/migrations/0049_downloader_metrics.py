@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0048_noveltitlebucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobMetrics',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metrics', serialize=False, to='lncrawler_api.job')),
+                ('source_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('search_time', models.FloatField(default=0)),
+                ('download_time', models.FloatField(default=0)),
+                ('import_time', models.FloatField(default=0)),
+                ('chapters', models.IntegerField(default=0)),
+                ('chapters_failed', models.IntegerField(default=0)),
+                ('chapters_empty', models.IntegerField(default=0)),
+                ('requests', models.IntegerField(default=0)),
+                ('failed_requests', models.IntegerField(default=0)),
+                ('bytes_downloaded', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SourceMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('searches', models.IntegerField(default=0)),
+                ('search_failures', models.IntegerField(default=0)),
+                ('search_time', models.FloatField(default=0)),
+                ('downloads', models.IntegerField(default=0)),
+                ('download_failures', models.IntegerField(default=0)),
+                ('download_time', models.FloatField(default=0)),
+                ('import_time', models.FloatField(default=0)),
+                ('chapters', models.IntegerField(default=0)),
+                ('chapters_failed', models.IntegerField(default=0)),
+                ('chapters_empty', models.IntegerField(default=0)),
+                ('requests', models.IntegerField(default=0)),
+                ('failed_requests', models.IntegerField(default=0)),
+                ('bytes_downloaded', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'source metrics',
+                'ordering': ['-date', 'source_name'],
+                'unique_together': {('source_name', 'date')},
+            },
+        ),
+    ]
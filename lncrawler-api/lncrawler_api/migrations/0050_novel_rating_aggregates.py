@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:29
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    """
+    Compute the rating aggregates of the existing novels
+    """
+    Novel = apps.get_model('lncrawler_api', 'Novel')
+    NovelRating = apps.get_model('lncrawler_api', 'NovelRating')
+    ratings = NovelRating.objects.filter(novel=OuterRef('pk')).order_by().values('novel')
+    Novel.objects.filter(pk__in=NovelRating.objects.values('novel')).update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(value=Sum('rating')).values('value')), Value(0)),
+        rating_count=Coalesce(Subquery(ratings.annotate(value=Count('pk')).values('value')), Value(0)),
+        rating_avg=Coalesce(Subquery(ratings.annotate(value=Avg('rating')).values('value')), Value(0.0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0049_downloader_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novel',
+            name='rating_avg',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='novel',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='novel',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='novel',
+            index=models.Index(fields=['-rating_avg', 'title'], name='novel_rating_avg_idx'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
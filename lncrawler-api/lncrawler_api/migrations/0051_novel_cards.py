@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:36
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0050_novel_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NovelCard',
+            fields=[
+                ('novel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='lncrawler_api.novel')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('title', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField()),
+                ('last_chapter_update', models.DateTimeField(blank=True, null=True)),
+                ('first_chapter_update', models.DateTimeField(blank=True, null=True)),
+                ('rating_avg', models.FloatField(default=0.0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('total_views', models.BigIntegerField(default=0)),
+                ('weekly_views', models.PositiveIntegerField(default=0)),
+                ('year_week', models.CharField(blank=True, max_length=6)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['title'], name='card_title_idx'), models.Index(fields=['created_at'], name='card_created_idx'), models.Index(fields=['-rating_avg', 'title'], name='card_rating_idx'), models.Index(fields=['-total_views', 'title'], name='card_views_idx'), models.Index(fields=['-weekly_views', 'title'], name='card_weekly_views_idx'), models.Index(fields=['-last_chapter_update', 'title'], name='card_last_update_idx'), models.Index(fields=['first_chapter_update', 'title'], name='card_first_update_idx')],
+            },
+        ),
+    ]
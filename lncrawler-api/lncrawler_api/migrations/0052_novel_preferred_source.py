@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, IntegerField, OuterRef, Subquery
+
+
+def fill_preferred_sources(apps, schema_editor):
+    """
+    Compute the preferred source of the existing novels
+    """
+    Novel = apps.get_model('lncrawler_api', 'Novel')
+    NovelFromSource = apps.get_model('lncrawler_api', 'NovelFromSource')
+    best_source = NovelFromSource.objects.filter(novel=OuterRef('pk')).annotate(
+        calc_score=ExpressionWrapper(F('upvotes') - F('downvotes'), output_field=IntegerField())
+    ).order_by('-calc_score', '-upvotes', 'title').values('id')[:1]
+    Novel.objects.update(preferred_source=Subquery(best_source))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0051_novel_cards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novel',
+            name='preferred_source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='lncrawler_api.novelfromsource'),
+        ),
+        migrations.RunPython(fill_preferred_sources, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0052_novel_preferred_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NovelViewShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year_week', models.CharField(blank=True, max_length=6)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('views', models.BigIntegerField(default=0)),
+                ('novel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_shards', to='lncrawler_api.novel')),
+            ],
+            options={
+                'unique_together': {('novel', 'year_week', 'shard')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0054_page_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='library_novel_path',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+    ]
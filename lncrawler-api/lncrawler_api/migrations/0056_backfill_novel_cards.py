@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-19 01:40
+
+import logging
+from django.db import migrations
+from lncrawler_api.services import novel_cards
+
+logger = logging.getLogger('lncrawler_api')
+
+
+def build_novel_cards(apps, schema_editor):
+    """
+    Build the cards of the existing novels, the list endpoints only show the novels that have one
+    The cards hold the serializer output, so they are built with the current models and not the
+    historical ones: a failure leaves the missing cards to the refresh_novel_cards task
+    """
+    try:
+        built = novel_cards.rebuild_all_cards()
+    except Exception as e:
+        logger.error(f"Failed to build the novel cards, run rebuild_novel_cards: {str(e)}")
+        return
+    logger.info(f"Built {built} novel cards")
+
+
+class Migration(migrations.Migration):
+
+    # Each batch of cards is committed on its own
+    atomic = False
+
+    dependencies = [
+        ('lncrawler_api', '0055_job_library_novel_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_novel_cards, migrations.RunPython.noop),
+    ]
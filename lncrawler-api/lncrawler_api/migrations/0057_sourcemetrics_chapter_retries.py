@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lncrawler_api', '0056_backfill_novel_cards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sourcemetrics',
+            name='chapter_retries',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sourcemetrics',
+            name='chapters_recovered',
+            field=models.IntegerField(default=0),
+        ),
+    ]
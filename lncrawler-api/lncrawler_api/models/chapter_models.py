@@ -41,6 +41,16 @@ class Chapter(models.Model):
     def __str__(self):
         return f"{self.title} - {self.novel_from_source.title}"
     
+    @classmethod
+    def latest_per_source(cls, **filters):
+        """
+        Queryset of the last chapter (matching the filters) of each source, for Prefetch()
+        """
+        last_chapter_id = cls.objects.filter(
+            novel_from_source=models.OuterRef('novel_from_source'), **filters
+        ).order_by('-chapter_id').values('chapter_id')[:1]
+        return cls.objects.filter(chapter_id=models.Subquery(last_chapter_id), **filters)
+    
     @property
     def body(self):
         """Read the chapter body from the file"""
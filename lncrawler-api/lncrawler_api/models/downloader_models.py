@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 import uuid
+import json
+import zlib
 import logging
 
 
@@ -27,6 +29,15 @@ class Job(models.Model):
         (STATUS_FAILED, 'Failed'),
     ]
     
+    # Download modes
+    MODE_FULL = 'full'
+    MODE_UPDATE = 'update'
+    
+    MODE_CHOICES = [
+        (MODE_FULL, 'Full download'),
+        (MODE_UPDATE, 'Update only new chapters'),
+    ]
+    
     # Primary fields
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_CREATED)
@@ -47,12 +58,51 @@ class Job(models.Model):
     output_files = models.JSONField(default=list, blank=True, null=True)
     output_slug = models.CharField(max_length=512, blank=True, null=True)
     
+    # Normalised URL of the novel being downloaded, used to share a download between requests
+    novel_url = models.CharField(max_length=512, blank=True, null=True, db_index=True)
+    download_mode = models.CharField(max_length=10, choices=MODE_CHOICES, default=MODE_FULL)
+    
+    # Folder of the library novel the download is added to, set once the user accepted the match
+    library_novel_path = models.CharField(max_length=500, blank=True, null=True)
+    
+    # Lease of the worker running the job, renewed while the worker is alive
+    # A job whose lease expired belongs to a dead worker and gets resumed
+    lease_owner = models.CharField(max_length=100, blank=True, null=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    resume_count = models.IntegerField(default=0)
+    
+    # Set by cancel_job, the worker running the job stops at its next check
+    cancel_requested = models.BooleanField(default=False)
+    
     # Import information
     import_message = models.TextField(blank=True, null=True)
     
     # Error information
     error_message = models.TextField(blank=True, null=True)
     
+    # Set once the search results were moved to the compressed JobArchive
+    compacted_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    
+    # Fields used by the job lists, the others (results blobs and messages) are deferred
+    LIST_FIELDS = (
+        'id', 'status', 'query', 'created_at', 'updated_at', 'progress', 'total_items',
+        'novel_url', 'download_mode', 'output_slug', 'compacted_at',
+    )
+    
+    class Meta:
+        indexes = [
+            # Keyset pagination of the job list
+            models.Index(fields=['-created_at', '-id'], name='job_created_id_idx'),
+        ]
+        constraints = [
+            # Only one download of a given novel may be in flight at a time
+            models.UniqueConstraint(
+                fields=['novel_url'],
+                condition=models.Q(status='downloading'),
+                name='unique_in_flight_download_per_novel_url',
+            ),
+        ]
+    
     def __str__(self):
         return f"Job {self.id} - {self.get_status_display()}"
     
@@ -76,13 +126,70 @@ class Job(models.Model):
             
         self.save(update_fields=['status', 'error_message', 'updated_at'])
     
+    def update_status_unless_cancelled(self, status, error_message=None):
+        """
+        Update the job status like update_status, unless the job was cancelled in the meantime
+        Used by the threads running the job, so that they never overwrite the status set by cancel_job
+        Returns False if the job was cancelled
+        """
+        fields = {'status': status, 'updated_at': timezone.now()}
+        if error_message:
+            fields['error_message'] = error_message
+        if not Job.objects.filter(pk=self.pk, cancel_requested=False).update(**fields):
+            logger.info(f"Job {self.id} was cancelled, its status is not updated to {status}")
+            return False
+        logger.info(f"Updating job {self.id} status to {status}")
+        for name, value in fields.items():
+            setattr(self, name, value)
+        return True
+    
     def update_progress(self, progress, total_items=None):
-        """Update the job progress"""
+        """
+        Update the job progress
+        Writes are coalesced: the row is only saved when the total or the displayed percentage changes
+        """
+        if total_items is None:
+            total_items = self.total_items
+        
+        old_percentage = self.get_progress_percentage()
+        total_changed = total_items != self.total_items
         self.progress = progress
-        if total_items is not None:
-            self.total_items = total_items
-            
+        self.total_items = total_items
+        
+        if not total_changed and self.get_progress_percentage() == old_percentage:
+            return False
+        
         self.save(update_fields=['progress', 'total_items', 'updated_at'])
+        return True
+    
+    def get_full_search_results(self):
+        """Return the search results, read back from the archive if the job was compacted"""
+        if self.compacted_at is None:
+            return self.search_results
+        try:
+            return self.archive.load().get('search_results')
+        except JobArchive.DoesNotExist:
+            return self.search_results
+    
+    def compact(self):
+        """
+        Move the search results to a compressed JobArchive and keep only a summary of them in the job
+        The per-source results of the search are dropped, they are a copy of the search results
+        """
+        results = self.search_results or {}
+        with transaction.atomic():
+            if results.get('results'):
+                JobArchive.objects.update_or_create(
+                    job=self, defaults=JobArchive.pack({'search_results': results})
+                )
+                self.search_results = {
+                    'status': results.get('status', 'success'),
+                    'compacted': True,
+                    'result_count': len(results['results']),
+                }
+            self.source_results.all().delete()
+            self.compacted_at = timezone.now()
+            self.save(update_fields=['search_results', 'compacted_at'])
     
     def update_download_results(self, output_path, output_files):
         """Update the download results"""
@@ -106,6 +213,10 @@ class Job(models.Model):
             'selected_novel': self.selected_novel,
             'output_path': self.output_path,
             'output_files': self.output_files,
+            'novel_url': self.novel_url,
+            'download_mode': self.download_mode,
+            'resume_count': self.resume_count,
+            'compacted': self.compacted_at is not None,
             'error_message': self.error_message,
         }
         
@@ -113,4 +224,193 @@ class Job(models.Model):
         if self.import_message:
             result['import_message'] = self.import_message
             
-        return result
\ No newline at end of file
+        return result
+    
+    def to_list_dict(self):
+        """Convert job to dictionary for the job lists, only uses LIST_FIELDS"""
+        return {
+            'id': str(self.id),
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'query': self.query,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+            'progress': self.progress,
+            'total_items': self.total_items,
+            'progress_percentage': self.get_progress_percentage(),
+            'novel_url': self.novel_url,
+            'download_mode': self.download_mode,
+            'output_slug': self.output_slug,
+            'compacted': self.compacted_at is not None,
+        }
+
+
+class JobArchive(models.Model):
+    """
+    Large result blobs of a compacted job, stored as zlib compressed JSON
+    """
+    
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    data = models.BinaryField()
+    original_size = models.IntegerField(default=0)
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Archive of job {self.job_id} ({len(self.data)} / {self.original_size} bytes)"
+    
+    @staticmethod
+    def pack(payload):
+        """Return the field values storing the payload"""
+        raw = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        return {'data': zlib.compress(raw, 6), 'original_size': len(raw)}
+    
+    def load(self):
+        return json.loads(zlib.decompress(bytes(self.data)).decode('utf-8'))
+
+
+class SearchSourceResult(models.Model):
+    """
+    Results of one source for a search job, stored as soon as the source answers
+    The auto-incremented id is the cursor clients use to fetch only the results they have not seen yet
+    """
+    
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='source_results')
+    source_url = models.CharField(max_length=512)
+    results = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.source_url} - {len(self.results)} results for job {self.job_id}"
+    
+    def to_dict(self):
+        return {
+            'cursor': self.id,
+            'source_url': self.source_url,
+            'results': self.results,
+            'error': self.error,
+        }
+
+
+class JobMetrics(models.Model):
+    """
+    Measurements of a search or download job, see services/crawler_metrics.py
+    Times are in seconds. The totals of the sources are kept in SourceMetrics
+    """
+    
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, primary_key=True, related_name='metrics')
+    source_name = models.CharField(max_length=100, blank=True, null=True)  # downloads only
+    search_time = models.FloatField(default=0)
+    download_time = models.FloatField(default=0)
+    import_time = models.FloatField(default=0)
+    
+    # Chapters the download tried to fetch: fetched with content, failed, or fetched empty
+    chapters = models.IntegerField(default=0)
+    chapters_failed = models.IntegerField(default=0)
+    chapters_empty = models.IntegerField(default=0)
+    
+    # HTTP requests made by the crawler during the download, failed ones are retried or fail the chapter
+    requests = models.IntegerField(default=0)
+    failed_requests = models.IntegerField(default=0)
+    bytes_downloaded = models.BigIntegerField(default=0)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Metrics of job {self.job_id}"
+    
+    @property
+    def chapters_per_second(self):
+        if not self.download_time:
+            return None
+        return round(self.chapters / self.download_time, 2)
+
+
+class SourceMetrics(models.Model):
+    """
+    Daily totals of the searches and downloads of a source (ExternalSource.source_name)
+    """
+    
+    source_name = models.CharField(max_length=100)
+    date = models.DateField()
+    
+    searches = models.IntegerField(default=0)
+    search_failures = models.IntegerField(default=0)
+    search_time = models.FloatField(default=0)
+    
+    downloads = models.IntegerField(default=0)
+    download_failures = models.IntegerField(default=0)
+    download_time = models.FloatField(default=0)
+    import_time = models.FloatField(default=0)
+    chapters = models.IntegerField(default=0)
+    chapters_failed = models.IntegerField(default=0)
+    chapters_empty = models.IntegerField(default=0)
+    requests = models.IntegerField(default=0)
+    failed_requests = models.IntegerField(default=0)
+    bytes_downloaded = models.BigIntegerField(default=0)
+    
+    # Failed chapters downloaded again by retry_failed_chapters, and those that got their content
+    chapter_retries = models.IntegerField(default=0)
+    chapters_recovered = models.IntegerField(default=0)
+    
+    COUNTERS = (
+        'searches', 'search_failures', 'search_time',
+        'downloads', 'download_failures', 'download_time', 'import_time',
+        'chapters', 'chapters_failed', 'chapters_empty',
+        'requests', 'failed_requests', 'bytes_downloaded',
+        'chapter_retries', 'chapters_recovered',
+    )
+    
+    class Meta:
+        unique_together = ('source_name', 'date')
+        ordering = ['-date', 'source_name']
+        verbose_name_plural = 'source metrics'
+    
+    def __str__(self):
+        return f"{self.source_name} on {self.date}"
+    
+    @classmethod
+    def record(cls, source_name, **values):
+        """
+        Add the values to the totals of the source for today
+        The counters are incremented in the database, concurrent jobs do not lose updates
+        """
+        if not source_name:
+            return
+        today = timezone.localdate()
+        cls.objects.get_or_create(source_name=source_name, date=today)
+        cls.objects.filter(source_name=source_name, date=today).update(
+            **{name: models.F(name) + value for name, value in values.items() if value}
+        )
+    
+    @classmethod
+    def totals(cls, since):
+        """
+        Totals of every source since the given date, with the derived rates
+        """
+        rows = (
+            cls.objects.filter(date__gte=since)
+            .values('source_name')
+            .annotate(**{name: models.Sum(name) for name in cls.COUNTERS})
+            .order_by('source_name')
+        )
+        totals = []
+        for row in rows:
+            attempted = row['chapters'] + row['chapters_failed'] + row['chapters_empty']
+            row.update({
+                'search_failure_rate': round(row['search_failures'] / row['searches'], 3) if row['searches'] else None,
+                'avg_search_time': round(row['search_time'] / row['searches'], 2) if row['searches'] else None,
+                'download_failure_rate': round(row['download_failures'] / row['downloads'], 3) if row['downloads'] else None,
+                'chapters_per_second': round(row['chapters'] / row['download_time'], 2) if row['download_time'] else None,
+                'chapter_failure_rate': round((row['chapters_failed'] + row['chapters_empty']) / attempted, 3) if attempted else None,
+                'request_failure_rate': round(row['failed_requests'] / row['requests'], 3) if row['requests'] else None,
+                'avg_import_time': round(row['import_time'] / row['downloads'], 2) if row['downloads'] else None,
+                'retry_recovery_rate': round(row['chapters_recovered'] / row['chapter_retries'], 3) if row['chapter_retries'] else None,
+            })
+            totals.append(row)
+        return totals
@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.serializers.json import DjangoJSONEncoder
 import uuid
-from django.db.models import F
+from django.db.models import F, Q, Case, When, Value, FloatField, IntegerField, ExpressionWrapper, OuterRef, Subquery
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 
 class Novel(models.Model):
@@ -14,6 +18,20 @@ class Novel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     comment_count = models.PositiveIntegerField(default=0)
+    # Aggregates of the ratings, kept up to date by NovelRating and checked by the recalculate_ratings command
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    rating_avg = models.FloatField(default=0.0)  # 0 while the novel has no rating
+    # Source with the best vote score, kept up to date by the source votes and the sources
+    preferred_source = models.ForeignKey(
+        'NovelFromSource', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    
+    class Meta:
+        indexes = [
+            # Top rated lists and sort_by=rating
+            models.Index(fields=['-rating_avg', 'title'], name='novel_rating_avg_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -29,8 +47,117 @@ class Novel(models.Model):
         Novel.objects.filter(pk=self.pk).update(
             comment_count=F('comment_count') + 1
         )
+        from ..services.novel_cards import schedule_counters_refresh
+        schedule_counters_refresh(self.pk)
         # Refresh from database to get the latest values
         self.refresh_from_db()
+    
+    @classmethod
+    def update_rating_aggregates(cls, novel_id, rating_delta, count_delta):
+        """
+        Add a rating change to the aggregates of a novel in a single UPDATE,
+        so that concurrent ratings are not lost
+        """
+        cls.objects.filter(pk=novel_id).update(
+            rating_sum=F('rating_sum') + rating_delta,
+            rating_count=F('rating_count') + count_delta,
+            # Computed from the values before the update, like the other columns
+            rating_avg=Case(
+                When(
+                    Q(rating_count__gt=-count_delta),
+                    then=Cast(F('rating_sum') + rating_delta, FloatField()) / (F('rating_count') + count_delta),
+                ),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+        from ..services.novel_cards import schedule_counters_refresh
+        schedule_counters_refresh(novel_id)
+    
+    @classmethod
+    def update_preferred_source(cls, novel_id, source_id=None):
+        """
+        Recompute in a single UPDATE the preferred source of a novel: best vote score, then most upvotes,
+        then title. With source_id, also the novels whose preferred source it was (source moved to another novel)
+        """
+        from .sources_models import NovelFromSource
+        best_source = NovelFromSource.objects.filter(novel=OuterRef('pk')).annotate(
+            calc_score=ExpressionWrapper(F('upvotes') - F('downvotes'), output_field=IntegerField())
+        ).order_by('-calc_score', '-upvotes', 'title').values('id')[:1]
+        novels = Q(pk=novel_id)
+        if source_id is not None:
+            novels |= Q(preferred_source_id=source_id)
+        cls.objects.filter(novels).update(preferred_source=Subquery(best_source))
+
+
+@receiver(post_save, sender=Novel)
+def refresh_novel_card(sender, instance, **kwargs):
+    """Rebuild the card of a novel whose title or fields changed"""
+    from ..services.novel_cards import schedule_refresh
+    schedule_refresh(instance.pk)
+
+
+class NovelCard(models.Model):
+    """
+    Card of a novel as shown by the list endpoints, kept up to date by services/novel_cards.py
+    data holds the BasicNovelSerializer output without the fields of the current user,
+    the counters that change often are columns so they can be updated (and sorted) on their own
+    """
+    novel = models.OneToOneField(Novel, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    # Copies of the sort fields of the novel and its sources
+    title = models.CharField(max_length=255)
+    created_at = models.DateTimeField()
+    last_chapter_update = models.DateTimeField(null=True, blank=True)  # most recent of the sources
+    first_chapter_update = models.DateTimeField(null=True, blank=True)  # least recent of the sources
+    # Counters
+    rating_avg = models.FloatField(default=0.0)
+    rating_count = models.IntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    total_views = models.BigIntegerField(default=0)
+    weekly_views = models.PositiveIntegerField(default=0)
+    year_week = models.CharField(max_length=6, blank=True)  # Week of weekly_views, format: YYYYWW
+    refreshed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['title'], name='card_title_idx'),
+            models.Index(fields=['created_at'], name='card_created_idx'),
+            models.Index(fields=['-rating_avg', 'title'], name='card_rating_idx'),
+            models.Index(fields=['-total_views', 'title'], name='card_views_idx'),
+            models.Index(fields=['-weekly_views', 'title'], name='card_weekly_views_idx'),
+            models.Index(fields=['-last_chapter_update', 'title'], name='card_last_update_idx'),
+            models.Index(fields=['first_chapter_update', 'title'], name='card_first_update_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Card of {self.title}"
+
+
+class PageSnapshot(models.Model):
+    """
+    Payload of a page for an anonymous visitor, computed by a scheduler task (see services/home_page.py)
+    data holds the rendered JSON, the fields of the current user are added to it by each request
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    data = models.TextField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Snapshot of the {self.name} page"
+
+
+class NovelTitleBucket(models.Model):
+    """
+    Bucket of the normalised-title index of the novels (see services/title_index.py)
+    A novel has one bucket for its exact key and one per MinHash band of its title
+    """
+    novel = models.ForeignKey(Novel, on_delete=models.CASCADE, related_name='title_buckets')
+    bucket = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"{self.novel_id}: {self.bucket}"
+
 
 class Person(models.Model):
     """Base model for people involved with novels (authors, editors, translators)"""
@@ -89,6 +216,36 @@ class NovelRating(models.Model):
         
     def __str__(self):
         return f"Rating {self.rating} for {self.novel.title} by {self.ip_address}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Rating stored in the database, save() adds the difference to the aggregates of the novel
+        instance._stored_rating = instance.__dict__.get('rating')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                Novel.update_rating_aggregates(self.novel_id, self.rating, 1)
+            else:
+                stored_rating = getattr(self, '_stored_rating', None)
+                if stored_rating is None:
+                    stored_rating = NovelRating.objects.filter(pk=self.pk).values_list('rating', flat=True).first()
+                super().save(*args, **kwargs)
+                if stored_rating is not None and stored_rating != self.rating:
+                    Novel.update_rating_aggregates(self.novel_id, self.rating - stored_rating, 0)
+            self._stored_rating = self.rating
+
+
+@receiver(post_delete, sender=NovelRating)
+def remove_deleted_rating(sender, instance, **kwargs):
+    """
+    Remove a deleted rating from the aggregates of its novel
+    A signal rather than delete(): the admin deletes ratings with queryset.delete()
+    """
+    Novel.update_rating_aggregates(instance.novel_id, -instance.rating, -1)
 
 
 class NovelViewCount(models.Model):
@@ -105,10 +262,10 @@ class NovelViewCount(models.Model):
     def increment(self):
         """
         Increment the all-time view count for the novel
+        With VIEW_COUNT_SHARDS the view goes to a shard and is added to views by the next fold
         """
-        NovelViewCount.objects.filter(pk=self.pk).update(
-            views=F('views') + 1
-        )
+        from ..services.view_counts import add_views
+        add_views({self.novel_id: 1}, {})
         
         # Refresh from database to get the latest values
         self.refresh_from_db()
@@ -139,6 +296,10 @@ class WeeklyNovelView(models.Model):
         current_date = datetime.now()
         year_week = f"{current_date.isocalendar()[0]}{current_date.isocalendar()[1]:02d}"
         
+        # Add the view, to a shard with VIEW_COUNT_SHARDS
+        from ..services.view_counts import add_views
+        add_views({}, {(novel.pk, year_week): 1})
+        
         # Get or create the weekly record
         weekly_view, created = cls.objects.get_or_create(
             novel=novel,
@@ -146,14 +307,27 @@ class WeeklyNovelView(models.Model):
             defaults={'views': 0}
         )
         
-        cls.objects.filter(pk=weekly_view.pk).update(views=F('views') + 1)
-        
-        # Refresh from database to get the latest values
-        weekly_view.refresh_from_db()
-        
         return weekly_view
 
 
+class NovelViewShard(models.Model):
+    """
+    Views of a novel not added to its view counts yet, spread over VIEW_COUNT_SHARDS rows per novel
+    so that concurrent writers do not wait for the lock of the same row.
+    The fold_view_shards command adds them to NovelViewCount and WeeklyNovelView
+    """
+    novel = models.ForeignKey(Novel, on_delete=models.CASCADE, related_name='view_shards')
+    year_week = models.CharField(max_length=6, blank=True)  # Empty for the all-time count, else YYYYWW
+    shard = models.PositiveSmallIntegerField()
+    views = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('novel', 'year_week', 'shard')
+    
+    def __str__(self):
+        return f"{self.novel_id} shard {self.shard} {self.year_week or 'all time'}: {self.views} views"
+
+
 class FeaturedNovel(models.Model):
     """
     Tracks which novels are featured on the site
@@ -1,11 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 import uuid
 import os
 import json
 import shutil
+from datetime import timedelta
+from urllib.parse import urlsplit
 from django.conf import settings
 from django.utils.text import slugify
 from django.utils import timezone
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from .novels_models import Novel, Author, Editor, Translator, Tag
 from .chapter_models import Volume, Chapter
@@ -27,12 +32,72 @@ class ExternalSource(models.Model):
     
     source_name = models.CharField(max_length=100, unique=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='alive')
+    base_url = models.CharField(max_length=200, null=True, blank=True)
+    
+    # Rolling health stats measured by the probes (exponential moving averages)
+    avg_latency = models.FloatField(null=True, blank=True)  # seconds
+    latency_deviation = models.FloatField(null=True, blank=True)  # seconds
+    availability = models.FloatField(default=1.0)  # share of successful probes
+    consecutive_failures = models.IntegerField(default=0)
+    last_probe_at = models.DateTimeField(null=True, blank=True)
+    last_probe_error = models.CharField(max_length=500, null=True, blank=True)
+    
+    # Weights of a new probe in the moving averages (same as TCP round trip time estimation)
+    LATENCY_WEIGHT = 0.125
+    DEVIATION_WEIGHT = 0.25
+    AVAILABILITY_WEIGHT = 0.1
+    # Consecutive failed probes before the source is considered dead
+    DEAD_AFTER_FAILURES = 3
+    
+    # A search makes a few requests to the source, its timeout is a multiple of the probe latency
+    SEARCH_REQUESTS = 4
+    SEARCH_TIMEOUT_DEFAULT = 30  # seconds, for sources never probed
+    SEARCH_TIMEOUT_MIN = 5
+    SEARCH_TIMEOUT_MAX = 60
     
     class Meta:
         ordering = ['source_name']
     
     def __str__(self):
         return f"{self.source_name} ({self.get_status_display()})"
+    
+    @property
+    def search_timeout(self):
+        """
+        Time a search of this source may take, derived from its observed latency
+        """
+        if self.avg_latency is None:
+            return self.SEARCH_TIMEOUT_DEFAULT
+        expected = self.avg_latency + 4 * (self.latency_deviation or 0)
+        return min(max(expected * self.SEARCH_REQUESTS, self.SEARCH_TIMEOUT_MIN), self.SEARCH_TIMEOUT_MAX)
+    
+    def record_probe(self, ok, latency=None, error=None):
+        """
+        Fold the result of a probe into the rolling stats and update the alive/dead status
+        """
+        self.availability += self.AVAILABILITY_WEIGHT * ((1.0 if ok else 0.0) - self.availability)
+        
+        if ok:
+            if self.avg_latency is None:
+                self.avg_latency = latency
+                self.latency_deviation = latency / 2
+            else:
+                self.latency_deviation += self.DEVIATION_WEIGHT * (abs(latency - self.avg_latency) - self.latency_deviation)
+                self.avg_latency += self.LATENCY_WEIGHT * (latency - self.avg_latency)
+            self.consecutive_failures = 0
+            self.last_probe_error = None
+            self.status = 'alive'
+        else:
+            self.consecutive_failures += 1
+            self.last_probe_error = truncate(error or 'Unknown error')
+            if self.consecutive_failures >= self.DEAD_AFTER_FAILURES:
+                self.status = 'dead'
+        
+        self.last_probe_at = timezone.now()
+        self.save(update_fields=[
+            'status', 'avg_latency', 'latency_deviation', 'availability',
+            'consecutive_failures', 'last_probe_at', 'last_probe_error',
+        ])
 
 
 class NovelFromSource(models.Model):
@@ -90,6 +155,15 @@ class NovelFromSource(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     last_chapter_update = models.DateTimeField(null=True, blank=True)
     
+    # Auto refresh of ongoing novels, the interval adapts to the release cadence of the source
+    refresh_interval = models.IntegerField(default=86400)  # seconds
+    last_refresh_at = models.DateTimeField(null=True, blank=True)
+    next_refresh_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    
+    # Retry of the chapters that failed to download, backs off exponentially while they keep failing
+    chapter_retry_count = models.IntegerField(default=0)
+    next_chapter_retry_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    
     # File paths
     meta_file_path = models.CharField(max_length=500, null=True, blank=True)
     
@@ -105,6 +179,9 @@ class NovelFromSource(models.Model):
 
     @property
     def chapters_count(self):
+        # Annotated by the list querysets (NovelSourceSerializer.setup_queryset)
+        if hasattr(self, 'num_chapters'):
+            return self.num_chapters or 0
         return self.chapters.count()
     
     @property
@@ -118,16 +195,63 @@ class NovelFromSource(models.Model):
     
     @property
     def volumes_count(self):
+        if hasattr(self, 'num_volumes'):
+            return self.num_volumes or 0
         return self.volumes.count()
     
     @property
     def vote_score(self):
         return self.upvotes - self.downvotes
     
+    REFRESH_MIN_INTERVAL = 3600  # 1 hour
+    REFRESH_MAX_INTERVAL = 604800  # 1 week
+    REFRESH_BACKOFF = 1.5
+    
+    def schedule_next_refresh(self, new_chapters):
+        """
+        Learn the release cadence of the source and schedule its next refresh.
+        The interval is a moving average of the time between new chapters, it grows
+        when a refresh finds nothing new. Pass None for a failed refresh to keep the interval.
+        """
+        now = timezone.now()
+        interval = self.refresh_interval or self.REFRESH_MIN_INTERVAL
+        
+        if new_chapters:
+            elapsed = (now - self.last_refresh_at).total_seconds() if self.last_refresh_at else interval
+            interval = (interval + elapsed / new_chapters) / 2
+        elif new_chapters is not None:
+            interval *= self.REFRESH_BACKOFF
+        
+        self.refresh_interval = int(min(max(interval, self.REFRESH_MIN_INTERVAL), self.REFRESH_MAX_INTERVAL))
+        self.next_refresh_at = now + timedelta(seconds=self.refresh_interval)
+        if new_chapters is not None:
+            self.last_refresh_at = now
+        self.save(update_fields=['refresh_interval', 'last_refresh_at', 'next_refresh_at'])
+    
+    CHAPTER_RETRY_BASE_DELAY = 3600  # 1 hour
+    CHAPTER_RETRY_MAX_DELAY = 2592000  # 30 days
+    
+    def schedule_chapter_retry(self, still_failing):
+        """
+        Schedule the next retry of the failed chapters: none once they all recovered,
+        otherwise after a delay that doubles with every unsuccessful retry
+        """
+        if still_failing:
+            self.chapter_retry_count += 1
+            delay = min(self.CHAPTER_RETRY_BASE_DELAY * 2 ** self.chapter_retry_count, self.CHAPTER_RETRY_MAX_DELAY)
+            self.next_chapter_retry_at = timezone.now() + timedelta(seconds=delay)
+        else:
+            self.chapter_retry_count = 0
+            self.next_chapter_retry_at = None
+        self.save(update_fields=['chapter_retry_count', 'next_chapter_retry_at'])
+    
     @classmethod
-    def from_meta_json(cls, meta_json_path):
+    def from_meta_json(cls, meta_json_path, chapter_ids=None):
         """
         Create a NovelFromSource instance from a meta.json file
+        
+        If chapter_ids is given the import is incremental: chapters already in the database
+        are only re-checked and updated when their id is in chapter_ids, new chapters are always created
         """
         with open(meta_json_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
@@ -161,12 +285,21 @@ class NovelFromSource(models.Model):
                 'novel_path': novel_path
             }
         )
+        if created:
+            # Later downloads of the same novel under a slightly different title are added to it
+            from ..services.title_index import index_novel
+            index_novel(novel)
         
         # Create or get the external source
         source_name = os.path.basename(source_dir)
         external_source, created = ExternalSource.objects.get_or_create(
             source_name=source_name
         )
+        if not external_source.base_url and novel_data.get('url'):
+            # Home page of the source, probed by the source health checks
+            parts = urlsplit(novel_data['url'])
+            external_source.base_url = f"{parts.scheme}://{parts.netloc}/"
+            external_source.save(update_fields=['base_url'])
         
         # Create or update the NovelFromSource
         source_url = novel_data.get('url', '')
@@ -246,6 +379,7 @@ class NovelFromSource(models.Model):
                 )
         
         # Process chapters - using bulk create/update for better performance
+        chapters_added = False
         if 'chapters' in novel_data:
             # Get existing chapters for this source to avoid duplicates
             existing_chapters = {
@@ -254,10 +388,16 @@ class NovelFromSource(models.Model):
             
             new_chapters = []
             chapters_to_update = []
+            if chapter_ids is not None:
+                chapter_ids = set(chapter_ids)
             
             for chapter_data in novel_data['chapters']:
                 chapter_id = chapter_data.get('id')
                 
+                # Incremental import: leave untouched chapters alone, this skips the content check on disk
+                if chapter_ids is not None and chapter_id in existing_chapters and chapter_id not in chapter_ids:
+                    continue
+                
                 # Extract only the image filenames (keys) from the images dictionary
                 images_dict = chapter_data.get('images', {})
                 image_filenames = list(images_dict.keys()) if images_dict else []
@@ -288,6 +428,7 @@ class NovelFromSource(models.Model):
             # Bulk create new chapters
             if new_chapters:
                 Chapter.objects.bulk_create(new_chapters)
+                chapters_added = True
             
             # Bulk update existing chapters
             if chapters_to_update:
@@ -298,10 +439,16 @@ class NovelFromSource(models.Model):
             novel_from_source.last_chapter_update = timezone.now()
             novel_from_source.save(update_fields=['last_chapter_update'])
         
-        # Generate overview image
-        novel_from_source.generate_overview_image()
+        # Generate overview image (it shows the chapter count)
+        if chapter_ids is None or chapters_added or not novel_from_source.overview_picture_path:
+            novel_from_source.generate_overview_image()
         # Generate miniature cover image
-        novel_from_source.generate_cover_min()
+        if chapter_ids is None or not novel_from_source.cover_min_path:
+            novel_from_source.generate_cover_min()
+        
+        # The authors, tags and chapters are not saved through the source, rebuild the card once they are all in
+        from ..services.novel_cards import schedule_refresh
+        schedule_refresh(novel.id)
         
         return novel_from_source
 
@@ -352,6 +499,39 @@ class NovelFromSource(models.Model):
         super().delete(*args, **kwargs)
 
 
+# Fields of a source the preferred source of its novel depends on
+# The receivers below are connected before the card ones: the card shows the preferred source
+PREFERRED_SOURCE_FIELDS = {'upvotes', 'downvotes', 'title', 'novel'}
+
+
+@receiver(post_save, sender=NovelFromSource)
+def update_preferred_source_on_save(sender, instance, created=False, update_fields=None, **kwargs):
+    """Recompute the preferred source of the novel of an added, moved or edited source"""
+    if created or update_fields is None or PREFERRED_SOURCE_FIELDS.intersection(update_fields):
+        Novel.update_preferred_source(instance.novel_id, None if created else instance.pk)
+
+
+@receiver(post_delete, sender=NovelFromSource)
+def update_preferred_source_on_delete(sender, instance, **kwargs):
+    """Recompute the preferred source of the novel of a deleted source"""
+    Novel.update_preferred_source(instance.novel_id)
+
+
+@receiver(post_save, sender=NovelFromSource)
+def refresh_source_card(sender, instance, update_fields=None, **kwargs):
+    """Rebuild the card of the novel of a source when a field shown on it changes"""
+    from ..services.novel_cards import CARD_SOURCE_FIELDS, schedule_refresh
+    if update_fields is None or CARD_SOURCE_FIELDS.intersection(update_fields):
+        schedule_refresh(instance.novel_id)
+
+
+@receiver(post_delete, sender=NovelFromSource)
+def refresh_deleted_source_card(sender, instance, **kwargs):
+    """Rebuild the card of the novel of a deleted source, a signal so that queryset deletes are seen too"""
+    from ..services.novel_cards import schedule_refresh
+    schedule_refresh(instance.novel_id)
+
+
 class SourceVote(models.Model):
     """
     Tracks upvotes and downvotes for novel sources
@@ -374,33 +554,43 @@ class SourceVote(models.Model):
         return f"{self.get_vote_type_display()} for {self.source.title} by {self.ip_address}"
     
     def save(self, *args, **kwargs):
-        # Check if this is an update to an existing vote
-        is_update = self.pk is not None
-        old_vote_type = None
-        
-        if is_update:
-            old_vote = SourceVote.objects.get(pk=self.pk)
-            old_vote_type = old_vote.vote_type
-        
-        # Save the vote
-        super().save(*args, **kwargs)
-        
-        # Update the vote counts on the source
-        source = self.source
-        
-        # If this is a new vote
-        if not is_update:
-            if self.vote_type == 'up':
-                source.upvotes += 1
-            else:
-                source.downvotes += 1
-        # If this is updating an existing vote
-        elif old_vote_type != self.vote_type:
-            if self.vote_type == 'up':
-                source.upvotes += 1
-                source.downvotes -= 1
-            else:
-                source.downvotes += 1
-                source.upvotes -= 1
-        
-        source.save(update_fields=['upvotes', 'downvotes'])
+        with transaction.atomic():
+            # Check if this is an update to an existing vote
+            is_new = self._state.adding
+            old_vote_type = None
+            
+            if not is_new:
+                old_vote_type = SourceVote.objects.filter(pk=self.pk).values_list('vote_type', flat=True).first()
+                is_new = old_vote_type is None
+            
+            # Save the vote
+            super().save(*args, **kwargs)
+            
+            # Update the vote counts on the source, in the database so that concurrent votes are not lost
+            if is_new:
+                self.update_source_counts(self.vote_type, 1)
+            elif old_vote_type != self.vote_type:
+                self.update_source_counts(self.vote_type, 1, old_vote_type)
+    
+    def update_source_counts(self, vote_type, delta, old_vote_type=None):
+        """
+        Add delta votes of vote_type to the source, minus one old_vote_type vote when a vote changed,
+        then recompute the preferred source of its novel
+        """
+        counts = {'upvotes' if vote_type == 'up' else 'downvotes': delta}
+        if old_vote_type is not None:
+            counts['upvotes' if old_vote_type == 'up' else 'downvotes'] = -1
+        NovelFromSource.objects.filter(pk=self.source_id).update(
+            **{field: F(field) + change for field, change in counts.items()}
+        )
+        novel_id = NovelFromSource.objects.filter(pk=self.source_id).values_list('novel_id', flat=True).first()
+        if novel_id is not None:
+            Novel.update_preferred_source(novel_id)
+            from ..services.novel_cards import schedule_refresh
+            schedule_refresh(novel_id)
+
+
+@receiver(post_delete, sender=SourceVote)
+def remove_deleted_source_vote(sender, instance, **kwargs):
+    """Remove a deleted vote from the counts of its source, a signal so that queryset deletes are seen too"""
+    instance.update_source_counts(instance.vote_type, -1)
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 import uuid
 from django.conf import settings
 from .novels_models import Novel
@@ -75,4 +77,11 @@ class ReadingListItem(models.Model):
         ordering = ['position', 'added_at']
     
     def __str__(self):
-        return f"{self.novel.title} in {self.reading_list.title}"
\ No newline at end of file
+        return f"{self.novel.title} in {self.reading_list.title}"
+
+@receiver(post_save, sender=ReadingListItem)
+@receiver(post_delete, sender=ReadingListItem)
+def refresh_listed_novel_card(sender, instance, **kwargs):
+    """The detail of a novel shows the reading lists it is in, its cached version follows its card"""
+    from ..services.novel_cards import schedule_refresh
+    schedule_refresh(instance.novel_id)
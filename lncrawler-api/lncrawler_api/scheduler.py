@@ -140,6 +140,91 @@ def calculate_novel_similarities():
         logger.error(f"Error in daily novel similarity calculation: {str(e)}", exc_info=True)
         raise  # Re-raise to mark task as failed
 
+# Task to resume the jobs of workers that died (restart, deploy, crash)
+@scheduler.register_task(interval=60, name="recover_jobs")  # 60 seconds
+def recover_jobs():
+    """Run the recover_jobs command to resume searches and downloads whose lease expired."""
+    try:
+        call_command('recover_jobs')
+    except Exception as e:
+        logger.error(f"Error in job recovery: {str(e)}", exc_info=True)
+        raise  # Re-raise to mark task as failed
+
+# Task to measure the availability and latency of the external sources
+@scheduler.register_task(interval=900, name="probe_sources")  # 900 seconds = 15 minutes
+def probe_sources():
+    """Run the probe_sources command to update the health stats used to route searches."""
+    try:
+        call_command('probe_sources')
+    except Exception as e:
+        logger.error(f"Error in source probing: {str(e)}", exc_info=True)
+        raise  # Re-raise to mark task as failed
+
+# Task to build the novel cards that are missing or outdated and reset the weekly views when a week starts
+@scheduler.register_task(interval=600, name="refresh_novel_cards")  # 600 seconds = 10 minutes
+def refresh_novel_cards():
+    """Run the rebuild_novel_cards command on the stale cards only."""
+    try:
+        call_command('rebuild_novel_cards', stale=True)
+    except Exception as e:
+        logger.error(f"Error in novel cards refresh: {str(e)}", exc_info=True)
+        raise  # Re-raise to mark task as failed
+
+# Task to serialize the home page served to every visitor
+@scheduler.register_task(interval=300, name="refresh_home_page")  # 300 seconds = 5 minutes
+def refresh_home_page():
+    """Run the refresh_home_page command to store a new snapshot of the home page."""
+    try:
+        call_command('refresh_home_page')
+    except Exception as e:
+        logger.error(f"Error in home page refresh: {str(e)}", exc_info=True)
+        raise  # Re-raise to mark task as failed
+
+# Task to add the sharded view counts (VIEW_COUNT_SHARDS) to the view counts of the novels
+@scheduler.register_task(interval=60, name="fold_view_shards")  # 60 seconds
+def fold_view_shards():
+    """Run the fold_view_shards command to update the view counts read by the site."""
+    try:
+        call_command('fold_view_shards')
+    except Exception as e:
+        logger.error(f"Error in view shards fold: {str(e)}", exc_info=True)
+        raise  # Re-raise to mark task as failed
+
+# Task to download the new chapters of ongoing novels
+# Each source is only checked when its adaptive refresh interval has elapsed
+@scheduler.register_task(interval=1800, name="refresh_ongoing_novels")  # 1800 seconds = 30 minutes
+def refresh_ongoing_novels():
+    """Run the refresh_ongoing_novels command to fetch new chapters of the sources that are due."""
+    logger.info("Starting refresh of ongoing novels...")
+    try:
+        call_command('refresh_ongoing_novels')
+        logger.info("Refresh of ongoing novels completed successfully")
+    except Exception as e:
+        logger.error(f"Error in refresh of ongoing novels: {str(e)}", exc_info=True)
+        raise  # Re-raise to mark task as failed
+
+# Task to download again the chapters that failed to download
+@scheduler.register_task(interval=86400, name="retry_failed_chapters")  # 86400 seconds = 24 hours
+def retry_failed_chapters():
+    """Run the retry_failed_chapters command to recover chapters saved without content."""
+    logger.info("Starting retry of failed chapters...")
+    try:
+        call_command('retry_failed_chapters')
+        logger.info("Retry of failed chapters completed successfully")
+    except Exception as e:
+        logger.error(f"Error in retry of failed chapters: {str(e)}", exc_info=True)
+        raise  # Re-raise to mark task as failed
+
+# Task to apply the job retention policy
+@scheduler.register_task(interval=86400, name="compact_jobs")  # 86400 seconds = 24 hours
+def compact_jobs():
+    """Run the compact_jobs command to archive the results of old jobs and delete the expired ones."""
+    try:
+        call_command('compact_jobs')
+    except Exception as e:
+        logger.error(f"Error in job compaction: {str(e)}", exc_info=True)
+        raise  # Re-raise to mark task as failed
+
 # Task to compress low traffic novels daily
 # @scheduler.register_task(interval=86400, name="compress_low_traffic")  # 86400 seconds = 24 hours
 # def compress_low_traffic_novels():
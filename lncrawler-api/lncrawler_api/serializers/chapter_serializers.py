@@ -2,6 +2,7 @@ from urllib.parse import quote
 from django.conf import settings
 from rest_framework import serializers
 from ..models import Chapter
+from ..services.chapter_index import get_index
 
 class ChapterSerializer(serializers.ModelSerializer):
     """
@@ -40,16 +41,11 @@ class ChapterContentSerializer(serializers.ModelSerializer):
         return obj.body
     
     def get_prev_chapter(self, obj):
-        previous_chapter = obj.novel_from_source.chapters.filter(
-            chapter_id__lt=obj.chapter_id
-        ).order_by('-chapter_id').first()
-        return previous_chapter.chapter_id if previous_chapter and previous_chapter.has_content else None
+        # The chapters without content are skipped
+        return get_index(obj.novel_from_source).previous(obj.chapter_id)
     
     def get_next_chapter(self, obj):
-        next_chapter = obj.novel_from_source.chapters.filter(
-            chapter_id__gt=obj.chapter_id
-        ).order_by('chapter_id').first()
-        return next_chapter.chapter_id if next_chapter and next_chapter.has_content else None
+        return get_index(obj.novel_from_source).next(obj.chapter_id)
     
     def get_novel_title(self, obj):
         return obj.novel_from_source.novel.title
@@ -2,12 +2,14 @@ from rest_framework import serializers
 from ..models import (
     Novel, Author, Tag,
     NovelViewCount, WeeklyNovelView,
-    NovelBookmark
+    NovelBookmark, NovelFromSource, ReadingHistory
 )
-from django.db.models import Avg, F, ExpressionWrapper, IntegerField, Subquery, OuterRef
+from django.db.models import Exists, Prefetch, Subquery, OuterRef
 from .sources_serializers import NovelSourceSerializer
 from .users_serializers import DetailedReadingHistorySerializer
 from ..utils import get_client_ip
+from ..services.novel_cards import current_year_week
+from ..services.user_overlay import UserOverlay
 
 
 class BasicNovelSerializer(serializers.ModelSerializer):
@@ -32,35 +34,67 @@ class BasicNovelSerializer(serializers.ModelSerializer):
             'reading_history'
         ]
     
+    @staticmethod
+    def setup_queryset(queryset, request=None):
+        """
+        Annotate and prefetch everything the serializer reads, so that a page of novels
+        is serialized in a constant number of queries whatever its size.
+        Must be called before the queryset is sliced.
+        """
+        queryset = queryset.annotate(
+            views_total=Subquery(NovelViewCount.objects.filter(novel=OuterRef('pk')).values('views')[:1]),
+            views_this_week=Subquery(
+                WeeklyNovelView.objects.filter(novel=OuterRef('pk'), year_week=current_year_week()).values('views')[:1]
+            ),
+        ).prefetch_related(
+            Prefetch('sources', queryset=NovelSourceSerializer.setup_queryset(NovelFromSource.objects.all(), request)),
+        )
+        if request is not None and request.user.is_authenticated:
+            queryset = queryset.annotate(
+                bookmarked=Exists(NovelBookmark.objects.filter(novel=OuterRef('pk'), user=request.user)),
+            ).prefetch_related(
+                Prefetch(
+                    'reading_histories',
+                    queryset=DetailedReadingHistorySerializer.setup_queryset(ReadingHistory.objects.all(), request.user),
+                    to_attr='user_histories',
+                ),
+            )
+        return queryset
+    
     def get_prefered_source(self, obj):
-        # Calculate vote score as upvotes - downvotes using annotate
-        prefered_source = obj.sources.annotate(
-            calc_score=ExpressionWrapper(F('upvotes') - F('downvotes'), output_field=IntegerField())
-        ).order_by('-calc_score', '-upvotes', 'title').first()
+        # Stored on the novel, recomputed when the votes or the sources change
+        if obj.preferred_source_id is None:
+            return None
+        if 'sources' in getattr(obj, '_prefetched_objects_cache', {}):
+            prefered_source = next(
+                (source for source in obj.sources.all() if source.pk == obj.preferred_source_id), None
+            )
+        else:
+            # Through the sources of the novel so that the source does not load its novel again
+            prefered_source = obj.sources.filter(pk=obj.preferred_source_id).first()
         
         if prefered_source:
             return NovelSourceSerializer(prefered_source, context=self.context).data
         return None
     
     def get_avg_rating(self, obj):
-        avg = obj.ratings.all().aggregate(Avg('rating'))['rating__avg']
-        return round(avg, 1) if avg else None
+        return round(obj.rating_avg, 1) if obj.rating_count else None
     
     def get_rating_count(self, obj):
-        return obj.ratings.count()
+        return obj.rating_count
     
     def get_total_views(self, obj):
+        if hasattr(obj, 'views_total'):
+            return obj.views_total or 0
         view_count = NovelViewCount.objects.filter(novel=obj).first()
         return view_count.views if view_count else 0
     
     def get_weekly_views(self, obj):
-        from datetime import datetime
-        current_date = datetime.now()
-        current_year_week = f"{current_date.isocalendar()[0]}{current_date.isocalendar()[1]:02d}"
-        
+        if hasattr(obj, 'views_this_week'):
+            return obj.views_this_week or 0
         weekly_view = WeeklyNovelView.objects.filter(
             novel=obj,
-            year_week=current_year_week
+            year_week=current_year_week()
         ).first()
         return weekly_view.views if weekly_view else 0
     
@@ -77,17 +111,71 @@ class BasicNovelSerializer(serializers.ModelSerializer):
     def get_is_bookmarked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'bookmarked'):
+                return obj.bookmarked
             return NovelBookmark.objects.filter(novel=obj, user=request.user).exists()
         return None
     
     def get_reading_history(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            history = obj.reading_histories.filter(user=request.user).first()
+            if hasattr(obj, 'user_histories'):
+                history = obj.user_histories[0] if obj.user_histories else None
+            else:
+                history = obj.reading_histories.filter(user=request.user).first()
             if history:
                 return DetailedReadingHistorySerializer(history).data
         return None
 
+class NovelCardListSerializer(serializers.ListSerializer):
+    """
+    Adds the fields of the current user to all the cards of a page at once
+    """
+    def to_representation(self, data):
+        cards = list(data.all() if hasattr(data, 'all') else data)
+        payloads = [self.child.card_data(card) for card in cards]
+        overlay = UserOverlay(self.context.get('request'))
+        for payload in payloads:
+            overlay.add_novel(payload)
+        overlay.apply()
+        return payloads
+
+
+class NovelCardSerializer(serializers.BaseSerializer):
+    """
+    Serializes a NovelCard the way BasicNovelSerializer serializes its novel: the stored card,
+    its counters and the fields of the current user
+    """
+    class Meta:
+        list_serializer_class = NovelCardListSerializer
+    
+    @staticmethod
+    def card_data(card):
+        """The card without the fields of the current user"""
+        stored = card.data
+        data = {field: stored.get(field) for field in BasicNovelSerializer.Meta.fields}
+        data.update({
+            'avg_rating': round(card.rating_avg, 1) if card.rating_count else None,
+            'rating_count': card.rating_count,
+            'total_views': card.total_views,
+            # The weekly views of a card are reset by the refresh_novel_cards task when a new week starts
+            'weekly_views': card.weekly_views if card.year_week == current_year_week() else 0,
+            'comment_count': card.comment_count,
+        })
+        if stored.get('prefered_source'):
+            data['prefered_source'] = {
+                field: stored['prefered_source'].get(field) for field in NovelSourceSerializer.Meta.fields
+            }
+        return data
+    
+    def to_representation(self, card):
+        data = self.card_data(card)
+        overlay = UserOverlay(self.context.get('request'))
+        overlay.add_novel(data)
+        overlay.apply()
+        return data
+
+
 class DetailedNovelSerializer(serializers.ModelSerializer):
     """
     Serializes detailed novel information including sources
@@ -122,21 +210,18 @@ class DetailedNovelSerializer(serializers.ModelSerializer):
             
     
     def get_prefered_source(self, obj):
-        # Calculate vote score as upvotes - downvotes using annotate
-        prefered_source = obj.sources.annotate(
-            calc_score=ExpressionWrapper(F('upvotes') - F('downvotes'), output_field=IntegerField())
-        ).order_by('-calc_score', '-upvotes', 'title').first()
+        # Stored on the novel, recomputed when the votes or the sources change
+        prefered_source = obj.sources.filter(pk=obj.preferred_source_id).first() if obj.preferred_source_id else None
         
         if prefered_source:
             return NovelSourceSerializer(prefered_source, context=self.context).data
         return None
     
     def get_avg_rating(self, obj):
-        avg = obj.ratings.all().aggregate(Avg('rating'))['rating__avg']
-        return round(avg, 1) if avg else None
+        return round(obj.rating_avg, 1) if obj.rating_count else None
     
     def get_rating_count(self, obj):
-        return obj.ratings.count()
+        return obj.rating_count
     
     def get_user_rating(self, obj):
         request = self.context.get('request')
@@ -158,13 +243,9 @@ class DetailedNovelSerializer(serializers.ModelSerializer):
         return view_count.views if view_count else 0
     
     def get_weekly_views(self, obj):
-        from datetime import datetime
-        current_date = datetime.now()
-        current_year_week = f"{current_date.isocalendar()[0]}{current_date.isocalendar()[1]:02d}"
-        
         weekly_view = WeeklyNovelView.objects.filter(
             novel=obj,
-            year_week=current_year_week
+            year_week=current_year_week()
         ).first()
         return weekly_view.views if weekly_view else 0
 
@@ -197,7 +278,7 @@ class DetailedNovelSerializer(serializers.ModelSerializer):
                 novel_id=obj.id
             ).exclude(
                 novel_id__in=existing_ids
-            ).order_by('-views')[:needed_count]
+            ).select_related('novel').order_by('-views')[:needed_count]
             
             # Combine the results
             result = list(similar_novels)
@@ -208,18 +289,20 @@ class DetailedNovelSerializer(serializers.ModelSerializer):
                 })
             similar_novels = result
         
+        # Load the novels again with everything BasicNovelSerializer reads, in a constant number of queries
+        similarities = [
+            (item.to_novel_id, item.similarity) if hasattr(item, 'to_novel') else (item['to_novel'].id, item['similarity'])
+            for item in similar_novels
+        ]
+        novels = BasicNovelSerializer.setup_queryset(
+            Novel.objects.filter(id__in=[novel_id for novel_id, _ in similarities]), self.context.get('request')
+        ).in_bulk()
+        
         # Serialize the novels
         result = []
-        for item in similar_novels:
-            if hasattr(item, 'to_novel'):
-                # Regular NovelSimilarity object
-                novel_data = BasicNovelSerializer(item.to_novel, context=self.context).data
-                novel_data['similarity'] = item.similarity
-            else:
-                # Dictionary from most viewed novels
-                novel_data = BasicNovelSerializer(item['to_novel'], context=self.context).data
-                novel_data['similarity'] = item['similarity']
-            
+        for novel_id, similarity in similarities:
+            novel_data = BasicNovelSerializer(novels[novel_id], context=self.context).data
+            novel_data['similarity'] = similarity
             result.append(novel_data)
         
         return result
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from django.db.models import OuterRef, Prefetch, Subquery
 
+from ..models.novels_models import Novel
 from ..models.users_models import ReadingList, ReadingListItem
 from auth_app.serializers import OtherUserSerializer
 from .novels_serializers import BasicNovelSerializer
@@ -20,7 +22,7 @@ class ReadingListItemSerializer(serializers.ModelSerializer):
 class ReadingListSerializer(serializers.ModelSerializer):
     user = OtherUserSerializer(read_only=True)
     items_count = serializers.SerializerMethodField()
-    first_item = ReadingListItemSerializer(read_only=True, source='items.first')
+    first_item = serializers.SerializerMethodField()
     items_names = serializers.SerializerMethodField()
     
     class Meta:
@@ -28,9 +30,35 @@ class ReadingListSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description', 'user', 'items_count', 'created_at', 'updated_at', 'first_item', 'items_names']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
     
+    @staticmethod
+    def setup_queryset(queryset, request=None):
+        """
+        Prefetch the items of the lists, and everything the serializer shows of their first novel
+        """
+        first_item = ReadingListItem.objects.filter(reading_list=OuterRef('reading_list')).values('pk')[:1]
+        return queryset.select_related('user').prefetch_related(
+            Prefetch('items', queryset=ReadingListItem.objects.select_related('novel')),
+            Prefetch(
+                'items',
+                queryset=ReadingListItem.objects.filter(pk=Subquery(first_item)).prefetch_related(
+                    Prefetch('novel', queryset=BasicNovelSerializer.setup_queryset(Novel.objects.all(), request))
+                ),
+                to_attr='first_items',
+            ),
+        )
+    
     def get_items_count(self, obj):
         return obj.items.count()
     
+    def get_first_item(self, obj):
+        if hasattr(obj, 'first_items'):
+            first_item = obj.first_items[0] if obj.first_items else None
+        else:
+            first_item = obj.items.first()
+        if first_item:
+            return ReadingListItemSerializer(first_item, context=self.context).data
+        return None
+    
     def get_items_names(self, obj):
         return [item.novel.title for item in obj.items.all() if item.novel]
 
@@ -42,4 +70,13 @@ class DetailedReadingListSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReadingList
         fields = ['id', 'title', 'description', 'user', 'items', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+    
+    @staticmethod
+    def setup_queryset(queryset, request=None):
+        """
+        Prefetch the items of the list and everything the serializer shows of their novels
+        """
+        return queryset.select_related('user').prefetch_related(
+            Prefetch('items__novel', queryset=BasicNovelSerializer.setup_queryset(Novel.objects.all(), request)),
+        )
\ No newline at end of file
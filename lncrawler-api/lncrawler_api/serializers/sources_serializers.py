@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from django.conf import settings
-from ..models import NovelFromSource
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from ..models import NovelFromSource, Chapter, Volume, SourceVote, ReadingHistory
 from urllib.parse import quote
 from ..utils import get_client_ip
+from ..services.chapter_index import get_index
 from .users_serializers import ReadingHistorySerializer
 from .chapter_serializers import ChapterSerializer
 
@@ -35,6 +37,43 @@ class NovelSourceSerializer(serializers.ModelSerializer):
             'latest_available_chapter', 'reading_history', 'overview_url',
         ]
 
+    @staticmethod
+    def setup_queryset(queryset, request=None):
+        """
+        Annotate and prefetch everything the serializer reads, so that a list of sources
+        is serialized in a constant number of queries
+        """
+        def count(model):
+            return Subquery(
+                model.objects.filter(novel_from_source=OuterRef('pk')).order_by()
+                .values('novel_from_source').annotate(total=Count('pk')).values('total')
+            )
+
+        queryset = queryset.select_related('external_source').annotate(
+            num_chapters=count(Chapter),
+            num_volumes=count(Volume),
+        ).prefetch_related(
+            'authors',
+            'tags',
+            Prefetch('chapters', queryset=Chapter.latest_per_source(has_content=True), to_attr='latest_available_chapters'),
+        )
+        if request is None:
+            return queryset
+        client_ip = get_client_ip(request)
+        if client_ip:
+            queryset = queryset.prefetch_related(
+                Prefetch('votes', queryset=SourceVote.objects.filter(ip_address=client_ip), to_attr='client_votes')
+            )
+        if request.user.is_authenticated:
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'read_by_users',
+                    queryset=ReadingHistory.objects.filter(user=request.user).select_related('last_read_chapter'),
+                    to_attr='user_histories',
+                )
+            )
+        return queryset
+
     def get_cover_url(self, obj: NovelFromSource):
         if obj.cover_path:
             return quote(f"{settings.SITE_API_URL}/{settings.LNCRAWL_URL}{obj.cover_path}", safe=':/')
@@ -65,6 +104,8 @@ class NovelSourceSerializer(serializers.ModelSerializer):
         if not client_ip:
             return None
             
+        if hasattr(obj, 'client_votes'):
+            return obj.client_votes[0].vote_type if obj.client_votes else None
         try:
             vote = obj.votes.filter(ip_address=client_ip).first()
             return vote.vote_type if vote else None
@@ -85,7 +126,11 @@ class NovelSourceSerializer(serializers.ModelSerializer):
     
     def get_latest_available_chapter(self, obj: NovelFromSource):
         """Return the latest available chapter with content"""
-        latest_chapter = obj.chapters.filter(has_content=True).order_by('-chapter_id').first()
+        if hasattr(obj, 'latest_available_chapters'):
+            latest_chapter = obj.latest_available_chapters[0] if obj.latest_available_chapters else None
+            return ChapterSerializer(latest_chapter).data if latest_chapter else None
+        latest_chapter_id = get_index(obj).latest()
+        latest_chapter = obj.chapters.filter(chapter_id=latest_chapter_id).first() if latest_chapter_id is not None else None
         if latest_chapter:
             return ChapterSerializer(latest_chapter).data
         return None
@@ -96,7 +141,10 @@ class NovelSourceSerializer(serializers.ModelSerializer):
         """
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            history = obj.read_by_users.filter(user=request.user).first()
+            if hasattr(obj, 'user_histories'):
+                history = obj.user_histories[0] if obj.user_histories else None
+            else:
+                history = obj.read_by_users.filter(user=request.user).first()
             if history:
                 return ReadingHistorySerializer(history).data
         return None
@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from django.db.models import OuterRef, Prefetch, Subquery
 
 from ..models import ReadingHistory, Chapter
 from .chapter_serializers import ChapterSerializer
+from ..services.chapter_index import get_index
 
 class ReadingHistorySerializer(serializers.ModelSerializer):
     """
@@ -29,6 +31,24 @@ class DetailedReadingHistorySerializer(serializers.ModelSerializer):
         fields = ['id', 'novel_slug', 'source_slug', 'last_read_chapter', 'last_read_at', 'next_chapter', 'source_latest_chapter']
         read_only_fields = ['id',  'last_read_at', 'next_chapter', 'source_latest_chapter']
     
+    @staticmethod
+    def setup_queryset(queryset, user):
+        """
+        Load the chapters the serializer shows along with the reading histories of the user
+        """
+        # The first chapter with content after the last read one, in a single query for all the histories
+        last_read_chapter_id = ReadingHistory.objects.filter(
+            user=user, source=OuterRef(OuterRef('novel_from_source')),
+        ).values('last_read_chapter__chapter_id')[:1]
+        next_chapter_id = Chapter.objects.filter(
+            novel_from_source=OuterRef('novel_from_source'), has_content=True, chapter_id__gt=Subquery(last_read_chapter_id),
+        ).order_by('chapter_id').values('chapter_id')[:1]
+        next_chapters = Chapter.objects.filter(has_content=True, chapter_id=Subquery(next_chapter_id))
+        return queryset.filter(user=user).select_related('novel', 'source', 'last_read_chapter').prefetch_related(
+            Prefetch('source__chapters', queryset=next_chapters, to_attr='next_chapters'),
+            Prefetch('source__chapters', queryset=Chapter.latest_per_source(), to_attr='latest_chapters'),
+        )
+    
     def get_novel_slug(self, obj):
         return obj.novel.slug
     
@@ -36,17 +56,20 @@ class DetailedReadingHistorySerializer(serializers.ModelSerializer):
         return obj.source.source_slug
 
     def get_next_chapter(self, obj):
-        try:
-            next_chapter = Chapter.objects.get(
-                novel_from_source=obj.source,
-                chapter_id=obj.last_read_chapter.chapter_id + 1,
-                has_content=True
-            )
+        if hasattr(obj.source, 'next_chapters'):
+            next_chapter = obj.source.next_chapters[0] if obj.source.next_chapters else None
             return ChapterSerializer(next_chapter).data if next_chapter else None
-        except Chapter.DoesNotExist:
+        # The chapters without content are skipped
+        next_chapter_id = get_index(obj.source).next(obj.last_read_chapter.chapter_id)
+        if next_chapter_id is None:
             return None
+        next_chapter = Chapter.objects.filter(novel_from_source=obj.source, chapter_id=next_chapter_id).first()
+        return ChapterSerializer(next_chapter).data if next_chapter else None
     
     def get_source_latest_chapter(self, obj):
+        if hasattr(obj.source, 'latest_chapters'):
+            latest_chapter = obj.source.latest_chapters[0] if obj.source.latest_chapters else None
+            return ChapterSerializer(latest_chapter).data if latest_chapter else None
         try:
             latest_chapter = Chapter.objects.filter(
                 novel_from_source=obj.source
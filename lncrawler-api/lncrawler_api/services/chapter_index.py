@@ -0,0 +1,89 @@
+"""
+Per-source index of the chapters with content, used by the chapter navigation.
+
+Reading a chapter used to run two ordered queries to find the previous and the next chapter, and
+offered none when the adjacent chapter had no content. The index of a source is the sorted array of
+the numbers of its chapters with content, built in one query and kept in the memory of the process:
+the previous, next and latest chapters with content are then bisections, without queries, and the
+chapters that failed to download are skipped.
+
+An index is valid for the last_chapter_update stamp of its source, that every import of chapters
+sets, so the first read after an import builds it again. Chapters whose content status changes
+outside of an import (update_chapter_content_status) are seen after CHAPTER_INDEX_TTL seconds.
+At most CHAPTER_INDEX_MAX_SOURCES indexes are kept, the least recently read are dropped first.
+"""
+import time
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from django.conf import settings
+
+
+class ChapterIndex:
+    """
+    Sorted numbers of the chapters with content of a source
+    """
+
+    def __init__(self, chapter_ids):
+        # 8 bytes per chapter, the numbers must already be sorted
+        self.chapter_ids = array('q', chapter_ids)
+
+    def __len__(self):
+        return len(self.chapter_ids)
+
+    def has_content(self, chapter_id):
+        position = bisect_left(self.chapter_ids, chapter_id)
+        return position < len(self.chapter_ids) and self.chapter_ids[position] == chapter_id
+
+    def previous(self, chapter_id):
+        """Number of the last chapter with content before chapter_id, or None"""
+        position = bisect_left(self.chapter_ids, chapter_id)
+        return self.chapter_ids[position - 1] if position > 0 else None
+
+    def next(self, chapter_id):
+        """Number of the first chapter with content after chapter_id, or None"""
+        position = bisect_right(self.chapter_ids, chapter_id)
+        return self.chapter_ids[position] if position < len(self.chapter_ids) else None
+
+    def latest(self):
+        """Number of the last chapter with content, or None"""
+        return self.chapter_ids[-1] if self.chapter_ids else None
+
+
+# source id: (last_chapter_update of the source, time.monotonic() of the build, index)
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def build_index(source_id):
+    from ..models import Chapter
+
+    return ChapterIndex(
+        Chapter.objects.filter(novel_from_source_id=source_id, has_content=True)
+        .order_by('chapter_id').values_list('chapter_id', flat=True)
+    )
+
+
+def get_index(source):
+    """The chapter index of the source, built on the first read after an import"""
+    now = time.monotonic()
+    with _lock:
+        entry = _indexes.get(source.pk)
+        if entry and entry[0] == source.last_chapter_update and now - entry[1] < settings.CHAPTER_INDEX_TTL:
+            _indexes.move_to_end(source.pk)
+            return entry[2]
+
+    index = build_index(source.pk)
+    with _lock:
+        _indexes[source.pk] = (source.last_chapter_update, now, index)
+        _indexes.move_to_end(source.pk)
+        while len(_indexes) > settings.CHAPTER_INDEX_MAX_SOURCES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def clear():
+    """Drop the indexes of this process"""
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,178 @@
+"""
+Metrics of the downloader jobs: time spent searching, downloading and importing, chapters fetched,
+failed or empty, HTTP requests and bytes. Each job gets a JobMetrics row and its numbers are added
+to the daily totals of its source (SourceMetrics). The retries of the failed chapters are added to
+the totals of their source by retry_failed_chapters.
+"""
+import time
+import threading
+import logging
+from collections import defaultdict
+from ..utils.chapter_store import FAIL_MESSAGE
+from ..utils.lncrawler_paths import get_source_name
+
+logger = logging.getLogger('lncrawler_api')
+
+
+class RequestMeter:
+    """
+    Counts the HTTP requests a crawler makes: all of them, the failed ones and the bytes received
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.failed_requests = 0
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+
+    def attach(self, crawler):
+        """
+        Wrap the request methods of the HTTP session of the crawler
+        Returns False if the crawler does not expose its session
+        """
+        session = getattr(crawler, 'scraper', None)
+        if session is None:
+            return False
+        for method in ('get', 'post'):
+            request = getattr(session, method, None)
+            if request is not None:
+                setattr(session, method, self._wrap(request))
+        return True
+
+    def _wrap(self, request):
+        def metered_request(*args, **kwargs):
+            try:
+                response = request(*args, **kwargs)
+            except Exception:
+                self._count(failed=True)
+                raise
+            self._count(failed=response.status_code >= 400, size=len(response.content or b''))
+            return response
+
+        return metered_request
+
+    def _count(self, failed=False, size=0):
+        with self._lock:
+            self.requests += 1
+            self.failed_requests += int(failed)
+            self.bytes_downloaded += size
+
+
+class JobRecorder:
+    """
+    Collects the metrics of one job while it runs, save() stores them
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.source_name = None
+        self.times = defaultdict(float)
+        self.chapters = 0
+        self.chapters_failed = 0
+        self.chapters_empty = 0
+        self.meter = RequestMeter()
+        self._metered = False
+        self._started = {}
+
+    def start(self, phase):
+        self._started[phase] = time.monotonic()
+
+    def stop(self, phase):
+        started = self._started.pop(phase, None)
+        if started is not None:
+            self.times[phase] += time.monotonic() - started
+
+    def attach(self, crawler):
+        self._metered = self.meter.attach(crawler)
+
+    def set_source(self, url):
+        try:
+            self.source_name = get_source_name(url)
+        except IndexError:
+            self.source_name = None
+
+    def count_chapters(self, chapters):
+        """Count the outcome of the chapters the download tried to fetch"""
+        body_bytes = 0
+        for chapter in chapters or []:
+            body = chapter.get('body') or ''
+            if not chapter.get('success'):
+                self.chapters_failed += 1
+            elif not body or FAIL_MESSAGE in body:
+                self.chapters_empty += 1
+            else:
+                self.chapters += 1
+                body_bytes += len(body.encode('utf-8'))
+        if not self._metered:
+            # Without the request counts, the size of the chapters is the best estimate of the bytes received
+            self.meter.bytes_downloaded += body_bytes
+
+    def save(self):
+        """
+        Store the metrics of the job and add them to the totals of its source
+        Phases still running are ended first
+        """
+        from ..models import Job, JobMetrics, SourceMetrics
+
+        for phase in list(self._started):
+            self.stop(phase)
+        try:
+            job = Job.objects.filter(id=self.job_id).values('status', 'cancel_requested').first()
+            if job is None:
+                return None
+            if job['cancel_requested']:
+                # The chapters left were not fetched because of the cancellation, they did not fail
+                self.chapters_failed = 0
+            values = {
+                'search_time': round(self.times['search'], 3),
+                'download_time': round(self.times['download'], 3),
+                'import_time': round(self.times['import'], 3),
+                'chapters': self.chapters,
+                'chapters_failed': self.chapters_failed,
+                'chapters_empty': self.chapters_empty,
+                'requests': self.meter.requests,
+                'failed_requests': self.meter.failed_requests,
+                'bytes_downloaded': self.meter.bytes_downloaded,
+            }
+            metrics, _ = JobMetrics.objects.update_or_create(
+                job_id=self.job_id, defaults={'source_name': self.source_name, **values}
+            )
+            if self.source_name:
+                # Searches are added to the totals per source, by record_source_search
+                values.pop('search_time')
+                SourceMetrics.record(
+                    self.source_name,
+                    downloads=1,
+                    download_failures=int(job['status'] == Job.STATUS_FAILED and not job['cancel_requested']),
+                    **values,
+                )
+            return metrics
+        except Exception as e:
+            # Metrics must never fail a job
+            logger.error(f"Error saving the metrics of job {self.job_id}: {str(e)}")
+            return None
+
+
+def record_source_search(link, elapsed, error=None):
+    """Add the search of one source to its totals"""
+    from ..models import SourceMetrics
+
+    try:
+        SourceMetrics.record(
+            get_source_name(link),
+            searches=1,
+            search_failures=int(bool(error)),
+            search_time=round(elapsed, 3),
+        )
+    except Exception as e:
+        logger.error(f"Error saving the search metrics of {link}: {str(e)}")
+
+
+def record_chapter_retry(link, retried, recovered):
+    """Add the failed chapters of one source downloaded again, and those recovered, to its totals"""
+    from ..models import SourceMetrics
+
+    try:
+        SourceMetrics.record(get_source_name(link), chapter_retries=retried, chapters_recovered=recovered)
+    except Exception as e:
+        logger.error(f"Error saving the retry metrics of {link}: {str(e)}")
@@ -0,0 +1,197 @@
+"""
+Database connections of the downloader threads.
+
+Django gives every thread its own connection and only closes the connections of the request threads,
+so each job (its thread, its progress monitor and its lease keeper) kept connections open until the
+process exited. A job now reserves CONNECTIONS_PER_JOB connections of a bounded pool
+(DOWNLOADER_DB_CONNECTIONS) before touching the database and waits for a free slot when the pool is
+full. Each of its threads checks the health of its connection while it runs and closes it when it ends.
+"""
+import threading
+import logging
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('lncrawler_api')
+
+# The job thread, its progress monitor and its lease keeper
+CONNECTIONS_PER_JOB = 3
+
+
+class ConnectionPoolTimeout(Exception):
+    """No database connection became available in time for a job"""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connection slots shared by the downloader jobs of this process
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.in_use = 0
+        self.waiting = 0
+        self.peak = 0
+        self.timeouts = 0
+        self.opened = 0
+        self.closed = 0
+        self.recycled = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, count=1, timeout=None):
+        """
+        Take count slots, waiting up to timeout seconds for them to be released
+        Returns False if they did not become available in time
+        """
+        # A job must be able to run even if the pool is smaller than what it needs
+        count = min(count, self.size)
+        with self._condition:
+            self.waiting += 1
+            try:
+                acquired = self._condition.wait_for(lambda: self.in_use + count <= self.size, timeout=timeout)
+            finally:
+                self.waiting -= 1
+            if not acquired:
+                self.timeouts += 1
+                return False
+            self.in_use += count
+            self.peak = max(self.peak, self.in_use)
+            return True
+
+    def release(self, count=1):
+        count = min(count, self.size)
+        with self._condition:
+            self.in_use = max(0, self.in_use - count)
+            self._condition.notify_all()
+
+    def count(self, counter):
+        with self._condition:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'peak': self.peak,
+                'timeouts': self.timeouts,
+                # Connections opened and closed by the downloader threads since the process started
+                'opened': self.opened,
+                'closed': self.closed,
+                'open': max(0, self.opened - self.closed),
+                'recycled': self.recycled,
+            }
+
+
+pool = ConnectionPool(settings.DOWNLOADER_DB_CONNECTIONS)
+
+# Threads whose connection is counted by the pool
+_tracked = threading.local()
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    if getattr(_tracked, 'active', False):
+        pool.count('opened')
+
+
+connection_created.connect(_on_connection_created, dispatch_uid='lncrawler_api.db_pool')
+
+
+def track_thread():
+    """Count the connections this thread opens in the pool metrics"""
+    _tracked.active = True
+
+
+def check_connection(ping=False):
+    """
+    Health check of the connection of this thread: a connection that failed a query and does not
+    answer anymore, or that is older than CONN_MAX_AGE, is closed and the next query opens a new one.
+    With ping, the connection is queried even if no error occurred.
+    """
+    if connection.connection is None:
+        return
+    if ping and not connection.is_usable():
+        logger.warning("Replacing a broken database connection")
+        close_connection()
+        pool.count('recycled')
+        return
+    connection.close_if_unusable_or_obsolete()
+    if connection.connection is None:
+        pool.count('recycled')
+        if getattr(_tracked, 'active', False):
+            pool.count('closed')
+
+
+def close_connection():
+    """Close the connection of this thread, for threads Django does not close the connection of"""
+    was_open = connection.connection is not None
+    try:
+        connection.close()
+    except Exception as e:
+        logger.error(f"Error closing the database connection: {str(e)}")
+    if was_open and getattr(_tracked, 'active', False):
+        pool.count('closed')
+
+
+def thread_connection(target):
+    """
+    Wrap the target of a helper thread of a job (progress monitor, lease keeper) so that its connection
+    is counted and closed when it ends. Its slot is part of the reservation of the job
+    """
+    def run(*args, **kwargs):
+        track_thread()
+        try:
+            return target(*args, **kwargs)
+        finally:
+            close_connection()
+
+    return run
+
+
+class JobConnections:
+    """
+    Connection slots reserved by a job for its threads, released with their connections when it ends
+    """
+
+    def __init__(self, job_id, count=CONNECTIONS_PER_JOB):
+        self.job_id = job_id
+        self.count = count
+        self.held = False
+
+    def acquire(self, timeout=None):
+        if timeout is None:
+            timeout = settings.DOWNLOADER_DB_CONNECTION_TIMEOUT
+        track_thread()
+        if not pool.acquire(self.count, timeout=timeout):
+            raise ConnectionPoolTimeout(
+                f"No database connection available for job {self.job_id} after {timeout} seconds"
+            )
+        self.held = True
+        check_connection(ping=True)
+
+    def release(self):
+        close_connection()
+        if self.held:
+            self.held = False
+            pool.release(self.count)
+
+
+def connection_stats():
+    """
+    Connection metrics of the downloader pool of this process and, on PostgreSQL,
+    the number of connections the server holds for the database
+    """
+    stats = {'pool': pool.stats(), 'server': None}
+    if connection.vendor == 'postgresql':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT state, COUNT(*) FROM pg_stat_activity WHERE datname = current_database() GROUP BY state"
+                )
+                states = {state or 'unknown': count for state, count in cursor.fetchall()}
+            stats['server'] = {'total': sum(states.values()), 'states': states}
+        except Exception as e:
+            logger.error(f"Error reading the database connections: {str(e)}")
+    return stats
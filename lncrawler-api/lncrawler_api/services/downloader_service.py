@@ -6,12 +6,26 @@ import time
 import logging
 import importlib.util
 import threading
+from contextlib import ExitStack
+from datetime import timedelta
 from pathlib import Path
+from urllib.parse import urlsplit
 import django
 from ..utils import lncrawler_paths
 from ..utils import chapter_utils
+from ..utils import chapter_store
+from . import search_cache
+from . import source_search
+from . import title_index
+from . import db_pool
+from .crawler_metrics import JobRecorder, record_source_search
+from .job_lease import JobLease, WORKER_ID, expired_lease_filter
+from .job_cancel import CancellationToken, request_cancel
 
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
 
 # Configure logger
 logger = logging.getLogger('lncrawler_api')
@@ -93,15 +107,14 @@ class DownloaderService:
     @staticmethod
     def refresh_connection():
         """
-        Refresh the database connection
-        This is useful in a subprocess to ensure the connection is valid
+        Make sure the database connection of this thread is valid
+        A connection that does not answer is replaced, a healthy one is kept
         """
         from django.db import connection
         try:
-            connection.close()
-            connection.connect()
+            db_pool.check_connection(ping=True)
             connection.ensure_connection()
-            logger.debug("Database connection refreshed successfully")
+            logger.debug("Database connection checked successfully")
         except Exception as e:
             logger.error(f"Failed to refresh database connection: {str(e)}")
             raise
@@ -112,6 +125,12 @@ class DownloaderService:
         Run novel search in a separate process
         This is executed in a new process to avoid blocking the main thread
         """
+        lease = JobLease(job_id)
+        cancel_token = CancellationToken(job_id)
+        cancel_token.register()
+        metrics = JobRecorder(job_id)
+        metrics.start('search')
+        db_connections = db_pool.JobConnections(job_id)
         try:
             # Get the base directory for the crawler package
             base_dir = Path(settings.BASE_DIR).parent
@@ -124,7 +143,8 @@ class DownloaderService:
             sys.path.insert(0, str(lncrawl_dir.parent))
             sys.path.insert(0, str(lncrawl_dir))
             
-            # Setup Django in the subprocess
+            # Wait for free database connections, then setup Django in the subprocess
+            db_connections.acquire()
             DownloaderService._setup_django()
             
             # Import the Job model here to avoid circular imports
@@ -132,7 +152,10 @@ class DownloaderService:
             
             # Get the job
             job = Job.objects.get(id=job_id)
-            job.update_status(Job.STATUS_SEARCHING)
+            lease.acquire()
+            if not job.update_status_unless_cancelled(Job.STATUS_SEARCHING):
+                logger.info(f"Search job {job_id} cancelled before it started")
+                return
             # Import bot class
             PythonApiBot = DownloaderService._import_python_api_bot()
             # Create bot instance
@@ -141,20 +164,33 @@ class DownloaderService:
             response = bot.start()
             
             if response["status"] != "ready":
-                job.update_status(Job.STATUS_FAILED, f"Failed to start bot: {response.get('message', 'Unknown error')}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Failed to start bot: {response.get('message', 'Unknown error')}")
                 return
             
             # Initialize app session
             response = bot.init_app()
             if response["status"] != "success":
-                job.update_status(Job.STATUS_FAILED, f"Failed to initialize app: {response.get('message', 'Unknown error')}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Failed to initialize app: {response.get('message', 'Unknown error')}")
+                return
+            
+            # Search the sources ourselves when the crawler package exposes them:
+            # dead sources are skipped and every source gets a timeout derived from its latency
+            searchable = source_search.load_searchable_sources()
+            if searchable:
+                try:
+                    DownloaderService._run_source_search(job, query, *searchable, cancel_token=cancel_token)
+                finally:
+                    try:
+                        bot.destroy_app()
+                    except Exception as e:
+                        logger.error(f"Error destroying bot: {str(e)}")
                 return
             
             # Start a background thread to periodically update progress
             stop_monitoring = threading.Event()
             
             def monitor_search_progress():
-                while not stop_monitoring.is_set():
+                while not stop_monitoring.is_set() and not cancel_token.is_cancelled():
                     try:
                         status = bot.get_search_status()
                         if status["status"] == "success":
@@ -167,18 +203,19 @@ class DownloaderService:
                                 break
                     except Exception as e:
                         logger.error(f"Error monitoring search progress: {str(e)}")
-                    time.sleep(2)
+                    db_pool.check_connection()
+                    cancel_token.wait(2)
                 job.update_progress(0, 0) # Reset progress when done
 
             # Start monitoring thread before starting search
-            monitor_thread = threading.Thread(target=monitor_search_progress)
+            monitor_thread = threading.Thread(target=db_pool.thread_connection(monitor_search_progress))
             monitor_thread.daemon = True
             monitor_thread.start()
             
             # Start search
             response = bot.start_search(query)
             if response["status"] != "success":
-                job.update_status(Job.STATUS_FAILED, f"Search failed: {response.get('message', 'Unknown error')}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Search failed: {response.get('message', 'Unknown error')}")
                 stop_monitoring.set()
                 return
             
@@ -189,15 +226,22 @@ class DownloaderService:
                 if not stop_monitoring.is_set():
                     stop_monitoring.set()
                 
+                if cancel_token.is_cancelled():
+                    logger.info(f"Search job {job_id} cancelled")
+                    return
+                
                 # Get search results
                 results = bot.get_search_results()
                 if results["status"] != "success":
-                    job.update_status(Job.STATUS_FAILED, f"Failed to get search results: {results.get('message', 'Unknown error')}")
+                    job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Failed to get search results: {results.get('message', 'Unknown error')}")
                     return
                 
                 # Update job with search results
                 job.update_search_results(results)
-                job.update_status(Job.STATUS_SEARCH_COMPLETED)
+                job.update_status_unless_cancelled(Job.STATUS_SEARCH_COMPLETED)
+                
+                # Let the next identical query skip the crawl
+                search_cache.store_results(query, results)
                 
             finally:
                 # Ensure monitoring thread is stopped
@@ -218,14 +262,59 @@ class DownloaderService:
                 DownloaderService._setup_django()
                 from ..models import Job
                 job = Job.objects.get(id=job_id)
-                job.update_status(Job.STATUS_FAILED, f"Search process error: {str(e)}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Search process error: {str(e)}")
             except Exception:
                 pass
+        finally:
+            metrics.save()
+            cancel_token.unregister()
+            lease.release()
+            db_connections.release()
     
     @staticmethod
-    def _import_novel_to_database(output_path, job):
+    def _run_source_search(job, query, links, prepare_crawler, cancel_token=None):
+        """
+        Search every live source in parallel with per-source timeouts and store the combined results
+        The results of each source are stored as soon as it answers, so clients can show them before the search ends
+        """
+        from ..models import Job, SearchSourceResult
+
+        plan, skipped = source_search.plan_sources(links)
+        if skipped:
+            logger.info(f"Skipping {len(skipped)} dead sources for search '{query}'")
+        job.update_progress(0, len(plan))
+
+        # A resumed search starts over
+        job.source_results.all().delete()
+        searched = []
+
+        def on_source_done(link, results, error):
+            SearchSourceResult.objects.create(job=job, source_url=link, results=results, error=error)
+            # The sources are searched in parallel, the time since the start is the time of this source
+            record_source_search(link, time.monotonic() - started, error)
+            searched.append(link)
+            job.update_progress(len(searched), len(plan))
+
+        started = time.monotonic()
+        cancelled = cancel_token.is_cancelled if cancel_token is not None else None
+        results_by_source = source_search.search_sources(plan, query, prepare_crawler, on_source_done, cancelled=cancelled)
+        if cancelled is not None and cancelled():
+            logger.info(f"Search job {job.id} cancelled")
+            return
+        results = source_search.combine_results(results_by_source, query)
+
+        job.update_progress(0, 0)  # Reset progress when done
+        job.update_search_results(results)
+        job.update_status_unless_cancelled(Job.STATUS_SEARCH_COMPLETED)
+
+        # Let the next identical query skip the crawl
+        search_cache.store_results(query, results)
+
+    @staticmethod
+    def _import_novel_to_database(output_path, job, chapter_ids=None):
         """
         Import the downloaded novel into the database using the meta.json file
+        If chapter_ids is given, only those chapters (and chapters new to the database) are imported
         """
         try:
             # Find meta.json file in the output directory
@@ -238,7 +327,7 @@ class DownloaderService:
             from ..models import NovelFromSource
             
             # Use the NovelFromSource's method to import from meta.json
-            novel = NovelFromSource.from_meta_json(meta_json_path)
+            novel = NovelFromSource.from_meta_json(meta_json_path, chapter_ids=chapter_ids)
             
             if novel:
                 job.output_slug = novel.novel.slug + "/" + novel.source_slug
@@ -254,12 +343,118 @@ class DownloaderService:
             return False, f"Error importing novel to database: {str(e)}"
     
     @staticmethod
-    def _run_download_process(job_id, novel_url):
+    def _get_crawler_chapters(bot):
+        """
+        Return the full chapter list the crawler found for the novel,
+        or None if the bot does not expose it
+        """
+        app = getattr(bot, 'app', None)
+        crawler = getattr(app, 'crawler', None)
+        chapters = getattr(crawler, 'chapters', None)
+        if chapters is None or not hasattr(app, 'chapters'):
+            return None
+        return list(chapters)
+
+    @staticmethod
+    def _stop_bot_download(bot):
+        """
+        Stop the chapter fetching of the bot: the pending chapter requests are dropped,
+        the ones already running end on their own
+        """
+        crawler = getattr(getattr(bot, 'app', None), 'crawler', None)
+        executor = getattr(crawler, 'executor', None)
+        if executor is None:
+            logger.warning("Bot does not expose its crawler executor, the download stops when the bot is destroyed")
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _save_partial_output(bot):
+        """
+        Save the chapters fetched so far and the metadata listing them, the way the crawler does
+        at the end of a download, so that an update download only fetches the remaining chapters
+        Returns the number of chapters saved
+        """
+        app = getattr(bot, 'app', None)
+        if app is None or not getattr(app, 'output_path', None):
+            return 0
+        try:
+            from lncrawl.core.downloader import _save_chapter
+            from lncrawl.core.novel_info import save_metadata
+        except ImportError:
+            return 0
+
+        saved = 0
+        try:
+            for chapter in getattr(app, 'chapters', None) or []:
+                if chapter.get('success') and chapter.get('body'):
+                    _save_chapter(app, chapter)
+                    saved += 1
+            save_metadata(app)
+        except Exception as e:
+            logger.error(f"Error saving the partial output: {str(e)}")
+        return saved
+
+    @staticmethod
+    def _find_chapters_to_update(source_url, chapters, output_path):
+        """
+        Diff the chapters listed by the source against the library.
+        Returns (pending_ids, fetch_ids):
+        - pending_ids: chapters that are missing from the database or stored without content
+        - fetch_ids: the pending chapters that are not already downloaded on disk either
+        """
+        from ..models import Chapter
+
+        done_ids = set(
+            Chapter.objects.filter(
+                novel_from_source__source_url=source_url,
+                has_content=True
+            ).values_list('chapter_id', flat=True)
+        )
+
+        pending_ids = []
+        fetch_ids = []
+        for chapter in chapters:
+            chapter_id = chapter.get('id')
+            if chapter_id in done_ids:
+                continue
+            pending_ids.append(chapter_id)
+            # Downloaded by a previous run that was never imported (or imported before it finished)
+            if not chapter_utils.check_chapter_has_content(output_path, chapter_id):
+                fetch_ids.append(chapter_id)
+        return pending_ids, fetch_ids
+
+    @staticmethod
+    def _complete_up_to_date(job, output_path):
+        """
+        Complete an update job that found nothing to fetch
+        """
+        from ..models import Job, NovelFromSource
+
+        novel_from_source = NovelFromSource.objects.filter(
+            source_url=job.selected_novel["url"]
+        ).select_related('novel').first()
+        if novel_from_source:
+            job.output_slug = novel_from_source.novel.slug + "/" + novel_from_source.source_slug
+        job.output_path = output_path
+        job.import_message = "Already up to date, no new chapters to download"
+        job.save(update_fields=['output_slug', 'output_path', 'import_message', 'updated_at'])
+        job.update_progress(0, 0)
+        job.update_status_unless_cancelled(Job.STATUS_DOWNLOAD_COMPLETED)
+
+    @staticmethod
+    def _run_download_process(job_id, novel_url, update_only=False):
         """
         Run novel download in a separate process
         This is executed in a new process to avoid blocking the main thread
         """
         logger.debug(f"Running download process for job ID: {job_id}")
+        lease = JobLease(job_id)
+        cancel_token = CancellationToken(job_id)
+        cancel_token.register()
+        metrics = JobRecorder(job_id)
+        metrics.set_source(novel_url)
+        db_connections = db_pool.JobConnections(job_id)
         try:
             # Get the base directory for the crawler package
             base_dir = Path(settings.BASE_DIR).parent
@@ -272,18 +467,22 @@ class DownloaderService:
             sys.path.insert(0, str(lncrawl_dir.parent))
             sys.path.insert(0, str(lncrawl_dir))
             
-            # Setup Django in the subprocess
+            # Wait for free database connections, then setup Django in the subprocess
+            db_connections.acquire()
             logger.debug("Setting up Django in subprocess")
             DownloaderService._setup_django()
             logger.debug("Django setup complete")
             
             # Import the Job model here to avoid circular imports
-            from ..models import Job
+            from ..models import Job, NovelFromSource
             
             # Get the job
             job = Job.objects.get(id=job_id)
             logger.debug(f"Job found: {job}")
-            job.update_status(Job.STATUS_DOWNLOADING)
+            lease.acquire()
+            if not job.update_status_unless_cancelled(Job.STATUS_DOWNLOADING):
+                logger.info(f"Download job {job_id} cancelled before it started")
+                return
             
             # Import bot class
             PythonApiBot = DownloaderService._import_python_api_bot()
@@ -296,20 +495,20 @@ class DownloaderService:
             logger.debug(f"Bot started: {response}")
             
             if response["status"] != "ready":
-                job.update_status(Job.STATUS_FAILED, f"Failed to start bot: {response.get('message', 'Unknown error')}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Failed to start bot: {response.get('message', 'Unknown error')}")
                 return
             
             # Initialize app session
             response = bot.init_app()
             if response["status"] != "success":
-                job.update_status(Job.STATUS_FAILED, f"Failed to initialize app: {response.get('message', 'Unknown error')}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Failed to initialize app: {response.get('message', 'Unknown error')}")
                 return
             
             # Set the novel URL directly
             logger.debug(f"Setting novel URL: {novel_url}")
             response = bot.set_novel_url(novel_url)
             if response["status"] != "success":
-                job.update_status(Job.STATUS_FAILED, f"Failed to set novel URL: {response.get('message', 'Unknown error')}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Failed to set novel URL: {response.get('message', 'Unknown error')}")
                 return
         
             # Store selected novel info
@@ -320,11 +519,23 @@ class DownloaderService:
                 "url": response.get("novel_url", "")
             }
             job.save(update_fields=['selected_novel', 'updated_at'])
+            metrics.set_source(job.selected_novel["url"] or novel_url)
             
-            # Set custom output path
+            # Set custom output path, the source goes in the folder of a library novel only when the library
+            # already has it, when the user accepted that novel in start_download or when both titles have
+            # the same normalised key
+            novel_path = job.library_novel_path
+            if not novel_path:
+                known_source = NovelFromSource.objects.filter(source_url=job.selected_novel["url"]).select_related('novel').first()
+                novel_path = known_source.novel.novel_path if known_source else None
+            if not novel_path:
+                library_match = title_index.find_novel(job.selected_novel["title"])
+                if library_match and title_index.title_key(library_match[1].title) == title_index.title_key(job.selected_novel["title"]):
+                    novel_path = library_match[1].novel_path
             custom_output_path = lncrawler_paths.get_novel_output_path(
                 source=job.selected_novel["url"].split("/")[2],
-                novel=job.selected_novel["title"]
+                novel=job.selected_novel["title"],
+                novel_path=novel_path
             )
 
             # If the path exist and is compressed, decompress it
@@ -336,7 +547,7 @@ class DownloaderService:
             
             output_path_response = bot.set_output_path(custom_output_path)
             if output_path_response["status"] != "success":
-                job.update_status(Job.STATUS_FAILED, f"Failed to set output path: {output_path_response.get('message', 'Unknown error')}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Failed to set output path: {output_path_response.get('message', 'Unknown error')}")
                 return
             
             # Select all chapters
@@ -344,11 +555,69 @@ class DownloaderService:
             response = bot.select_chapters("all")
 
             if response["status"] != "success":
-                job.update_status(Job.STATUS_FAILED, f"Failed to select chapters: {response.get('message', 'Unknown error')}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Failed to select chapters: {response.get('message', 'Unknown error')}")
                 return
             
             # Set total chapters
             total_chapters = response.get("chapters_selected", 0)
+            
+            # Cancelled while the novel was being read, nothing was fetched yet
+            if cancel_token.is_cancelled():
+                logger.info(f"Download job {job_id} cancelled")
+                try:
+                    bot.destroy_app()
+                except Exception as e:
+                    logger.error(f"Error destroying bot: {str(e)}")
+                return
+            
+            # Update mode: only fetch the chapters that are missing, new or failed
+            import_chapter_ids = None
+            if update_only:
+                crawler_chapters = DownloaderService._get_crawler_chapters(bot)
+                if crawler_chapters is None:
+                    logger.warning("Bot does not expose its chapter list, falling back to a full download")
+                else:
+                    pending_ids, fetch_ids = DownloaderService._find_chapters_to_update(
+                        job.selected_novel["url"], crawler_chapters, custom_output_path
+                    )
+                    logger.debug(f"Update: {len(pending_ids)} chapters pending, {len(fetch_ids)} to fetch")
+                    
+                    if not pending_ids:
+                        DownloaderService._complete_up_to_date(job, custom_output_path)
+                        try:
+                            bot.destroy_app()
+                        except Exception as e:
+                            logger.error(f"Error destroying bot: {str(e)}")
+                        return
+                    
+                    # Narrow the bot selection down to the chapters to fetch
+                    fetch_set = set(fetch_ids)
+                    bot.app.chapters = [c for c in crawler_chapters if c.get('id') in fetch_set]
+                    total_chapters = len(fetch_ids)
+                    import_chapter_ids = pending_ids
+            
+            use_store = settings.DOWNLOADER_CHAPTER_STORAGE == "pack"
+            if use_store and import_chapter_ids is None:
+                # Chapters already in the chapter store are not fetched (and written) again
+                crawler_chapters = DownloaderService._get_crawler_chapters(bot)
+                manifest = chapter_store.read_manifest(custom_output_path)
+                if crawler_chapters is not None and manifest:
+                    missing = [
+                        c for c in crawler_chapters
+                        if not manifest.get(str(c.get('id')), {}).get('has_content')
+                    ]
+                    if not missing and NovelFromSource.objects.filter(source_url=job.selected_novel["url"]).exists():
+                        # Every chapter is already stored and imported, nothing to crawl or write again
+                        DownloaderService._complete_up_to_date(job, custom_output_path)
+                        try:
+                            bot.destroy_app()
+                        except Exception as e:
+                            logger.error(f"Error destroying bot: {str(e)}")
+                        return
+                    if missing:
+                        bot.app.chapters = missing
+                        total_chapters = len(missing)
+            
             job.update_progress(0, total_chapters)
             logger.debug(f"Selected {total_chapters} chapters")
             
@@ -356,7 +625,7 @@ class DownloaderService:
             stop_monitoring = threading.Event()
             
             def monitor_progress():
-                while not stop_monitoring.is_set():
+                while not stop_monitoring.is_set() and not cancel_token.is_cancelled():
                     try:
                         status = bot.get_download_status()
                         logger.debug(f"Download status: {status}")
@@ -372,21 +641,29 @@ class DownloaderService:
                         
                     except Exception as e:
                         logger.error(f"Error monitoring download progress: {str(e)}")
-                    time.sleep(2)
+                    db_pool.check_connection()
+                    cancel_token.wait(2)
             
             # Start monitoring thread before starting download
-            monitor_thread = threading.Thread(target=monitor_progress)
+            monitor_thread = threading.Thread(target=db_pool.thread_connection(monitor_progress))
             monitor_thread.daemon = True
             monitor_thread.start()
             
+            storage = ExitStack()
+            metrics.attach(getattr(getattr(bot, 'app', None), 'crawler', None))
+            metrics.start('download')
             try:
+                if use_store:
+                    # Chapters go straight into the compressed store as the bot saves them
+                    storage.enter_context(chapter_store.write_through(custom_output_path))
+                
                 # Start download - always use JSON format
                 logger.debug("Starting download in apibot")
                 response = bot.start_download(["json"], pack_by_volume=False)
                 logger.debug(f"Download response: {response}")
 
                 if response["status"] != "success":
-                    job.update_status(Job.STATUS_FAILED, f"Download failed: {response.get('message', 'Unknown error')}")
+                    job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Download failed: {response.get('message', 'Unknown error')}")
                     stop_monitoring.set()
                     return
                 
@@ -399,19 +676,30 @@ class DownloaderService:
                     logger.warning("Download monitor thread timed out")
                     stop_monitoring.set()
                 
+                if cancel_token.is_cancelled():
+                    # Stop fetching and keep what was fetched, an update download resumes from there
+                    DownloaderService._stop_bot_download(bot)
+                    saved = DownloaderService._save_partial_output(bot)
+                    logger.info(f"Download job {job_id} cancelled, {saved} fetched chapters kept")
+                    return
+                
                 # Check final status
                 status = bot.get_download_status()
                 logger.debug(f"Final download status: {status}")
                 
                 if not status.get("download_completed", False):
-                    job.update_status(Job.STATUS_FAILED, "Download did not complete within the timeout period")
+                    job.update_status_unless_cancelled(Job.STATUS_FAILED, "Download did not complete within the timeout period")
                     return
                 
+                # Flush the chapter store and its manifest before the import reads them
+                storage.close()
+                metrics.stop('download')
+                
                 # Get download results
                 results = bot.get_download_results()
                 logger.debug(f"Download results: {results}")
                 if results["status"] != "success":
-                    job.update_status(Job.STATUS_FAILED, f"Failed to get download results: {results.get('message', 'Unknown error')}")
+                    job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Failed to get download results: {results.get('message', 'Unknown error')}")
                     return
                 
                 # Update job with download results
@@ -425,18 +713,25 @@ class DownloaderService:
                 
                 # Auto-import the novel to the database
                 logger.debug(f"Attempting to import novel from {output_path}")
-                success, message = DownloaderService._import_novel_to_database(output_path, job)
+                metrics.start('import')
+                success, message = DownloaderService._import_novel_to_database(
+                    output_path, job, chapter_ids=import_chapter_ids
+                )
+                metrics.stop('import')
                 
-                if success:
-                    job.update_status(Job.STATUS_DOWNLOAD_COMPLETED)
-                    # Add the import success message to the job
-                    job.import_message = message
-                    job.save(update_fields=['import_message'])
-                else:
-                    # Still mark the download as complete but include error about import
-                    job.update_status(Job.STATUS_DOWNLOAD_COMPLETED)
-                    job.import_message = f"Download completed but import failed: {message}"
-                    job.save(update_fields=['import_message'])
+                if cancel_token.is_cancelled():
+                    # The imported chapters are kept, the job stays cancelled
+                    logger.info(f"Download job {job_id} cancelled during the import")
+                    return
+                
+                # Still mark the download as complete when the import failed, with the error in the message
+                if not success:
+                    message = f"Download completed but import failed: {message}"
+                if not job.update_status_unless_cancelled(Job.STATUS_DOWNLOAD_COMPLETED):
+                    # Cancelled after the last check of the token
+                    return
+                job.import_message = message
+                job.save(update_fields=['import_message'])
                 
                 logger.debug(f"Download process completed successfully for job {job_id}")
                 
@@ -445,6 +740,8 @@ class DownloaderService:
                 if not stop_monitoring.is_set():
                     stop_monitoring.set()
                     monitor_thread.join(timeout=5.0)
+                storage.close()
+                metrics.count_chapters(getattr(getattr(bot, 'app', None), 'chapters', None))
                 
                 # Clean up
                 try:
@@ -459,18 +756,35 @@ class DownloaderService:
                 DownloaderService._setup_django()
                 from ..models import Job
                 job = Job.objects.get(id=job_id)
-                job.update_status(Job.STATUS_FAILED, f"Download process error: {str(e)}")
+                job.update_status_unless_cancelled(Job.STATUS_FAILED, f"Download process error: {str(e)}")
             except Exception:
                 pass
+        finally:
+            metrics.save()
+            cancel_token.unregister()
+            lease.release()
+            db_connections.release()
     
     @classmethod
-    def start_search(cls, query):
+    def start_search(cls, query, use_cache=True):
         """
         Start a search for novels with the given query
         Returns a job object that can be used to track progress
         """
-        # Create a new job
         from ..models import Job
+        
+        # Serve the results of a recent identical search without crawling again
+        if use_cache:
+            cached_results = search_cache.get_cached_results(query)
+            if cached_results is not None:
+                logger.info(f"Search cache hit for '{search_cache.normalize_query(query)}'")
+                return Job.objects.create(
+                    status=Job.STATUS_SEARCH_COMPLETED,
+                    query=query,
+                    search_results=cached_results
+                )
+        
+        # Create a new job
         job = Job.objects.create(
             status=Job.STATUS_CREATED,
             query=query
@@ -510,13 +824,19 @@ class DownloaderService:
             }
     
     @classmethod
-    def get_search_results(cls, job_id):
-        """Get the results of the search"""
+    def get_search_results(cls, job_id, cursor=None):
+        """
+        Get the results of the search
+        With a cursor, return the results of the sources that answered after it, even if the search is still running
+        """
         from ..models import Job
 
         try:
             job = Job.objects.get(id=job_id)
             
+            if cursor is not None:
+                return cls.get_partial_search_results(job, cursor)
+            
             if job.status == Job.STATUS_FAILED:
                 return {
                     'status': 'error',
@@ -531,7 +851,7 @@ class DownloaderService:
                 }
             
             # Return the search results
-            return job.search_results
+            return job.get_full_search_results()
             
         except Job.DoesNotExist:
             return {
@@ -539,25 +859,170 @@ class DownloaderService:
                 'message': f'Job with ID {job_id} not found',
             }
     
+    @staticmethod
+    def get_partial_search_results(job, cursor=0):
+        """
+        Return the per-source results stored after the cursor and the cursor to use for the next call
+        Searches answered by the cache or by the bot have no per-source results, only the combined ones
+        """
+        from ..models import Job
+
+        sources = [
+            source_result.to_dict()
+            for source_result in job.source_results.filter(id__gt=cursor).order_by('id')
+        ]
+        return {
+            'status': 'error' if job.status == Job.STATUS_FAILED else 'success',
+            'message': job.error_message if job.status == Job.STATUS_FAILED else None,
+            'search_completed': job.status == Job.STATUS_SEARCH_COMPLETED,
+            'cursor': sources[-1]['cursor'] if sources else cursor,
+            'progress': job.progress,
+            'total_items': job.total_items,
+            'sources': sources,
+        }
+    
+    @staticmethod
+    def normalize_novel_url(novel_url):
+        """
+        Normalise a novel URL so that the different spellings of the same page
+        (scheme, www. prefix, letter case of the host, trailing slash, fragment) share one key
+        """
+        parts = urlsplit(novel_url.strip())
+        host = parts.netloc.lower()
+        if host.startswith("www."):
+            host = host[4:]
+        path = parts.path.rstrip("/")
+        normalized = f"{host}{path}"
+        if parts.query:
+            normalized += f"?{parts.query}"
+        return normalized
+
+    @staticmethod
+    def _find_shared_download(normalized_url, include_recent=True):
+        """
+        Find a download of the same novel that a new request can reuse:
+        either one that is still in flight or one that completed within the freshness window
+        """
+        from ..models import Job
+
+        now = timezone.now()
+        jobs = Job.objects.filter(novel_url=normalized_url)
+
+        # Downloads whose worker died are resumed (or failed once out of resumes) before being shared
+        for dead_job in jobs.filter(expired_lease_filter(), status=Job.STATUS_DOWNLOADING):
+            DownloaderService.resume_job(dead_job)
+
+        in_flight = jobs.filter(status=Job.STATUS_DOWNLOADING).first()
+        if in_flight:
+            return in_flight, "Download already in progress, following the existing download"
+
+        if not include_recent:
+            return None, None
+
+        fresh_cutoff = now - timedelta(seconds=settings.DOWNLOADER_DOWNLOAD_FRESHNESS)
+        recent = jobs.filter(
+            status=Job.STATUS_DOWNLOAD_COMPLETED,
+            updated_at__gte=fresh_cutoff
+        ).order_by('-updated_at').first()
+        if recent:
+            return recent, "Novel was downloaded recently, reusing the existing download"
+
+        return None, None
+
     @classmethod
-    def start_direct_download(cls, novel_url, job=None):
+    def find_library_novel(cls, title, novel_url=None):
+        """
+        Find the library novel a title belongs to through the normalised-title index
+        Returns None, or a dict with the novel, the title similarity and, if the library
+        already has the novel from novel_url, that source
+        """
+        from ..models import NovelFromSource
+
+        match = title_index.find_novel(title)
+        if match is None:
+            return None
+        similarity, novel = match
+
+        source = None
+        if novel_url:
+            normalized_url = cls.normalize_novel_url(novel_url)
+            for novel_source in NovelFromSource.objects.filter(novel=novel).only('id', 'source_url', 'source_slug'):
+                if cls.normalize_novel_url(novel_source.source_url) == normalized_url:
+                    source = novel_source
+                    break
+
+        return {
+            'novel': novel,
+            'similarity': similarity,
+            'source': source,
+        }
+
+    @staticmethod
+    def _library_match_dict(match):
+        return {
+            'slug': match['novel'].slug,
+            'title': match['novel'].title,
+            'similarity': round(match['similarity'], 2),
+            'source_slug': match['source'].source_slug if match['source'] else None,
+        }
+
+    @classmethod
+    def start_direct_download(cls, novel_url, job=None, update_only=False, reuse_recent=True):
         if not novel_url:
             return {
                 'status': 'error',
                 'message': 'Could not determine novel URL',
             }
         
-        if not job:
-            from ..models import Job
-            job = Job.objects.create(
-                status=Job.STATUS_SEARCH_COMPLETED,
-                query="Direct Download"
-            )
+        from ..models import Job
+        normalized_url = cls.normalize_novel_url(novel_url)
+
+        # Attach to a running or recently completed download of the same novel instead of crawling it twice
+        shared_job, message = cls._find_shared_download(normalized_url, include_recent=reuse_recent)
+        if shared_job:
+            logger.info(f"Sharing download job {shared_job.id} for {normalized_url}")
+            return {
+                'status': 'success',
+                'message': message,
+                'job_id': str(shared_job.id),
+                'shared': True,
+            }
+
+        # Claim the novel. The unique constraint on in-flight downloads makes the claim atomic
+        # across workers: if another request claimed it first, we attach to its job instead.
+        try:
+            with transaction.atomic():
+                download_mode = Job.MODE_UPDATE if update_only else Job.MODE_FULL
+                if job:
+                    job.novel_url = normalized_url
+                    job.status = Job.STATUS_DOWNLOADING
+                    job.download_mode = download_mode
+                    job.save(update_fields=['novel_url', 'status', 'download_mode', 'updated_at'])
+                else:
+                    job = Job.objects.create(
+                        status=Job.STATUS_DOWNLOADING,
+                        query="Direct Download",
+                        novel_url=normalized_url,
+                        download_mode=download_mode
+                    )
+        except IntegrityError:
+            shared_job, message = cls._find_shared_download(normalized_url, include_recent=reuse_recent)
+            if shared_job:
+                return {
+                    'status': 'success',
+                    'message': message,
+                    'job_id': str(shared_job.id),
+                    'shared': True,
+                }
+            return {
+                'status': 'error',
+                'message': 'A download of this novel is already starting, please retry in a moment',
+            }
 
         # Start download process with the direct URL
         thread = threading.Thread(
             target=cls._run_download_process,
-            args=(job.id, novel_url)
+            args=(job.id, novel_url, update_only)
         )
         thread.daemon = True
         logger.debug(f"Using novel URL: {novel_url}")
@@ -570,7 +1035,64 @@ class DownloaderService:
         }
 
     @classmethod
-    def start_download(cls, job_id, novel_index=0, source_index=0):
+    def resume_job(cls, job):
+        """
+        Restart a search or download whose worker died (its lease expired)
+        Downloads resume in update mode, so the chapters already on disk are not fetched again
+        Returns True if this call resumed the job
+        """
+        from ..models import Job
+
+        claimable = Job.objects.filter(expired_lease_filter(), id=job.id, status=job.status)
+
+        if job.resume_count >= settings.DOWNLOADER_MAX_RESUMES:
+            if claimable.update(status=Job.STATUS_FAILED, error_message="Job stopped responding", lease_owner=None):
+                logger.warning(f"Job {job.id} stopped responding {job.resume_count + 1} times, giving up")
+            return False
+
+        # Only one worker may win the claim, the others see an unexpired lease
+        claimed = claimable.update(
+            lease_owner=WORKER_ID,
+            lease_expires_at=timezone.now() + timedelta(seconds=settings.DOWNLOADER_JOB_LEASE),
+            resume_count=F('resume_count') + 1,
+        )
+        if not claimed:
+            return False
+
+        if job.status == Job.STATUS_DOWNLOADING:
+            # The URL the bot resolved, or the normalised URL the job was claimed with
+            novel_url = (job.selected_novel or {}).get("url") or f"https://{job.novel_url}"
+            logger.info(f"Resuming download job {job.id} for {novel_url}")
+            thread = threading.Thread(
+                target=cls._run_download_process,
+                args=(job.id, novel_url, True)
+            )
+        else:
+            logger.info(f"Restarting search job {job.id} for '{job.query}'")
+            thread = threading.Thread(
+                target=cls._run_search_process,
+                args=(job.id, job.query)
+            )
+        thread.daemon = True
+        thread.start()
+        return True
+
+    @classmethod
+    def recover_jobs(cls):
+        """
+        Resume every search or download whose worker died
+        Returns the number of jobs resumed
+        """
+        from ..models import Job
+
+        dead_jobs = Job.objects.filter(
+            expired_lease_filter(),
+            status__in=[Job.STATUS_CREATED, Job.STATUS_SEARCHING, Job.STATUS_DOWNLOADING],
+        )
+        return sum(1 for job in dead_jobs if cls.resume_job(job))
+
+    @classmethod
+    def start_download(cls, job_id, novel_index=0, source_index=0, force=False, accept_match=False):
         """
         Start downloading a novel
         
@@ -578,6 +1100,9 @@ class DownloaderService:
             job_id: The ID of the job with search results
             novel_index: Index of the novel from search results to download
             source_index: Index of the source for the selected novel
+            force: Download the source even if the library already has it, as a new novel
+                when the library novel has a different title
+            accept_match: Add the source to the similar library novel returned by a previous call
             
         Returns:
             Updated job object
@@ -596,8 +1121,9 @@ class DownloaderService:
             # if no direct url passed, get the selected novel URL
             novel_url = ""
             try:
-                novel_url = job.search_results["results"][novel_index]["sources"][source_index]["url"]
-            except (KeyError, IndexError):
+                novel_result = job.get_full_search_results()["results"][novel_index]
+                novel_url = novel_result["sources"][source_index]["url"]
+            except (KeyError, IndexError, TypeError):
                 return {
                     'status': 'error',
                     'message': 'Invalid novel or source index',
@@ -608,8 +1134,42 @@ class DownloaderService:
                     'status': 'error',
                     'message': 'Could not determine novel URL',
                 }
-            print(f"Novel URL: {novel_url}")
-            return cls.start_direct_download(novel_url, job)
+
+            # Check the library before crawling anything
+            title = novel_result.get("title") or ""
+            match = cls.find_library_novel(title, novel_url)
+            if match and match['source'] and not force:
+                return {
+                    'status': 'success',
+                    'message': 'This novel is already in the library from this source',
+                    'duplicate': True,
+                    'existing_novel': cls._library_match_dict(match),
+                }
+
+            if match:
+                same_title = title_index.title_key(title) == title_index.title_key(match['novel'].title)
+                if not (match['source'] or same_title or accept_match):
+                    if not force:
+                        # A similar title is not always the same novel, the user decides
+                        return {
+                            'status': 'success',
+                            'message': f"The library has a similar novel: {match['novel'].title}",
+                            'confirm_required': True,
+                            'existing_novel': cls._library_match_dict(match),
+                        }
+                    # Forced without accepting the match: a new novel
+                    match = None
+            if match:
+                job.library_novel_path = match['novel'].novel_path
+                job.save(update_fields=['library_novel_path', 'updated_at'])
+
+            result = cls.start_direct_download(novel_url, job)
+            if match and result['status'] == 'success':
+                # The download process puts the source in the folder of that novel
+                result['existing_novel'] = cls._library_match_dict(match)
+                if not match['source']:
+                    result['message'] = f"Adding a new source to {match['novel'].title}"
+            return result
             
         except Job.DoesNotExist:
             return {
@@ -648,6 +1208,22 @@ class DownloaderService:
                 'message': f'Job with ID {job_id} not found',
             }
     
+    @classmethod
+    def wait_for_download(cls, job_id, timeout=1800, poll_interval=5):
+        """
+        Block until the download job completes or fails, for callers that run outside a request
+        Returns the job, or None if it did not finish within the timeout
+        """
+        from ..models import Job
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = Job.objects.get(id=job_id)
+            if job.status in (Job.STATUS_DOWNLOAD_COMPLETED, Job.STATUS_FAILED):
+                return job
+            time.sleep(poll_interval)
+        return None
+
     @classmethod
     def get_download_results(cls, job_id):
         """Get the results of the download"""
@@ -697,14 +1273,15 @@ class DownloaderService:
         try:
             job = Job.objects.get(id=job_id)
             
-            # Try to terminate the process if it exists
-            if job.job_pid:
-                try:
-                    os.kill(job.job_pid, 9)  # SIGKILL
-                except OSError:
-                    # Process might not exist anymore
-                    pass
+            if job.status in (Job.STATUS_SEARCH_COMPLETED, Job.STATUS_DOWNLOAD_COMPLETED, Job.STATUS_FAILED):
+                return {
+                    'status': 'error',
+                    'message': f'Job already finished ({job.get_status_display()})',
+                }
             
+            # The worker running the job (in this process or another one) stops at its next check,
+            # within a few seconds, and releases the bot
+            request_cancel(job.id)
             job.update_status(Job.STATUS_FAILED, "Job cancelled by user")
             
             return {
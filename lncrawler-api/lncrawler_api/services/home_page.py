@@ -0,0 +1,90 @@
+"""
+Home page snapshot: the home page used to run about sixty queries per visit, mostly to serialize
+the featured novel and the recently updated sources again for every visitor.
+
+The refresh_home_page scheduler task serializes the home page for an anonymous visitor every five
+minutes, with all the featured novels, and stores the rendered JSON in a PageSnapshot row shared by
+every worker. A visit reads that row, picks one of the featured novels at random and adds the fields
+of the current user (bookmarks, reading histories, votes, rating, review reactions) with a UserOverlay.
+The lists, counters and reactions shown are those of the last refresh, the fields of the user are live.
+"""
+import json
+import random
+import logging
+from rest_framework.renderers import JSONRenderer
+from .user_overlay import UserOverlay
+
+logger = logging.getLogger('lncrawler_api')
+
+HOME_PAGE = 'home'
+
+
+def build_home_page():
+    """The home page payload for an anonymous visitor, with every featured novel in featured_novels"""
+    from ..models import FeaturedNovel, NovelCard, NovelFromSource
+    from ..models.reviews_models import Review
+    from ..serializers import DetailedNovelSerializer, NovelCardSerializer, NovelSourceSerializer
+    from ..serializers.reviews_serializers import ReviewListSerializer
+
+    top_novels = NovelCard.objects.order_by('-total_views', 'title')[:12]
+    trending_novels = NovelCard.objects.order_by('-weekly_views', 'title')[:12]
+    top_rated_novels = NovelCard.objects.order_by('-rating_avg', 'title')[:12]
+    recently_updated = NovelSourceSerializer.setup_queryset(
+        NovelFromSource.objects.select_related('novel')
+    ).order_by('-last_chapter_update')[:12]
+    recent_reviews = Review.objects.select_related('user', 'novel').prefetch_related('reactions__user').order_by('-created_at')[:4]
+
+    featured_novels = [
+        {
+            'novel': DetailedNovelSerializer(featured.novel).data,
+            'description': featured.description,
+            'featured_since': featured.created_at,
+        }
+        for featured in FeaturedNovel.objects.select_related('novel').order_by('id')
+    ]
+    return {
+        'top_novels': NovelCardSerializer(top_novels, many=True).data,
+        'trending_novels': NovelCardSerializer(trending_novels, many=True).data,
+        'top_rated_novels': NovelCardSerializer(top_rated_novels, many=True).data,
+        'recently_updated': NovelSourceSerializer(recently_updated, many=True).data,
+        'featured_novel': None,
+        'recent_reviews': ReviewListSerializer(recent_reviews, many=True).data,
+        'featured_novels': featured_novels,
+    }
+
+
+def refresh_home_page():
+    """Serialize the home page and store it, returns the rendered JSON"""
+    from ..models import PageSnapshot
+
+    data = JSONRenderer().render(build_home_page()).decode('utf-8')
+    PageSnapshot.objects.update_or_create(name=HOME_PAGE, defaults={'data': data})
+    return data
+
+
+def home_page_for(request):
+    """The home page payload of the stored snapshot for the current user, built first if there is none"""
+    from ..models import PageSnapshot
+
+    data = PageSnapshot.objects.filter(name=HOME_PAGE).values_list('data', flat=True).first()
+    if data is None:
+        logger.info("No home page snapshot yet, building it")
+        data = refresh_home_page()
+    payload = json.loads(data)
+
+    featured_novels = payload.pop('featured_novels')
+    if featured_novels:
+        payload['featured_novel'] = random.choice(featured_novels)
+
+    overlay = UserOverlay(request)
+    for key in ('top_novels', 'trending_novels', 'top_rated_novels'):
+        for novel in payload[key]:
+            overlay.add_novel(novel)
+    for source in payload['recently_updated']:
+        overlay.add_source(source)
+    if payload['featured_novel']:
+        overlay.add_detailed_novel(payload['featured_novel']['novel'])
+    for review in payload['recent_reviews']:
+        overlay.add_review(review)
+    overlay.apply()
+    return payload
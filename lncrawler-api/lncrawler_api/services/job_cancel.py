@@ -0,0 +1,78 @@
+import time
+import threading
+import logging
+
+logger = logging.getLogger('lncrawler_api')
+
+# Seconds between two database checks of a running job's cancellation flag
+CHECK_INTERVAL = 2.0
+
+# Tokens of the jobs running in this process, so a cancellation received here is seen at once
+_tokens = {}
+_tokens_lock = threading.Lock()
+
+
+class CancellationToken:
+    """
+    Cancellation token of a job, checked by the loops and steps of the thread running it.
+    The request is stored on the job (cancel_requested) so that any worker process can cancel it,
+    the token reads it back at most every CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = str(job_id)
+        self.event = threading.Event()
+        self._checked_at = 0.0
+
+    def register(self):
+        with _tokens_lock:
+            _tokens[self.job_id] = self
+
+    def unregister(self):
+        with _tokens_lock:
+            if _tokens.get(self.job_id) is self:
+                del _tokens[self.job_id]
+
+    def is_cancelled(self):
+        from ..models import Job
+
+        if self.event.is_set():
+            return True
+        now = time.monotonic()
+        if now - self._checked_at >= CHECK_INTERVAL:
+            self._checked_at = now
+            try:
+                if Job.objects.filter(id=self.job_id, cancel_requested=True).exists():
+                    self.event.set()
+            except Exception as e:
+                logger.error(f"Error checking the cancellation of job {self.job_id}: {str(e)}")
+        return self.event.is_set()
+
+    def wait(self, timeout):
+        """
+        Sleep up to timeout seconds, waking up as soon as the job is cancelled
+        Returns True if the job was cancelled
+        """
+        deadline = time.monotonic() + timeout
+        while not self.is_cancelled():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.event.wait(min(remaining, CHECK_INTERVAL))
+        return True
+
+
+def request_cancel(job_id):
+    """
+    Flag the job as cancelled; the thread running it stops at its next check
+    Returns True if the job runs in this process (it was signalled directly)
+    """
+    from ..models import Job
+
+    Job.objects.filter(id=job_id).update(cancel_requested=True)
+    with _tokens_lock:
+        token = _tokens.get(str(job_id))
+    if token is not None:
+        token.event.set()
+        return True
+    return False
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger('lncrawler_api')
+
+# How often the state of a watched job is read from the database
+POLL_INTERVAL = 1.0  # seconds
+# Comment lines sent while nothing changes, so that proxies keep the connection open
+KEEPALIVE_INTERVAL = 15  # seconds
+# A synchronous stream holds a server thread, it is closed after this long and the browser reconnects
+SYNC_STREAM_MAX_DURATION = 300  # seconds
+# Delay the browser waits before reconnecting a dropped stream
+RETRY_DELAY = 3000  # milliseconds
+
+SNAPSHOT_FIELDS = ('status', 'progress', 'total_items', 'error_message', 'updated_at')
+
+
+def _terminal_statuses():
+    from ..models import Job
+    return (Job.STATUS_SEARCH_COMPLETED, Job.STATUS_DOWNLOAD_COMPLETED, Job.STATUS_FAILED)
+
+
+def _snapshot(job):
+    """
+    The part of the job that watchers care about
+    """
+    if job is None:
+        return {'job_status': 'not_found', 'error': 'Job not found'}
+    return {
+        'job_status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'total_items': job.total_items,
+        'progress_percentage': job.get_progress_percentage(),
+        'error': job.error_message,
+    }
+
+
+def _is_final(snapshot):
+    return snapshot['job_status'] == 'not_found' or snapshot['job_status'] in _terminal_statuses()
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _events_for(previous, snapshot):
+    """
+    Status transitions are sent as "status" events, everything else as "progress" events
+    """
+    if previous is None or previous['job_status'] != snapshot['job_status']:
+        return format_event('status', snapshot)
+    return format_event('progress', snapshot)
+
+
+class _JobFeed:
+    """
+    Polls one job and fans its snapshots out to every watcher of that job in this process
+    """
+
+    def __init__(self, job_id, on_closed):
+        self.job_id = job_id
+        self.on_closed = on_closed
+        self.subscribers = set()
+        self.last = None
+        self.task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        if self.last is not None:
+            queue.put_nowait(self.last)
+        self.subscribers.add(queue)
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def _run(self):
+        from ..models import Job
+
+        try:
+            while self.subscribers:
+                job = await Job.objects.only(*SNAPSHOT_FIELDS).filter(id=self.job_id).afirst()
+                snapshot = _snapshot(job)
+                if snapshot != self.last:
+                    self.last = snapshot
+                    for queue in self.subscribers:
+                        queue.put_nowait(snapshot)
+                if _is_final(snapshot):
+                    break
+                await asyncio.sleep(POLL_INTERVAL)
+        except Exception as e:
+            logger.error(f"Error watching job {self.job_id}: {str(e)}")
+        finally:
+            self.on_closed(self)
+            # Wake up the watchers so that they end their stream, the browser reconnects if needed
+            for queue in self.subscribers:
+                queue.put_nowait(None)
+
+
+class JobEventHub:
+    """
+    Per-process registry of job feeds: the database is read once per watched job
+    and poll interval, whatever the number of watchers
+    """
+
+    def __init__(self):
+        self.feeds = {}
+
+    def _remove_feed(self, feed):
+        if self.feeds.get(feed.job_id) is feed:
+            del self.feeds[feed.job_id]
+
+    async def stream(self, job_id):
+        """
+        Async generator of Server-Sent Events for the job, ends once the job is finished
+        """
+        feed = self.feeds.get(job_id)
+        if feed is None:
+            feed = _JobFeed(job_id, self._remove_feed)
+            self.feeds[job_id] = feed
+        queue = feed.subscribe()
+
+        yield f"retry: {RETRY_DELAY}\n\n"
+        previous = None
+        try:
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if snapshot is None:
+                    break
+                yield _events_for(previous, snapshot)
+                previous = snapshot
+                if _is_final(snapshot):
+                    break
+        finally:
+            feed.unsubscribe(queue)
+
+
+hub = JobEventHub()
+
+
+def stream_async(job_id):
+    return hub.stream(job_id)
+
+
+def stream_sync(job_id):
+    """
+    Generator of Server-Sent Events for servers without async support (WSGI),
+    each watcher polls on its own and the stream is closed after SYNC_STREAM_MAX_DURATION
+    """
+    from ..models import Job
+
+    yield f"retry: {RETRY_DELAY}\n\n"
+    previous = None
+    started = time.monotonic()
+    last_sent = started
+    while time.monotonic() - started < SYNC_STREAM_MAX_DURATION:
+        job = Job.objects.only(*SNAPSHOT_FIELDS).filter(id=job_id).first()
+        snapshot = _snapshot(job)
+        if snapshot != previous:
+            yield _events_for(previous, snapshot)
+            previous = snapshot
+            last_sent = time.monotonic()
+            if _is_final(snapshot):
+                return
+        elif time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+            yield ": keepalive\n\n"
+            last_sent = time.monotonic()
+        time.sleep(POLL_INTERVAL)
@@ -0,0 +1,92 @@
+import os
+import socket
+import threading
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from . import db_pool
+
+logger = logging.getLogger('lncrawler_api')
+
+# Identifies the process holding a lease
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def expired_lease_filter():
+    """
+    Jobs whose worker is gone: the lease expired, or the job never got a lease
+    and has not been updated for DOWNLOADER_STALE_JOB_TIMEOUT
+    """
+    now = timezone.now()
+    stale_cutoff = now - timedelta(seconds=settings.DOWNLOADER_STALE_JOB_TIMEOUT)
+    return Q(lease_expires_at__lt=now) | Q(lease_expires_at__isnull=True, updated_at__lt=stale_cutoff)
+
+
+class JobLease:
+    """
+    Lease of a job held by the thread running it.
+    A keeper thread renews the lease until it is released, so the lease only expires
+    when the process running the job died.
+    """
+
+    # Seconds before renewing again after a failed renewal
+    RETRY_DELAY = 5
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.duration = settings.DOWNLOADER_JOB_LEASE
+        self.stop_event = threading.Event()
+        self.keeper = None
+
+    def _expiry(self):
+        return timezone.now() + timedelta(seconds=self.duration)
+
+    def acquire(self):
+        from ..models import Job
+
+        Job.objects.filter(id=self.job_id).update(lease_owner=WORKER_ID, lease_expires_at=self._expiry())
+        self.keeper = threading.Thread(
+            target=db_pool.thread_connection(self._keep_alive), name=f"JobLease-{self.job_id}"
+        )
+        self.keeper.daemon = True
+        self.keeper.start()
+
+    def _renew(self):
+        """Push the expiry of the lease back, returns 0 once another worker took the job over"""
+        from ..models import Job
+
+        return Job.objects.filter(id=self.job_id, lease_owner=WORKER_ID).update(lease_expires_at=self._expiry())
+
+    def _keep_alive(self):
+        # Renew well before expiry so a slow database does not let the lease lapse
+        delay = self.duration / 3
+        while not self.stop_event.wait(delay):
+            try:
+                renewed = self._renew()
+            except Exception as e:
+                # A database hiccup must not let the lease of a running job expire, retry soon
+                # on a new connection
+                logger.error(f"Error renewing the lease of job {self.job_id}: {str(e)}")
+                db_pool.check_connection(ping=True)
+                delay = min(self.duration / 3, self.RETRY_DELAY)
+                continue
+            if not renewed:
+                logger.warning(f"Lost the lease of job {self.job_id}")
+                return
+            delay = self.duration / 3
+            db_pool.check_connection()
+
+    def release(self):
+        from ..models import Job
+
+        if self.keeper is None:
+            return
+        self.stop_event.set()
+        self.keeper.join(timeout=5.0)
+        self.keeper = None
+        try:
+            Job.objects.filter(id=self.job_id, lease_owner=WORKER_ID).update(lease_owner=None, lease_expires_at=None)
+        except Exception as e:
+            logger.error(f"Error releasing the lease of job {self.job_id}: {str(e)}")
@@ -0,0 +1,166 @@
+"""
+Novel cards: the list endpoints (novel list, search, home page, bookmarks, reading history) read
+one NovelCard row per novel instead of loading its sources, chapters, votes and views.
+
+A card holds the BasicNovelSerializer output of its novel for an anonymous visitor plus the columns
+the lists sort on. It is rebuilt when the novel or one of its sources changes (import, vote, edit,
+source added or removed) once the transaction commits. Ratings, views and comments only update
+the counter columns, in a single UPDATE. The fields of the current user (bookmark, reading history,
+source vote) are added when the cards are serialized, for a whole page at once (NovelCardSerializer).
+
+The refresh_novel_cards scheduler task builds the cards that are missing or older than the last
+chapter update of their sources and resets the weekly views when a new week starts, the
+rebuild_novel_cards command rebuilds all of them.
+"""
+import logging
+from datetime import datetime
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger('lncrawler_api')
+
+# Fields of a source shown on the card of its novel, saving only other fields does not refresh it
+CARD_SOURCE_FIELDS = {
+    'title', 'source_url', 'source_slug', 'language', 'synopsis', 'cover_path', 'cover_min_path',
+    'overview_picture_path', 'last_chapter_update', 'upvotes', 'downvotes', 'external_source', 'novel',
+}
+
+
+def current_year_week():
+    current_date = datetime.now()
+    return f"{current_date.isocalendar()[0]}{current_date.isocalendar()[1]:02d}"
+
+
+def _counters(year_week):
+    """Values of the counter columns of a card, read from the novel and its view counts"""
+    from ..models import Novel, NovelViewCount, WeeklyNovelView
+
+    def novel_field(name):
+        return Subquery(Novel.objects.filter(pk=OuterRef('novel_id')).values(name)[:1])
+
+    return {
+        'rating_avg': novel_field('rating_avg'),
+        'rating_count': novel_field('rating_count'),
+        'comment_count': novel_field('comment_count'),
+        'total_views': Coalesce(
+            Subquery(NovelViewCount.objects.filter(novel_id=OuterRef('novel_id')).values('views')[:1]), Value(0)
+        ),
+        'weekly_views': Coalesce(
+            Subquery(
+                WeeklyNovelView.objects.filter(novel_id=OuterRef('novel_id'), year_week=year_week).values('views')[:1]
+            ),
+            Value(0),
+        ),
+        'year_week': Value(year_week),
+    }
+
+
+def refresh_cards(novel_ids):
+    """
+    Rebuild the cards of the given novels, in a constant number of queries
+    Returns the number of cards written
+    """
+    from ..models import Novel, NovelCard
+    from ..serializers.novels_serializers import BasicNovelSerializer
+
+    year_week = current_year_week()
+    novels = BasicNovelSerializer.setup_queryset(Novel.objects.filter(id__in=list(novel_ids)))
+    cards = []
+    for novel in novels:
+        data = BasicNovelSerializer(novel).data
+        updates = [source.last_chapter_update for source in novel.sources.all() if source.last_chapter_update]
+        cards.append(NovelCard(
+            novel=novel,
+            data=data,
+            title=novel.title,
+            created_at=novel.created_at,
+            last_chapter_update=max(updates, default=None),
+            first_chapter_update=min(updates, default=None),
+            rating_avg=novel.rating_avg,
+            rating_count=novel.rating_count,
+            comment_count=novel.comment_count,
+            total_views=data['total_views'],
+            weekly_views=data['weekly_views'],
+            year_week=year_week,
+        ))
+    if cards:
+        update_fields = [field.name for field in NovelCard._meta.concrete_fields if not field.primary_key]
+        NovelCard.objects.bulk_create(cards, update_conflicts=True, unique_fields=['novel'], update_fields=update_fields)
+    return len(cards)
+
+
+def refresh_counters(novel_ids):
+    """
+    Update the rating, comment and view counters of the cards of the given novels in a single UPDATE
+    The cards are locked in the order of their novels first: the order of an UPDATE is the one of its plan,
+    concurrent refreshes of the same cards must not lock them in opposite orders
+    """
+    from ..models import NovelCard
+
+    novel_ids = sorted(novel_ids)
+    with transaction.atomic():
+        list(NovelCard.objects.select_for_update().filter(novel_id__in=novel_ids).order_by('novel_id').values_list('pk', flat=True))
+        return NovelCard.objects.filter(novel_id__in=novel_ids).update(**_counters(current_year_week()))
+
+
+def _run_after_commit(function, novel_id):
+    def run():
+        try:
+            function([novel_id])
+        except Exception as e:
+            # A stale card is fixed by the next refresh, it must not fail the change that caused it
+            logger.error(f"Error refreshing the card of novel {novel_id}: {str(e)}")
+
+    transaction.on_commit(run)
+
+
+def schedule_refresh(novel_id):
+    """Rebuild the card of the novel once the current transaction commits"""
+    if novel_id is not None:
+        _run_after_commit(refresh_cards, novel_id)
+
+
+def schedule_counters_refresh(novel_id):
+    """Update the counters of the card of the novel once the current transaction commits"""
+    if novel_id is not None:
+        _run_after_commit(refresh_counters, novel_id)
+
+
+def refresh_stale_cards(batch_size=500):
+    """
+    Build the cards that are missing or older than the last chapter update of one of their sources,
+    and reset the weekly views of the cards counted in a previous week
+    Returns the number of cards built and the number of cards whose counters were updated
+    """
+    from ..models import Novel, NovelCard
+
+    stale = Novel.objects.filter(
+        Q(card__isnull=True) | Q(sources__last_chapter_update__gt=F('card__refreshed_at'))
+    ).values_list('id', flat=True).distinct()
+    built = 0
+    novel_ids = list(stale)
+    for start in range(0, len(novel_ids), batch_size):
+        built += refresh_cards(novel_ids[start:start + batch_size])
+
+    year_week = current_year_week()
+    rolled_over = NovelCard.objects.exclude(year_week=year_week).update(**_counters(year_week))
+    return built, rolled_over
+
+
+def rebuild_all_cards(batch_size=500):
+    """Rebuild the cards of all the novels, batch_size novels at a time"""
+    from ..models import Novel
+
+    built = 0
+    last_id = None
+    while True:
+        batch = Novel.objects.order_by('id')
+        if last_id is not None:
+            batch = batch.filter(id__gt=last_id)
+        novel_ids = list(batch.values_list('id', flat=True)[:batch_size])
+        if not novel_ids:
+            return built
+        built += refresh_cards(novel_ids)
+        last_id = novel_ids[-1]
+
@@ -0,0 +1,107 @@
+"""
+Public documents of the novel and source detail pages.
+
+DetailedNovelSerializer and NovelSourceSerializer mix the data of the novel with the fields of the
+current user, so their output could not be cached. The detail endpoints now serialize the novel or
+the source once without a request, store the rendered JSON in the 'pages' cache shared by every
+worker, and add the fields of the current user with a UserOverlay in a few indexed queries.
+
+A document is keyed by the refreshed_at stamp of the card of its novel, which changes whenever the
+novel, one of its sources or one of its reading list entries changes (see services/novel_cards.py).
+The counters that change too often to refresh the card (ratings, comments, views) are read from the
+novel and its card by each request, the similar novels from their own cards. The lists of similar
+novels and of reading lists only expire with PAGE_CACHE_TTL. A novel without a card is serialized
+for the request, as before.
+"""
+import json
+import logging
+from django.core.cache import caches
+from rest_framework.renderers import JSONRenderer
+from .novel_cards import current_year_week
+from .user_overlay import UserOverlay
+
+logger = logging.getLogger('lncrawler_api')
+
+CACHE_ALIAS = 'pages'
+
+
+def _cache_key(kind, object_id, version):
+    return f"{kind}:{object_id}:{version.timestamp()}"
+
+
+def get_document(kind, object_id, version, build):
+    """
+    The public document of an object at a version, built by build() and stored on a cache miss
+    Returns a new copy of the document, that the caller may change
+    """
+    key = _cache_key(kind, object_id, version)
+    try:
+        data = caches[CACHE_ALIAS].get(key)
+    except Exception as e:
+        # The cache is an optimization, a broken cache must never break the page
+        logger.error(f"Failed to read the {kind} document of {object_id}: {str(e)}")
+        data = None
+    if data is None:
+        data = JSONRenderer().render(build()).decode('utf-8')
+        try:
+            caches[CACHE_ALIAS].set(key, data)
+        except Exception as e:
+            logger.error(f"Failed to write the {kind} document of {object_id}: {str(e)}")
+    return json.loads(data)
+
+
+def _card_of(novel):
+    from ..models import NovelCard
+
+    try:
+        return novel.card
+    except NovelCard.DoesNotExist:
+        return None
+
+
+def novel_detail_for(request, novel):
+    """The DetailedNovelSerializer payload of the novel for the request, from its cached public document"""
+    from ..models import NovelCard
+    from ..serializers import DetailedNovelSerializer, NovelCardSerializer
+
+    card = _card_of(novel)
+    if card is None:
+        return DetailedNovelSerializer(novel, context={'request': request}).data
+
+    data = get_document('novel', novel.id, card.refreshed_at, lambda: DetailedNovelSerializer(novel).data)
+    data.update({
+        'avg_rating': round(novel.rating_avg, 1) if novel.rating_count else None,
+        'rating_count': novel.rating_count,
+        'total_views': card.total_views,
+        'weekly_views': card.weekly_views if card.year_week == current_year_week() else 0,
+        'comment_count': novel.comment_count,
+    })
+    similar_cards = {
+        str(similar_card.novel_id): similar_card
+        for similar_card in NovelCard.objects.filter(novel_id__in=[similar['id'] for similar in data['similar_novels']])
+    }
+    data['similar_novels'] = [
+        dict(NovelCardSerializer.card_data(similar_cards[similar['id']]), similarity=similar['similarity'])
+        if similar['id'] in similar_cards else similar
+        for similar in data['similar_novels']
+    ]
+
+    overlay = UserOverlay(request)
+    overlay.add_detailed_novel(data)
+    overlay.apply()
+    return data
+
+
+def source_detail_for(request, novel, source):
+    """The NovelSourceSerializer payload of the source for the request, from its cached public document"""
+    from ..serializers import NovelSourceSerializer
+
+    card = _card_of(novel)
+    if card is None:
+        return NovelSourceSerializer(source, context={'request': request}).data
+
+    data = get_document('source', source.id, card.refreshed_at, lambda: NovelSourceSerializer(source).data)
+    overlay = UserOverlay(request)
+    overlay.add_source(data)
+    overlay.apply()
+    return data
@@ -0,0 +1,50 @@
+import hashlib
+import logging
+from django.core.cache import caches
+
+logger = logging.getLogger('lncrawler_api')
+
+CACHE_ALIAS = 'downloader'
+
+
+def normalize_query(query: str) -> str:
+    """
+    Fold case and whitespace so that "Solo Leveling", "solo  leveling " and
+    "SOLO LEVELING" all share the same cache entry
+    """
+    return " ".join((query or "").casefold().split())
+
+
+def _cache_key(query: str) -> str:
+    # Hash the query so the key stays short and free of characters some backends reject
+    digest = hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()
+    return f"search_results:{digest}"
+
+
+def get_cached_results(query: str):
+    """
+    Return the cached search results for the query, or None on a cache miss
+    """
+    try:
+        return caches[CACHE_ALIAS].get(_cache_key(query))
+    except Exception as e:
+        # The cache is an optimization, a broken cache must never break the search
+        logger.error(f"Failed to read search cache for '{query}': {str(e)}")
+        return None
+
+
+def store_results(query: str, results: dict):
+    """
+    Store the results of a completed search. Failed or empty searches are not cached
+    so that a source being temporarily down does not hide a novel for the whole TTL.
+    """
+    if not results or results.get('status') != 'success' or not results.get('results'):
+        return False
+
+    try:
+        caches[CACHE_ALIAS].set(_cache_key(query), results)
+        logger.debug(f"Cached search results for '{normalize_query(query)}'")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to write search cache for '{query}': {str(e)}")
+        return False
@@ -0,0 +1,62 @@
+import time
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from django.db import connection
+
+logger = logging.getLogger('lncrawler_api')
+
+PROBE_TIMEOUT = 15  # seconds
+PROBE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+}
+
+
+def probe_url(url, timeout=PROBE_TIMEOUT):
+    """
+    Request the page and time the response headers
+    Returns (ok, latency, error). Server errors count as unavailable, client errors
+    (often anti-bot pages) do not: the site answered.
+    """
+    start = time.monotonic()
+    try:
+        with requests.get(url, timeout=timeout, headers=PROBE_HEADERS, stream=True, allow_redirects=True) as response:
+            latency = time.monotonic() - start
+            if response.status_code >= 500:
+                return False, latency, f"HTTP {response.status_code}"
+            return True, latency, None
+    except requests.RequestException as e:
+        return False, time.monotonic() - start, f"{type(e).__name__}: {str(e)}"
+
+
+def _fill_base_url(source):
+    """
+    Sources imported before base_url existed get it from one of their novels
+    """
+    novel_url = source.novels.exclude(source_url='').values_list('source_url', flat=True).first()
+    if novel_url:
+        parts = urlsplit(novel_url)
+        source.base_url = f"{parts.scheme}://{parts.netloc}/"
+        source.save(update_fields=['base_url'])
+    return source.base_url
+
+
+def _probe_source(source, timeout):
+    try:
+        ok, latency, error = probe_url(source.base_url, timeout)
+        source.record_probe(ok, latency, error)
+        return source, ok, latency, error
+    finally:
+        # Each worker thread opens its own database connection
+        connection.close()
+
+
+def probe_sources(sources, workers=10, timeout=PROBE_TIMEOUT):
+    """
+    Probe the sources in parallel and record the results in their rolling stats
+    Returns a list of (source, ok, latency, error), sources without a known URL are skipped
+    """
+    probeable = [source for source in sources if source.base_url or _fill_base_url(source)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(lambda source: _probe_source(source, timeout), probeable))
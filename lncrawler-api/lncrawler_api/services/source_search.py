@@ -0,0 +1,166 @@
+import time
+import queue
+import difflib
+import logging
+import threading
+from django.utils.text import slugify
+from ..utils.lncrawler_paths import get_source_name
+
+logger = logging.getLogger('lncrawler_api')
+
+SEARCH_MAX_WORKERS = 10
+MAX_RESULTS = 15
+
+
+def load_searchable_sources():
+    """
+    Return (links, prepare_crawler) from the crawler package: one link per crawler able to search,
+    and the function building a crawler for a link. Returns None if the package does not provide them.
+    The sources must already be loaded, which the bot does when it starts.
+    """
+    try:
+        from lncrawl.core.crawler import Crawler
+        from lncrawl.core.sources import crawler_list, prepare_crawler
+    except ImportError:
+        return None
+
+    links = []
+    seen = set()
+    for link, crawler in crawler_list.items():
+        if crawler in seen or not str(link).startswith("http") or crawler.search_novel == Crawler.search_novel:
+            continue
+        seen.add(crawler)
+        links.append(str(link))
+    if not links:
+        return None
+    return links, prepare_crawler
+
+
+def plan_sources(links):
+    """
+    Drop the sources marked dead and give every other source a timeout derived from its latency
+    Returns (plan, skipped) where plan is a list of (link, timeout)
+    """
+    from ..models import ExternalSource
+
+    names = {link: get_source_name(link) for link in links}
+    sources = {
+        source.source_name: source
+        for source in ExternalSource.objects.filter(source_name__in=set(names.values()))
+    }
+
+    plan = []
+    skipped = []
+    for link, name in names.items():
+        source = sources.get(name)
+        if source is None:
+            plan.append((link, ExternalSource.SEARCH_TIMEOUT_DEFAULT))
+        elif source.status == 'dead':
+            skipped.append(link)
+        else:
+            plan.append((link, source.search_timeout))
+    return plan, skipped
+
+
+def _search_source(prepare_crawler, link, query):
+    crawler = prepare_crawler(link)
+    results = []
+    for item in crawler.search_novel(query):
+        item = dict(item)
+        if item.get('url') and item.get('title'):
+            results.append({'title': item['title'], 'url': item['url'], 'info': item.get('info', '')})
+    return results
+
+
+def search_sources(plan, query, prepare_crawler, on_source_done=None, max_workers=SEARCH_MAX_WORKERS, cancelled=None):
+    """
+    Search the planned sources in parallel. A source is given up on once its own timeout
+    (counted from the moment its search started) is over, and stops counting against max_workers,
+    so a slow source never holds the others.
+    on_source_done(link, results, error) is called as each source finishes or times out.
+    The search stops as soon as cancelled() returns True, the sources still running are abandoned.
+    Returns a dict of link -> results
+    """
+    timeouts = dict(plan)
+    waiting = list(plan)
+    deadlines = {}
+    finished = queue.Queue()
+    results = {}
+
+    def run(link):
+        try:
+            finished.put((link, _search_source(prepare_crawler, link, query), None))
+        except Exception as e:
+            finished.put((link, [], f"{type(e).__name__}: {str(e)}"))
+
+    def finish(link, source_results, error=None):
+        del deadlines[link]
+        results[link] = source_results
+        if error:
+            logger.debug(f"Search of {link} failed: {error}")
+        if on_source_done:
+            on_source_done(link, source_results, error)
+
+    while waiting or deadlines:
+        if cancelled is not None and cancelled():
+            break
+
+        while waiting and len(deadlines) < max_workers:
+            link, timeout = waiting.pop(0)
+            deadlines[link] = time.monotonic() + timeout
+            # Abandoned searches are not joined, their daemon threads end on their own
+            threading.Thread(target=run, args=(link,), daemon=True, name=f"Search-{link}").start()
+
+        try:
+            item = finished.get(timeout=0.2)
+            while True:
+                link, source_results, error = item
+                # Results of a source that already timed out are ignored
+                if link in deadlines:
+                    finish(link, source_results, error)
+                item = finished.get_nowait()
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        for link, deadline in list(deadlines.items()):
+            if now > deadline:
+                finish(link, [], f"Timed out after {timeouts[link]:.1f}s")
+
+    return results
+
+
+def combine_results(results_by_source, query):
+    """
+    Group the results of every source by novel title, in the format of the bot search results
+    """
+    combined = {}
+    for link in sorted(results_by_source):
+        for item in results_by_source[link]:
+            key = slugify(str(item['title']))
+            if len(key) <= 2:
+                continue
+            combined.setdefault(key, []).append(item)
+
+    groups = sorted(
+        combined.values(),
+        key=lambda items: (
+            -len(items),
+            -difflib.SequenceMatcher(None, items[0]['title'], query).ratio(),
+        ),
+    )[:MAX_RESULTS]
+
+    return {
+        'status': 'success',
+        'results': [
+            {
+                'index': index,
+                'title': items[0]['title'],
+                'sources': [
+                    {'url': item['url'], 'info': item['info'], 'index': source_index}
+                    for source_index, item in enumerate(sorted(items, key=lambda item: item['url']))
+                ],
+            }
+            for index, items in enumerate(groups)
+        ],
+    }
@@ -0,0 +1,206 @@
+"""
+Normalised-title index of the library novels, used to find the novel a download belongs to.
+
+A title is normalised the way the novel folders are named (lncrawler_paths.sanitize and novel_naming_rules)
+and then reduced to its letters and digits. Near duplicates ("The Beginning After The End" and
+"Beginning after the end.") are found with MinHash over the character trigrams of the key:
+each novel is stored under NUM_BANDS band buckets plus one bucket for its exact key (NovelTitleBucket).
+A band bucket stops taking novels once it holds MAX_BUCKET_SIZE of them, so a lookup reads a bounded
+number of index rows, ranks the novels by the number of buckets they share with the title and computes
+the exact trigram similarity of the best MAX_CANDIDATES of them: two queries and at most MAX_CANDIDATES
+comparisons, whatever the size of the library.
+"""
+import re
+import zlib
+import random
+import hashlib
+import logging
+from collections import Counter
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from ..utils.lncrawler_paths import sanitize, novel_naming_rules
+
+logger = logging.getLogger('lncrawler_api')
+
+# 6 bands of 3 rows: two titles with a trigram similarity of 0.75 share at least one band 96% of the time
+NUM_BANDS = 6
+ROWS_PER_BAND = 3
+# Candidates scored per lookup
+MAX_CANDIDATES = 5
+# Novels a band bucket may hold, a band shared by more titles than this does not tell them apart
+MAX_BUCKET_SIZE = 20
+
+# The permutations are XOR masks of the CRC32 of the trigrams, cheap enough to hash a title in well under
+# a millisecond. Fixed seed: the buckets are stored, every process must compute the same masks
+_rng = random.Random(39)
+_MASKS = [_rng.getrandbits(32) for _ in range(NUM_BANDS * ROWS_PER_BAND)]
+
+# Words left out of the MinHash signatures: their trigrams are in so many titles that
+# they would put a large part of the library in the same buckets
+STOP_WORDS = {"a", "an", "and", "as", "at", "by", "for", "i", "in", "is", "it", "my", "of", "on", "the", "to", "with"}
+
+
+@lru_cache(maxsize=4096)
+def title_key(title: str) -> str:
+    """
+    Normalised key of a novel title: the novel folder name, lowercase, without punctuation
+    """
+    key = novel_naming_rules(sanitize(title or "").lower())
+    key = re.sub(r"[\W_]+", " ", key).strip()
+    # "The Legendary Mechanic" and "Legendary Mechanic" are the same novel
+    return re.sub(r"^(the|a|an) (?=.)", "", key)
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def similarity(key_a: str, key_b: str) -> float:
+    """
+    Jaccard similarity of the trigrams of two keys
+    Keys holding different numbers never match: volume 2 of a novel is not volume 3
+    """
+    if key_a == key_b:
+        return 1.0
+    if re.findall(r"\d+", key_a) != re.findall(r"\d+", key_b):
+        return 0.0
+    a, b = _trigrams(key_a), _trigrams(key_b)
+    return len(a & b) / len(a | b)
+
+
+def key_buckets(key: str) -> list:
+    """
+    Buckets of a key: its exact key first, then one per MinHash band of its trigrams
+    """
+    if not key:
+        return []
+    words = [word for word in key.split() if word not in STOP_WORDS]
+    hashes = [zlib.crc32(trigram.encode("utf-8")) for trigram in _trigrams(" ".join(words) or key)]
+    signature = [min([h ^ mask for h in hashes]) for mask in _MASKS]
+    buckets = [_hash(f"key:{key}")]
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        buckets.append(_hash(f"{band}:" + ":".join(map(str, rows))))
+    return buckets
+
+
+def title_buckets(title: str) -> list:
+    return key_buckets(title_key(title))
+
+
+def index_novel(novel):
+    """
+    (Re)index the title of a novel
+    """
+    from ..models import NovelTitleBucket
+
+    buckets = title_buckets(novel.title)
+    with transaction.atomic():
+        NovelTitleBucket.objects.filter(novel=novel).delete()
+        full = set(
+            NovelTitleBucket.objects.filter(bucket__in=buckets[1:])
+            .values('bucket').annotate(size=Count('id')).filter(size__gte=MAX_BUCKET_SIZE)
+            .values_list('bucket', flat=True)
+        )
+        NovelTitleBucket.objects.bulk_create(
+            [NovelTitleBucket(novel=novel, bucket=bucket) for bucket in set(buckets) - full]
+        )
+
+
+def find_similar_novels(title: str, threshold=None, limit=5):
+    """
+    Library novels whose title matches the given one
+    Returns a list of (similarity, novel) sorted by decreasing similarity, novels only have
+    their id, slug, title and novel_path loaded
+    """
+    from ..models import Novel, NovelTitleBucket
+
+    if threshold is None:
+        threshold = settings.DOWNLOADER_TITLE_MATCH_THRESHOLD
+    key = title_key(title)
+    buckets = key_buckets(key)
+    if not buckets:
+        return []
+
+    # Plain SQL: building the equivalent querysets costs more than running the queries
+    # The novels with the exact key come first: once the band buckets of a title are full, the novel
+    # only shares its exact key bucket and would rank below the novels sharing several bands
+    placeholders = ", ".join(["%s"] * len(buckets))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT novel_id FROM {NovelTitleBucket._meta.db_table} WHERE bucket IN ({placeholders}) "
+            f"GROUP BY novel_id ORDER BY MAX(CASE WHEN bucket = %s THEN 1 ELSE 0 END) DESC, COUNT(*) DESC LIMIT %s",
+            [*buckets, buckets[0], MAX_CANDIDATES],
+        )
+        novel_ids = [row[0] for row in cursor.fetchall()]
+        if not novel_ids:
+            return []
+        cursor.execute(
+            f"SELECT id, slug, title, novel_path FROM {Novel._meta.db_table} "
+            f"WHERE id IN ({', '.join(['%s'] * len(novel_ids))})",
+            novel_ids,
+        )
+        rows = {row[0]: row for row in cursor.fetchall()}
+    # Keep the order of the candidates
+    candidates = [rows[novel_id] for novel_id in novel_ids if novel_id in rows]
+
+    matches = []
+    for novel_id, slug, novel_title, novel_path in candidates:
+        score = similarity(key, title_key(novel_title))
+        if score >= threshold:
+            novel = Novel(id=Novel._meta.pk.to_python(novel_id), slug=slug, title=novel_title, novel_path=novel_path)
+            matches.append((score, novel))
+            if score == 1.0 and limit == 1:
+                # Nothing beats an exact match
+                break
+    matches.sort(key=lambda match: match[0], reverse=True)
+    return matches[:limit]
+
+
+def find_novel(title: str, threshold=None):
+    """
+    Best matching library novel for the title as (similarity, novel), or None
+    """
+    matches = find_similar_novels(title, threshold=threshold, limit=1)
+    return matches[0] if matches else None
+
+
+def rebuild_index(batch_size=1000, novel_model=None, bucket_model=None):
+    """
+    Index the titles of every novel again
+    The models can be given for a migration, which must use the historical ones
+    Returns the number of novels indexed
+    """
+    if novel_model is None or bucket_model is None:
+        from ..models import Novel as novel_model, NovelTitleBucket as bucket_model
+
+    bucket_model.objects.all().delete()
+    indexed = 0
+    last_id = None
+    sizes = Counter()
+    while True:
+        novels = novel_model.objects.order_by('id').only('id', 'title')
+        if last_id is not None:
+            novels = novels.filter(id__gt=last_id)
+        novels = list(novels[:batch_size])
+        if not novels:
+            break
+        rows = []
+        for novel in novels:
+            buckets = title_buckets(novel.title)
+            for index, bucket in enumerate(buckets):
+                if index == 0 or sizes[bucket] < MAX_BUCKET_SIZE:
+                    sizes[bucket] += 1
+                    rows.append(bucket_model(novel_id=novel.id, bucket=bucket))
+        bucket_model.objects.bulk_create(rows)
+        indexed += len(novels)
+        last_id = novels[-1].id
+    logger.info(f"Indexed the titles of {indexed} novels")
+    return indexed
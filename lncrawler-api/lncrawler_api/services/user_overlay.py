@@ -0,0 +1,134 @@
+"""
+Fields of the current user added to payloads that were serialized for nobody.
+
+The stored payloads (novel cards, home page snapshot) are serialized once without a request, their
+fields of the current user are then None: the bookmark and reading history of a novel, the rating
+of a detailed novel, the vote and reading history of a source, the reaction to a review. A UserOverlay
+collects the payloads of a response, loads these fields for all of them in a constant number of
+queries, and sets them in place, with the values the serializers give them for the same request.
+"""
+from django.db.models import Q
+from ..utils import get_client_ip
+
+
+class UserOverlay:
+    """
+    Payloads of a response to complete with the fields of the current user
+    Add the payloads with the add_* methods, then call apply once
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.novels = []
+        self.rated_novels = []
+        self.sources = []
+        self.reviews = []
+
+    def add_novel(self, data):
+        """BasicNovelSerializer payload"""
+        self.novels.append(data)
+        if data.get('prefered_source'):
+            self.add_source(data['prefered_source'])
+
+    def add_detailed_novel(self, data):
+        """DetailedNovelSerializer payload, with its sources, similar novels and reading lists"""
+        self.add_novel(data)
+        self.rated_novels.append(data)
+        for source in data.get('sources') or []:
+            self.add_source(source)
+        for novel in data.get('similar_novels') or []:
+            self.add_novel(novel)
+        for reading_list in data.get('reading_lists') or []:
+            if reading_list.get('first_item') and reading_list['first_item'].get('novel'):
+                self.add_novel(reading_list['first_item']['novel'])
+
+    def add_source(self, data):
+        """NovelSourceSerializer payload"""
+        self.sources.append(data)
+
+    def add_review(self, data):
+        """ReviewListSerializer payload"""
+        self.reviews.append(data)
+
+    def apply(self):
+        request = self.request
+        if request is None:
+            return
+        client_ip = get_client_ip(request)
+        user = request.user if request.user.is_authenticated else None
+
+        if client_ip:
+            self._apply_votes(client_ip)
+            self._apply_ratings(client_ip)
+        self._apply_reactions(user, client_ip)
+        if user is not None:
+            self._apply_bookmarks_and_histories(user)
+
+    def _apply_votes(self, client_ip):
+        from ..models import SourceVote
+
+        if not self.sources:
+            return
+        votes = SourceVote.objects.filter(ip_address=client_ip, source_id__in={source['id'] for source in self.sources})
+        votes = {str(source_id): vote_type for source_id, vote_type in votes.values_list('source_id', 'vote_type')}
+        for source in self.sources:
+            source['user_vote'] = votes.get(source['id'])
+
+    def _apply_ratings(self, client_ip):
+        from ..models import NovelRating
+
+        if not self.rated_novels:
+            return
+        ratings = NovelRating.objects.filter(ip_address=client_ip, novel_id__in={novel['id'] for novel in self.rated_novels})
+        ratings = {str(novel_id): rating for novel_id, rating in ratings.values_list('novel_id', 'rating')}
+        for novel in self.rated_novels:
+            novel['user_rating'] = ratings.get(novel['id'])
+
+    def _apply_reactions(self, user, client_ip):
+        from ..models.reviews_models import ReviewReaction
+        from ..serializers.reviews_serializers import ReactionSerializer
+
+        if not self.reviews or (user is None and not client_ip):
+            return
+        # A reaction of the user wins over an anonymous reaction from the same address
+        mine = Q(user=user) if user is not None else Q(pk__in=[])
+        if client_ip:
+            mine |= Q(ip_address=client_ip, user__isnull=True)
+        reactions = {}
+        for reaction in ReviewReaction.objects.filter(mine, review_id__in={review['id'] for review in self.reviews}):
+            review_id = str(reaction.review_id)
+            if review_id not in reactions or reaction.user_id is not None:
+                reactions[review_id] = reaction
+        for review in self.reviews:
+            reaction = reactions.get(str(review['id']))
+            review['current_user_reaction'] = ReactionSerializer(reaction).data if reaction else None
+
+    def _apply_bookmarks_and_histories(self, user):
+        from ..models import NovelBookmark, ReadingHistory
+        from ..serializers.users_serializers import DetailedReadingHistorySerializer, ReadingHistorySerializer
+
+        novel_ids = {novel['id'] for novel in self.novels} | {source['novel_id'] for source in self.sources if source.get('novel_id')}
+        if not novel_ids:
+            return
+        histories = ReadingHistory.objects.filter(user=user, novel_id__in=novel_ids)
+        if self.novels:
+            bookmarked = {
+                str(novel_id) for novel_id in
+                NovelBookmark.objects.filter(user=user, novel_id__in=novel_ids).values_list('novel_id', flat=True)
+            }
+            histories = DetailedReadingHistorySerializer.setup_queryset(histories, user)
+        else:
+            # The sources only show the last read chapter
+            histories = histories.select_related('last_read_chapter')
+        histories = {str(history.novel_id): history for history in histories}
+        for novel in self.novels:
+            history = histories.get(novel['id'])
+            novel['is_bookmarked'] = novel['id'] in bookmarked
+            novel['reading_history'] = DetailedReadingHistorySerializer(history).data if history else None
+        for source in self.sources:
+            # A user has one reading history per novel, on the source they read
+            history = histories.get(source.get('novel_id'))
+            if history and str(history.source_id) == source['id']:
+                source['reading_history'] = ReadingHistorySerializer(history).data
+            else:
+                source['reading_history'] = None
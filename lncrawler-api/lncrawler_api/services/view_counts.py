@@ -0,0 +1,242 @@
+"""
+Buffered view counts of the chapter reads.
+
+Counting a view used to take six statements and the row locks of the NovelViewCount and WeeklyNovelView
+rows of the novel, the hottest rows of the database, inside the transaction of the request. A read now
+only adds the view to an in-memory buffer of its process. A flusher thread writes the buffer every
+VIEW_COUNT_FLUSH_INTERVAL seconds, or as soon as VIEW_COUNT_MAX_PENDING novels have views waiting:
+one upsert per novel into each table, then one UPDATE of the counters of their cards.
+
+Sharding (VIEW_COUNT_SHARDS above 1): the count rows of a popular novel are still written by every
+flush of every worker. The views then go to one of VIEW_COUNT_SHARDS NovelViewShard rows of the count,
+picked at random, and the fold_view_shards task adds the shards to the counts every minute. The counts
+(and the cards) read by the site are the aggregate of the last fold. The emptied shards of the past weeks
+are deleted by the fold.
+
+Crash loss: a worker that is killed (SIGKILL, out of memory, power loss) loses the views it has not
+flushed yet, at most VIEW_COUNT_FLUSH_INTERVAL seconds of its reads. A normal exit flushes the buffer.
+A flush that fails puts its views back into the buffer, they are written by the next one. While the
+database stays unreachable the buffer keeps the views of at most VIEW_COUNT_MAX_BUFFERED novels (and
+weeks), the views of the other novels are dropped and logged.
+With VIEW_COUNT_FLUSH_INTERVAL = 0 the views are written by the request, nothing can be lost.
+"""
+import os
+import atexit
+import random
+import logging
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .novel_cards import current_year_week, refresh_counters
+
+logger = logging.getLogger('lncrawler_api')
+
+
+def _upsert(table, columns, conflict, rows):
+    """
+    One INSERT ... ON CONFLICT per row, adding the views of the row to the existing ones
+    The rows are written in the order of their conflict columns, so that concurrent flushes (every worker
+    has its own flusher) lock the rows they share in the same order and never deadlock
+    """
+    if not rows:
+        return
+    keys = [columns.index(column) for column in conflict]
+    rows = sorted(rows, key=lambda row: [row[key] for key in keys])
+    table = connection.ops.quote_name(table)
+    updates = ', '.join(
+        f"{column} = {table}.{column} + EXCLUDED.{column}" if column == 'views' else f"{column} = EXCLUDED.{column}"
+        for column in columns if column not in conflict
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET {updates}",
+            rows,
+        )
+
+
+def _add_to_counts(totals, weekly):
+    from ..models import Novel, NovelViewCount, WeeklyNovelView
+
+    novel_pk = Novel._meta.pk
+    now = NovelViewCount._meta.get_field('last_updated').get_db_prep_value(timezone.now(), connection)
+    _upsert(
+        NovelViewCount._meta.db_table, ['novel_id', 'views', 'last_updated'], ['novel_id'],
+        [(novel_pk.get_db_prep_value(novel_id, connection), count, now) for novel_id, count in totals.items()],
+    )
+    _upsert(
+        WeeklyNovelView._meta.db_table, ['novel_id', 'year_week', 'views'], ['novel_id', 'year_week'],
+        [(novel_pk.get_db_prep_value(novel_id, connection), year_week, count) for (novel_id, year_week), count in weekly.items()],
+    )
+
+
+def _add_to_shards(totals, weekly, shards):
+    from ..models import Novel, NovelViewShard
+
+    novel_pk = Novel._meta.pk
+    counts = [((novel_id, ''), count) for novel_id, count in totals.items()] + list(weekly.items())
+    _upsert(
+        NovelViewShard._meta.db_table, ['novel_id', 'year_week', 'shard', 'views'], ['novel_id', 'year_week', 'shard'],
+        [
+            (novel_pk.get_db_prep_value(novel_id, connection), year_week, random.randrange(shards), count)
+            for (novel_id, year_week), count in counts
+        ],
+    )
+
+
+def add_views(totals, weekly):
+    """
+    Add views to the all-time counts ({novel_id: views}) and the weekly counts ({(novel_id, year_week): views})
+    of the novels, with one upsert per novel and count. With VIEW_COUNT_SHARDS above 1, the views go to a
+    random shard of each count instead, and are added to the counts (and the cards) by fold_shards
+    """
+    with transaction.atomic():
+        if settings.VIEW_COUNT_SHARDS > 1:
+            _add_to_shards(totals, weekly, settings.VIEW_COUNT_SHARDS)
+            return
+        _add_to_counts(totals, weekly)
+        refresh_counters(sorted({novel_id for novel_id in totals} | {novel_id for novel_id, _ in weekly}))
+
+
+def fold_shards():
+    """
+    Add the views of the shards to the view counts and the card counters
+    Returns the number of views folded
+    """
+    from ..models import NovelViewShard
+
+    with transaction.atomic():
+        # Writers of the locked shards wait for the end of the fold, the others keep writing. The shards are
+        # locked in the order the writers upsert them (see _upsert)
+        shards = list(
+            NovelViewShard.objects.select_for_update().filter(views__gt=0)
+            .order_by('novel_id', 'year_week', 'shard').values_list('id', 'novel_id', 'year_week', 'views')
+        )
+        if not shards:
+            return 0
+        totals = Counter()
+        weekly = Counter()
+        for _, novel_id, year_week, views in shards:
+            if year_week:
+                weekly[(novel_id, year_week)] += views
+            else:
+                totals[novel_id] += views
+        _add_to_counts(totals, weekly)
+        # Subtracted rather than reset: on databases without row locks, views added since the read are kept
+        table = connection.ops.quote_name(NovelViewShard._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {table} SET views = views - %s WHERE id = %s", [(views, shard_id) for shard_id, _, _, views in shards]
+            )
+        # The shards of the past weeks only get the views still buffered at the end of the week, their
+        # emptied rows are deleted so that the table keeps the shards of the current week only
+        NovelViewShard.objects.filter(views=0).exclude(year_week='').filter(year_week__lt=current_year_week()).delete()
+        refresh_counters(sorted({novel_id for _, novel_id, _, _ in shards}))
+    return sum(views for _, _, _, views in shards)
+
+
+def write_views(views):
+    """
+    Add buffered views ({(novel_id, year_week): count}) to the view counts
+    Returns the ids of the novels whose counts were written
+    """
+    from ..models import Novel
+
+    # Views of novels deleted since they were read are dropped
+    existing = set(Novel.objects.filter(id__in={novel_id for novel_id, _ in views}).values_list('id', flat=True))
+    totals = Counter()
+    weekly = Counter()
+    for (novel_id, year_week), count in views.items():
+        if novel_id in existing:
+            totals[novel_id] += count
+            weekly[(novel_id, year_week)] += count
+    if totals:
+        add_views(totals, weekly)
+    return list(totals)
+
+
+class ViewBuffer:
+    """
+    Views read by this process and not written yet, flushed by a background thread
+    """
+
+    def __init__(self):
+        self._views = Counter()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        # Views that did not fit in the buffer since the last flush
+        self._dropped = 0
+
+    def add(self, novel_id):
+        if settings.VIEW_COUNT_FLUSH_INTERVAL <= 0:
+            write_views(Counter({(novel_id, current_year_week()): 1}))
+            return
+        with self._lock:
+            # The week of the read, not of the flush
+            self._add_views(Counter({(novel_id, current_year_week()): 1}))
+            pending = len(self._views)
+            self._start_flusher()
+        if pending >= settings.VIEW_COUNT_MAX_PENDING:
+            self._wakeup.set()
+
+    def _add_views(self, views):
+        # Called with the lock held, the novels already buffered always get their views
+        for key, count in views.items():
+            if key in self._views or len(self._views) < settings.VIEW_COUNT_MAX_BUFFERED:
+                self._views[key] += count
+            else:
+                self._dropped += count
+
+    def pending(self):
+        with self._lock:
+            return sum(self._views.values())
+
+    def flush(self):
+        """Write the buffered views, returns the number of views written"""
+        with self._lock:
+            views, self._views = self._views, Counter()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            logger.warning(f"Dropped {dropped} chapter views, the view buffer was full")
+        if not views:
+            return 0
+        try:
+            write_views(views)
+        except Exception as e:
+            logger.error(f"Error writing {sum(views.values())} chapter views: {str(e)}")
+            with self._lock:
+                self._add_views(views)
+            return 0
+        return sum(views.values())
+
+    def _start_flusher(self):
+        # A forked worker does not inherit the thread of its parent
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='view-count-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.VIEW_COUNT_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # Django only closes the connections of the request threads, a failed flush must not
+                # leave a broken connection to the next one
+                connection.close()
+
+
+buffer = ViewBuffer()
+atexit.register(buffer.flush)
+
+
+def record_view(novel_id):
+    """Count a chapter read of the novel"""
+    buffer.add(novel_id)
@@ -1,3 +1,1191 @@
-from django.test import TestCase
+import os
+import json
+import importlib
+import time
+import uuid
+import tempfile
+import threading
+import requests
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import (
+    Author, Chapter, ExternalSource, FeaturedNovel, Job, JobArchive, JobMetrics, Novel, NovelBookmark, NovelCard, NovelFromSource, NovelTitleBucket, NovelViewShard, NovelRating,
+    NovelViewCount, ReadingHistory, ReadingList, ReadingListItem, SourceMetrics, SourceVote, Tag, WeeklyNovelView,
+)
+from .models.downloader_models import SearchSourceResult
+from .models.reviews_models import Review, ReviewReaction
+from .serializers import BasicNovelSerializer, ChapterContentSerializer, DetailedNovelSerializer, DetailedReadingHistorySerializer
+from .services import chapter_index, db_pool, home_page, job_events, novel_cards, search_cache, source_probe, source_search, title_index, view_counts
+from .services.crawler_metrics import JobRecorder
+from .services.downloader_service import DownloaderService
+from .services.job_cancel import CancellationToken
+from .services.job_lease import WORKER_ID, JobLease
+from .utils import chapter_store, chapter_utils
+from .management.commands.retry_failed_chapters import Command as RetryFailedChaptersCommand
+from .utils.fake_source import FakeNovelSite
 
 # Create your tests here.
+
+
+class FakeCrawler:
+    """Crawler searching a fake source the way real crawlers do: one blocking request"""
+
+    def __init__(self, link):
+        self.link = link
+
+    def search_novel(self, query):
+        requests.get(f'{self.link}search?q={query}')
+        return [{'title': 'Fake Novel', 'url': f'{self.link}novel/fake', 'info': self.link}]
+
+
+class SourceRoutingTest(TransactionTestCase):
+    """
+    Searches over local fake sources routed by their probed health
+    """
+
+    @mock.patch.multiple(ExternalSource, SEARCH_TIMEOUT_DEFAULT=5, SEARCH_TIMEOUT_MIN=0.5)
+    def test_routing_skips_dead_and_cuts_slow_sources(self):
+        fast = FakeNovelSite(latency=0.01)
+        slow = FakeNovelSite(latency=0.05, search_latency=3)
+        dead = FakeNovelSite(latency=30)
+
+        with fast, slow, dead:
+            links = [fast.url, slow.url, dead.url]
+
+            # Without any stats every source is searched with the default timeout
+            self.assertEqual(source_search.plan_sources(links), ([(link, 5) for link in links], []))
+
+            sources = [
+                ExternalSource.objects.create(source_name=source_search.get_source_name(link), base_url=link)
+                for link in links
+            ]
+            for _ in range(ExternalSource.DEAD_AFTER_FAILURES):
+                source_probe.probe_sources(sources, timeout=1)
+
+            # The dead source is skipped, the others keep their order with a timeout of their own latency
+            plan, skipped = source_search.plan_sources(links)
+            self.assertEqual(skipped, [dead.url])
+            self.assertEqual([link for link, _ in plan], [fast.url, slow.url])
+            timeouts = dict(plan)
+            self.assertEqual(timeouts[fast.url], 0.5)
+            self.assertLess(timeouts[slow.url], 3)
+
+            routed_results = source_search.search_sources(plan, 'fake', FakeCrawler)
+
+        # The slow source is given up on once its timeout is over
+        self.assertEqual(len(routed_results[fast.url]), 1)
+        self.assertEqual(routed_results[slow.url], [])
+        self.assertNotIn(dead.url, routed_results)
+
+
+class PartialSearchResultsTest(TransactionTestCase):
+    """
+    Results of a search read source by source while the slow sources are still searched
+    """
+
+    def test_results_are_readable_per_source_before_the_search_ends(self):
+        fast = FakeNovelSite(latency=0.01)
+        slow = FakeNovelSite(search_latency=2)
+
+        with fast, slow:
+            job = Job.objects.create(query='fake', status=Job.STATUS_SEARCHING)
+            search = threading.Thread(
+                target=DownloaderService._run_source_search,
+                args=(job, 'fake', [fast.url, slow.url], FakeCrawler),
+            )
+            search.start()
+
+            cursor = 0
+            seen = []
+            seen_while_searching = []
+            while search.is_alive():
+                partial = DownloaderService.get_search_results(job.id, cursor=cursor)
+                if not partial['search_completed']:
+                    seen_while_searching.extend(source['source_url'] for source in partial['sources'])
+                seen.extend(source['source_url'] for source in partial['sources'])
+                cursor = partial['cursor']
+                time.sleep(0.05)
+            search.join()
+
+            partial = DownloaderService.get_search_results(job.id, cursor=cursor)
+            seen.extend(source['source_url'] for source in partial['sources'])
+
+        # The fast source was readable while the slow one was still searched, each source is read once
+        self.assertEqual(seen_while_searching[:1], [fast.url])
+        self.assertTrue(partial['search_completed'])
+        self.assertEqual(seen, [fast.url, slow.url])
+        self.assertEqual(len(DownloaderService.get_search_results(job.id)['results']), 1)
+
+
+class JobCancellationTest(TransactionTestCase):
+    def test_cancelled_search_stops_promptly(self):
+        fast = FakeNovelSite(latency=0.01)
+        slow = FakeNovelSite(search_latency=20)
+
+        with fast, slow:
+            job = Job.objects.create(query='fake', status=Job.STATUS_SEARCHING)
+            token = CancellationToken(job.id)
+            token.register()
+            search = threading.Thread(
+                target=DownloaderService._run_source_search,
+                args=(job, 'fake', [fast.url, slow.url], FakeCrawler),
+                kwargs={'cancel_token': token},
+            )
+            search.start()
+            while not job.source_results.exists():
+                time.sleep(0.05)
+
+            start = time.monotonic()
+            self.assertEqual(DownloaderService.cancel_job(job.id)['status'], 'success')
+            search.join(timeout=5)
+            stopped = time.monotonic() - start
+            token.unregister()
+
+        job.refresh_from_db()
+        self.assertFalse(search.is_alive())
+        self.assertLess(stopped, 1)
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertTrue(job.cancel_requested)
+        self.assertEqual(DownloaderService.cancel_job(job.id)['status'], 'error')
+
+    def test_a_cancelled_download_is_not_completed_by_its_thread(self):
+        running = Job.objects.create(status=Job.STATUS_DOWNLOADING, novel_url='https://site.com/running/')
+        self.assertTrue(running.update_status_unless_cancelled(Job.STATUS_DOWNLOAD_COMPLETED))
+        self.assertEqual(Job.objects.get(pk=running.pk).status, Job.STATUS_DOWNLOAD_COMPLETED)
+
+        # Cancelled while the thread was importing: its last update keeps the cancellation
+        job = Job.objects.create(
+            status=Job.STATUS_DOWNLOADING, novel_url='https://site.com/cancelled/', selected_novel={'url': 'https://site.com/cancelled/'}
+        )
+        self.assertEqual(DownloaderService.cancel_job(job.id)['status'], 'success')
+        self.assertFalse(job.update_status_unless_cancelled(Job.STATUS_DOWNLOAD_COMPLETED))
+        DownloaderService._complete_up_to_date(job, '')
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error_message), (Job.STATUS_FAILED, 'Job cancelled by user'))
+
+
+class FakeNovelSiteTest(TestCase):
+    def test_site_serves_the_configured_novel(self):
+        with FakeNovelSite(chapters=12, chapter_size=5000) as site:
+            search = requests.get(f'{site.url}search?q=benchmark').text
+            novel = requests.get(site.novel_url(1)).text
+            chapter = requests.get(f'{site.novel_url(1)}chapter-12/').text
+            missing = requests.get(f'{site.novel_url(1)}chapter-13/')
+
+        self.assertIn('/novel/1/', search)
+        self.assertEqual(novel.count('class="chapter"'), 12)
+        self.assertGreaterEqual(len(chapter), 5000)
+        self.assertEqual(missing.status_code, 404)
+
+
+class SourceHealthTest(TestCase):
+    def test_search_timeout_follows_latency(self):
+        source = ExternalSource.objects.create(source_name='example.com')
+        self.assertEqual(source.search_timeout, ExternalSource.SEARCH_TIMEOUT_DEFAULT)
+
+        for _ in range(10):
+            source.record_probe(True, 2.0)
+        self.assertAlmostEqual(source.avg_latency, 2.0)
+        self.assertEqual(source.status, 'alive')
+        self.assertGreaterEqual(source.search_timeout, 2.0 * ExternalSource.SEARCH_REQUESTS)
+
+        for _ in range(ExternalSource.DEAD_AFTER_FAILURES):
+            source.record_probe(False, error='Timeout')
+        self.assertEqual(source.status, 'dead')
+        self.assertLess(source.availability, 1.0)
+
+        source.record_probe(True, 0.5)
+        self.assertEqual(source.status, 'alive')
+
+
+class ChapterStoreTest(TestCase):
+    def test_chapters_are_read_back_one_by_one_from_the_store(self):
+        source_path = tempfile.mkdtemp()
+        with chapter_store.ChapterStoreWriter(source_path, flush_every=3) as writer:
+            for chapter_id in range(1, 11):
+                body = '' if chapter_id == 4 else f'<p>Chapter {chapter_id} body</p>'
+                writer.add({'id': chapter_id, 'title': f'Chapter {chapter_id}', 'body': body})
+
+        self.assertEqual(chapter_utils.get_chapter(source_path, 7)['title'], 'Chapter 7')
+        self.assertTrue(chapter_utils.check_chapter_has_content(source_path, 7))
+        self.assertFalse(chapter_utils.check_chapter_has_content(source_path, 4))
+        self.assertIsNone(chapter_utils.get_chapter(source_path, 11))
+        self.assertEqual(chapter_store.read_manifest(source_path)['7']['word_count'], 2)
+
+        # A chapter downloaded again shadows its failed copy
+        with chapter_store.ChapterStoreWriter(source_path) as writer:
+            writer.add({'id': 4, 'title': 'Chapter 4', 'body': '<p>Chapter 4 body</p>'})
+        self.assertTrue(chapter_utils.check_chapter_has_content(source_path, 4))
+        self.assertEqual(chapter_utils.get_chapter(source_path, 4)['body'], '<p>Chapter 4 body</p>')
+
+    def test_a_crash_keeps_the_flushed_chapters_readable(self):
+        source_path = tempfile.mkdtemp()
+        with chapter_store.ChapterStoreWriter(source_path) as writer:
+            writer.add({'id': 1, 'title': 'Chapter 1', 'body': '<p>Chapter 1 body</p>'})
+
+        # The process dies after a flush of an update, before the writer is closed
+        writer = chapter_store.ChapterStoreWriter(source_path, flush_every=2)
+        for chapter_id in range(2, 5):
+            writer.add({'id': chapter_id, 'title': f'Chapter {chapter_id}', 'body': f'<p>Chapter {chapter_id} body</p>'})
+
+        self.assertEqual(chapter_utils.get_chapter(source_path, 1)['title'], 'Chapter 1')
+        self.assertEqual(chapter_utils.get_chapter(source_path, 3)['title'], 'Chapter 3')
+        self.assertIsNone(chapter_utils.get_chapter(source_path, 4))
+        self.assertEqual(set(chapter_store.read_manifest(source_path)), {'1', '2', '3'})
+
+
+class TitleIndexTest(TestCase):
+
+    def test_downloads_of_library_novels_are_recognised(self):
+        novel = Novel.objects.create(title='The Beginning After The End', slug='the-beginning-after-the-end')
+        NovelFromSource.objects.create(
+            novel=novel,
+            title=novel.title,
+            source_url='https://www.example.com/novel/tbate/',
+            external_source=ExternalSource.objects.create(source_name='example.com'),
+        )
+        sequel = Novel.objects.create(title='Overgeared 2', slug='overgeared-2')
+        Novel.objects.bulk_create([
+            Novel(title=f'Generated Title Number {index:05}', slug=f'generated-{index}')
+            for index in range(5000)
+        ])
+        title_index.rebuild_index()
+        title_index.index_novel(sequel)
+
+        self.assertEqual(title_index.find_novel('Beginning after the end.')[1].pk, novel.pk)
+        self.assertIsNone(title_index.find_novel('Overgeared 3'))
+        self.assertIsNone(title_index.find_novel('The Legendary Mechanic'))
+
+        # A lookup reads the bounded buckets of the title and scores at most MAX_CANDIDATES novels
+        self.assertFalse(
+            NovelTitleBucket.objects.values('bucket').annotate(size=Count('id'))
+            .filter(size__gt=title_index.MAX_BUCKET_SIZE).exists()
+        )
+        with mock.patch.object(title_index, 'similarity', wraps=title_index.similarity) as scored:
+            for index in range(0, 5000, 250):
+                with self.assertNumQueries(2):
+                    match = title_index.find_novel(f'Generated title number {index:05}!')
+                self.assertEqual(match[1].slug, f'generated-{index}')
+                self.assertLessEqual(scored.call_count, title_index.MAX_CANDIDATES)
+                scored.reset_mock()
+
+        # The library already has this source: nothing is crawled
+        job = Job.objects.create(
+            query='beginning after the end',
+            status=Job.STATUS_SEARCH_COMPLETED,
+            search_results={'status': 'success', 'results': [{
+                'title': 'Beginning After the End',
+                'sources': [{'url': 'http://example.com/novel/tbate'}],
+            }]},
+        )
+        result = DownloaderService.start_download(job.id)
+        self.assertTrue(result['duplicate'])
+        self.assertEqual(result['existing_novel']['slug'], novel.slug)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SEARCH_COMPLETED)
+
+    def test_similar_titles_are_only_merged_when_the_user_accepts(self):
+        novel = Novel.objects.create(title='The Beginning After The End', slug='tbate', novel_path='tbate')
+        title_index.index_novel(novel)
+
+        def search_job(title):
+            return Job.objects.create(
+                status=Job.STATUS_SEARCH_COMPLETED,
+                search_results={'status': 'success', 'results': [{
+                    'title': title,
+                    'sources': [{'url': 'http://other.example.com/novel/tbate'}],
+                }]},
+            )
+
+        started = lambda novel_url, job: {'status': 'success', 'message': 'Download started'}
+        with mock.patch.object(DownloaderService, 'start_direct_download', side_effect=started) as start:
+            # A similar title is returned for confirmation, nothing is started
+            job = search_job('The Beginning After The Ending')
+            result = DownloaderService.start_download(job.id)
+            self.assertTrue(result['confirm_required'])
+            self.assertEqual(result['existing_novel']['slug'], novel.slug)
+            start.assert_not_called()
+
+            # Accepted: the source goes in the folder of the library novel
+            result = DownloaderService.start_download(job.id, accept_match=True)
+            self.assertEqual(result['existing_novel']['slug'], novel.slug)
+            job.refresh_from_db()
+            self.assertEqual(job.library_novel_path, 'tbate')
+
+            # Forced: a new novel
+            job = search_job('The Beginning After The Ending')
+            result = DownloaderService.start_download(job.id, force=True)
+            self.assertNotIn('existing_novel', result)
+            job.refresh_from_db()
+            self.assertIsNone(job.library_novel_path)
+
+            # Same normalised title: merged without asking
+            job = search_job('the beginning after the end!')
+            result = DownloaderService.start_download(job.id)
+            self.assertNotIn('confirm_required', result)
+            job.refresh_from_db()
+            self.assertEqual(job.library_novel_path, 'tbate')
+        self.assertEqual(start.call_count, 3)
+
+
+class DownloaderMetricsTest(TestCase):
+    def test_job_metrics_are_added_to_the_source_totals(self):
+        with FakeNovelSite(chapters=3, chapter_size=2000) as site:
+            job = Job.objects.create(status=Job.STATUS_DOWNLOADING, novel_url='fake')
+            metrics = JobRecorder(job.id)
+            metrics.set_source(site.novel_url(1))
+            crawler = mock.Mock(scraper=requests.Session())
+            metrics.attach(crawler)
+
+            metrics.start('download')
+            chapters = []
+            for chapter_id in (1, 2, 3, 4):
+                response = crawler.scraper.get(f'{site.novel_url(1)}chapter-{chapter_id}/')
+                chapters.append({'id': chapter_id, 'success': response.ok, 'body': response.text if response.ok else ''})
+            chapters[2]['body'] = ''
+            metrics.stop('download')
+            metrics.count_chapters(chapters)
+            job.update_status(Job.STATUS_DOWNLOAD_COMPLETED)
+            metrics.save()
+
+        job_metrics = JobMetrics.objects.get(job=job)
+        self.assertEqual((job_metrics.chapters, job_metrics.chapters_empty, job_metrics.chapters_failed), (2, 1, 1))
+        self.assertEqual((job_metrics.requests, job_metrics.failed_requests), (4, 1))
+        self.assertGreater(job_metrics.bytes_downloaded, 6000)
+        self.assertGreater(job_metrics.download_time, 0)
+
+        totals = self.client.get('/downloader/metrics/').json()['sources']
+        self.assertEqual(len(totals), 1)
+        self.assertEqual(totals[0]['source_name'], job_metrics.source_name)
+        self.assertEqual(totals[0]['downloads'], 1)
+        self.assertEqual(totals[0]['download_failures'], 0)
+        self.assertEqual(totals[0]['chapter_failure_rate'], 0.5)
+        self.assertIsNotNone(totals[0]['chapters_per_second'])
+        self.assertEqual(SourceMetrics.objects.count(), 1)
+
+
+class DownloaderConnectionPoolTest(TestCase):
+    def test_jobs_wait_for_free_connections_and_release_them(self):
+        test_pool = db_pool.ConnectionPool(4)
+        first_ready = threading.Event()
+        release_first = threading.Event()
+        outcome = {}
+
+        def first_job():
+            connections = db_pool.JobConnections('first')
+            connections.acquire(timeout=1)
+            Job.objects.exists()
+            first_ready.set()
+            release_first.wait(5)
+            connections.release()
+
+        def second_job():
+            connections = db_pool.JobConnections('second')
+            try:
+                connections.acquire(timeout=0.2)
+            except db_pool.ConnectionPoolTimeout:
+                outcome['timed_out'] = True
+            release_first.set()
+            connections.acquire(timeout=5)
+            outcome['waiting'] = test_pool.stats()['waiting']
+            Job.objects.exists()
+            connections.release()
+
+        with mock.patch.object(db_pool, 'pool', test_pool):
+            first = threading.Thread(target=first_job)
+            first.start()
+            first_ready.wait(5)
+            second = threading.Thread(target=second_job)
+            second.start()
+            first.join(10)
+            second.join(10)
+
+        stats = test_pool.stats()
+        self.assertTrue(outcome['timed_out'])
+        self.assertEqual((stats['peak'], stats['in_use'], stats['timeouts']), (3, 0, 1))
+        # Both jobs opened a connection and closed it when they ended
+        self.assertEqual((stats['opened'], stats['closed'], stats['open']), (2, 2, 0))
+
+        connections = self.client.get('/downloader/metrics/').json()['connections']
+        self.assertEqual(connections['pool']['size'], db_pool.pool.size)
+        self.assertIn('server', connections)
+
+
+class NovelListQueriesTest(TestCase):
+    """
+    The list endpoints must render a page of novels in the same number of queries whatever its size
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='reader', password='secret', email='reader@example.com')
+        self.reading_list = ReadingList.objects.create(title='Favourites', user=self.user)
+        self.sites = [ExternalSource.objects.create(source_name=f'site{index}.com') for index in range(2)]
+        self.author = Author.objects.create(name='Writer')
+        self.tag = Tag.objects.create(name='Fantasy')
+        self.created = 0
+
+    def add_novels(self, count):
+        current_date = datetime.now()
+        year_week = f"{current_date.isocalendar()[0]}{current_date.isocalendar()[1]:02d}"
+        for _ in range(count):
+            index = self.created
+            self.created += 1
+            novel = Novel.objects.create(title=f'Novel {index}', slug=f'novel-{index}')
+            for site in self.sites:
+                source = NovelFromSource.objects.create(
+                    novel=novel, title=novel.title, source_url=f'https://{site.source_name}/{index}/',
+                    external_source=site, source_slug=site.source_name.replace('.', '-'),
+                )
+                source.authors.add(self.author)
+                source.tags.add(self.tag)
+                Chapter.objects.bulk_create([
+                    Chapter(novel_from_source=source, chapter_id=chapter_id, url=f'https://x/{chapter_id}', title=f'Chapter {chapter_id}', has_content=True)
+                    for chapter_id in (1, 2, 3)
+                ])
+                SourceVote.objects.create(source=source, ip_address='127.0.0.1', vote_type='up')
+            NovelRating.objects.create(novel=novel, ip_address='10.0.0.1', rating=4)
+            NovelViewCount.objects.create(novel=novel, views=index)
+            WeeklyNovelView.objects.create(novel=novel, year_week=year_week, views=index)
+            NovelBookmark.objects.create(user=self.user, novel=novel)
+            ReadingListItem.objects.create(reading_list=self.reading_list, novel=novel, position=index)
+            ReadingHistory.objects.create(
+                user=self.user, novel=novel, source=source, last_read_chapter=source.chapters.get(chapter_id=1)
+            )
+        novel_cards.rebuild_all_cards()
+        home_page.refresh_home_page()
+
+    def count_queries(self):
+        counts = {}
+        for url in (
+            '/novels/', '/novels/search/?sort_by=rating', '/novels/home/', '/users/bookmarks/novels/',
+            '/users/reading-history/', '/reading-lists/', f'/reading-lists/{self.reading_list.id}/',
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(queries)
+        return counts
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.client.force_login(self.user)
+        self.add_novels(2)
+        small_page = self.count_queries()
+        self.add_novels(8)
+        full_page = self.count_queries()
+
+        self.assertEqual(small_page, full_page)
+        self.assertLessEqual(full_page['/novels/'], 16)
+        # The nested data comes from the prefetched rows
+        novel = self.client.get('/novels/').json()['results'][0]
+        self.assertEqual(novel['rating_count'], 1)
+        self.assertTrue(novel['is_bookmarked'])
+        self.assertEqual(novel['prefered_source']['chapters_count'], 3)
+        self.assertEqual(novel['prefered_source']['latest_available_chapter']['chapter_id'], 3)
+        self.assertEqual(novel['reading_history']['next_chapter']['chapter_id'], 2)
+
+
+class NovelRatingAggregatesTest(TestCase):
+    def assertAggregates(self, novel, rating_sum, rating_count):
+        novel.refresh_from_db()
+        self.assertEqual((novel.rating_sum, novel.rating_count), (rating_sum, rating_count))
+        self.assertAlmostEqual(novel.rating_avg, rating_sum / rating_count if rating_count else 0.0)
+
+    def test_aggregates_follow_the_ratings(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            novel = Novel.objects.create(title='Rated', slug='rated')
+        for index, rating in enumerate((5, 4, 1)):
+            NovelRating.objects.create(novel=novel, ip_address=f'10.0.0.{index}', rating=rating)
+        self.assertAggregates(novel, 10, 3)
+
+        NovelRating.objects.update_or_create(novel=novel, ip_address='10.0.0.2', defaults={'rating': 3})
+        self.assertAggregates(novel, 12, 3)
+
+        NovelRating.objects.get(ip_address='10.0.0.0').delete()
+        self.assertAggregates(novel, 7, 2)
+        NovelRating.objects.filter(novel=novel).delete()
+        self.assertAggregates(novel, 0, 0)
+
+        NovelRating.objects.create(novel=novel, ip_address='10.0.0.9', rating=2)
+        Novel.objects.filter(pk=novel.pk).update(rating_sum=40, rating_count=9)
+        call_command('recalculate_ratings', stdout=StringIO())
+        self.assertAggregates(novel, 2, 1)
+
+        response = self.client.get('/novels/search/?min_rating=2&sort_by=rating&sort_order=desc').json()
+        self.assertEqual([result['avg_rating'] for result in response['results']], [2.0])
+
+
+class NovelCardsTest(TestCase):
+    def setUp(self):
+        self.site = ExternalSource.objects.create(source_name='site.com')
+
+    def add_source(self, novel, slug, upvotes=0):
+        return NovelFromSource.objects.create(
+            novel=novel, title=f'{novel.title} {slug}', source_url=f'https://site.com/{novel.slug}/{slug}/',
+            external_source=self.site, source_slug=slug, upvotes=upvotes,
+        )
+
+    def test_cards_follow_the_novels_and_match_the_serializer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            novel = Novel.objects.create(title='Carded', slug='carded')
+            self.add_source(novel, 'first', upvotes=1)
+        card = NovelCard.objects.get(novel=novel)
+        self.assertEqual(card.data['sources_count'], 1)
+
+        # A new source with more votes becomes the prefered source of the card
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.add_source(novel, 'second')
+            SourceVote.objects.create(source=second, ip_address='10.0.0.1', vote_type='up')
+            SourceVote.objects.create(source=second, ip_address='10.0.0.2', vote_type='up')
+        card.refresh_from_db()
+        self.assertEqual(card.data['prefered_source']['id'], str(second.id))
+
+        # Ratings only update the counters
+        with self.captureOnCommitCallbacks(execute=True):
+            NovelRating.objects.create(novel=novel, ip_address='10.0.0.1', rating=3)
+        card.refresh_from_db()
+        self.assertEqual((card.rating_count, card.rating_avg), (1, 3.0))
+
+        request = self.client.get('/novels/').wsgi_request
+        novel = BasicNovelSerializer.setup_queryset(Novel.objects.filter(pk=novel.pk), request).get()
+        expected = BasicNovelSerializer(novel, context={'request': request}).data
+        self.assertEqual(self.client.get('/novels/').json()['results'], [json.loads(JSONRenderer().render(expected))])
+
+        # Cards missing after a deploy are built by the scheduled refresh
+        NovelCard.objects.all().delete()
+        call_command('rebuild_novel_cards', stale=True, stdout=StringIO())
+        self.assertTrue(NovelCard.objects.filter(novel=novel).exists())
+
+        # The migration that added the cards builds them for the existing novels
+        NovelCard.objects.all().delete()
+        importlib.import_module('lncrawler_api.migrations.0056_backfill_novel_cards').build_novel_cards(None, None)
+        self.assertEqual(self.client.get('/novels/').json()['results'], [json.loads(JSONRenderer().render(expected))])
+
+
+
+class HomePageSnapshotTest(TestCase):
+    def test_home_page_is_served_from_the_snapshot_with_the_user_fields(self):
+        user = get_user_model().objects.create_user(username='reader', password='secret', email='reader@example.com')
+        site = ExternalSource.objects.create(source_name='site.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            novel = Novel.objects.create(title='Featured', slug='featured')
+            source = NovelFromSource.objects.create(
+                novel=novel, title='Featured', source_url='https://site.com/featured/', external_source=site, source_slug='featured',
+            )
+        chapter = Chapter.objects.create(novel_from_source=source, chapter_id=1, url='https://site.com/featured/1', title='One')
+        FeaturedNovel.objects.create(novel=novel, description='Picked')
+        review = Review.objects.create(novel=novel, user=user, title='Good', content='Good novel', rating=5)
+        ReviewReaction.objects.create(review=review, user=user, ip_address='10.0.0.1', reaction='heart')
+        call_command('refresh_home_page', stdout=StringIO())
+
+        # Changes after the refresh only show in the fields of the user
+        NovelBookmark.objects.create(user=user, novel=novel)
+        ReadingHistory.objects.create(user=user, novel=novel, source=source, last_read_chapter=chapter)
+        SourceVote.objects.create(source=source, ip_address='127.0.0.1', vote_type='up')
+        self.client.force_login(user)
+        response = self.client.get('/novels/home/')
+        data = response.json()
+
+        request = response.wsgi_request
+        novel.refresh_from_db()
+        expected = json.loads(JSONRenderer().render(DetailedNovelSerializer(novel, context={'request': request}).data))
+        self.assertTrue(expected['is_bookmarked'])
+        self.assertEqual(expected['prefered_source']['upvotes'], 1)
+        expected['prefered_source']['upvotes'] = expected['sources'][0]['upvotes'] = 0
+        expected['prefered_source']['vote_score'] = expected['sources'][0]['vote_score'] = 0
+        self.assertEqual(data['featured_novel']['novel'], expected)
+        self.assertEqual(data['top_novels'][0]['reading_history']['last_read_chapter']['chapter_id'], 1)
+        self.assertEqual(data['recently_updated'][0]['user_vote'], 'up')
+        self.assertEqual(data['recent_reviews'][0]['current_user_reaction']['reaction'], 'heart')
+        self.assertNotIn('featured_novels', data)
+
+
+class PublicDocumentsTest(TestCase):
+    def test_detail_pages_share_a_document_versioned_by_the_card(self):
+        user = get_user_model().objects.create_user(username='reader', password='secret', email='reader@example.com')
+        site = ExternalSource.objects.create(source_name='site.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            novel = Novel.objects.create(title='Cached', slug='cached')
+            source = NovelFromSource.objects.create(
+                novel=novel, title='Cached', source_url='https://site.com/cached/', external_source=site, source_slug='cached',
+            )
+        chapter = Chapter.objects.create(novel_from_source=source, chapter_id=1, url='https://site.com/cached/1', title='One')
+        self.assertIsNotNone(self.client.get('/novels/cached/').json()['prefered_source'])
+
+        # The fields of the user and the counters are not part of the document
+        NovelBookmark.objects.create(user=user, novel=novel)
+        ReadingHistory.objects.create(user=user, novel=novel, source=source, last_read_chapter=chapter)
+        NovelRating.objects.create(novel=novel, ip_address='127.0.0.1', rating=4)
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/novels/cached/').json()
+        self.assertFalse(any('INSERT' in query['sql'] for query in queries), 'the document should come from the cache')
+        self.assertEqual((data['user_rating'], data['avg_rating'], data['is_bookmarked']), (4, 4.0, True))
+        self.assertEqual(data['sources'][0]['reading_history']['last_read_chapter']['chapter_id'], 1)
+        source_data = self.client.get('/novels/cached/cached/').json()
+        self.assertEqual(source_data['reading_history']['last_read_chapter']['chapter_id'], 1)
+
+        # A vote refreshes the card, the next request builds a new version of the documents
+        with self.captureOnCommitCallbacks(execute=True):
+            SourceVote.objects.create(source=source, ip_address='127.0.0.1', vote_type='up')
+        data = self.client.get('/novels/cached/').json()
+        self.assertEqual((data['sources'][0]['upvotes'], data['sources'][0]['user_vote']), (1, 'up'))
+        self.assertEqual(self.client.get('/novels/cached/cached/').json()['upvotes'], 1)
+
+        request = self.client.get('/novels/cached/').wsgi_request
+        novel.refresh_from_db()
+        expected = DetailedNovelSerializer(novel, context={'request': request}).data
+        self.assertEqual(data, json.loads(JSONRenderer().render(expected)))
+
+
+class PreferredSourceTest(TestCase):
+    def test_votes_keep_the_counts_and_the_preferred_source(self):
+        site = ExternalSource.objects.create(source_name='site.com')
+        novel = Novel.objects.create(title='Voted', slug='voted')
+        first, second = [
+            NovelFromSource.objects.create(
+                novel=novel, title=title, source_url=f'https://site.com/{title}/', external_source=site, source_slug=title,
+            )
+            for title in ('a', 'b')
+        ]
+        novel.refresh_from_db()
+        self.assertEqual(novel.preferred_source_id, first.id)
+
+        # Votes through stale copies of the source are all counted
+        for index in range(2):
+            stale_copy = NovelFromSource.objects.get(pk=second.pk)
+            SourceVote.objects.create(source=stale_copy, ip_address=f'10.0.0.{index}', vote_type='up')
+        second.refresh_from_db()
+        novel.refresh_from_db()
+        self.assertEqual((second.upvotes, second.downvotes), (2, 0))
+        self.assertEqual(novel.preferred_source_id, second.id)
+
+        SourceVote.objects.update_or_create(source=second, ip_address='10.0.0.0', defaults={'vote_type': 'down'})
+        SourceVote.objects.filter(source=second, ip_address='10.0.0.1').delete()
+        second.refresh_from_db()
+        novel.refresh_from_db()
+        self.assertEqual((second.upvotes, second.downvotes), (0, 1))
+        self.assertEqual(novel.preferred_source_id, first.id)
+
+        first.delete()
+        novel.refresh_from_db()
+        self.assertEqual(novel.preferred_source_id, second.id)
+
+
+class ViewCountBufferTest(TestCase):
+    @override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600)
+    def test_views_are_written_by_the_flush(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            novels = [Novel.objects.create(title=f'Read {index}', slug=f'read-{index}') for index in range(2)]
+        NovelViewCount.objects.create(novel=novels[0], views=10)
+        for novel in (novels[0], novels[0], novels[1]):
+            view_counts.record_view(novel.id)
+        self.assertEqual(view_counts.buffer.pending(), 3)
+        self.assertEqual(NovelViewCount.objects.get(novel=novels[0]).views, 10)
+
+        # The novels that still exist, one upsert per novel into each table, then the cards locked in order and updated
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(view_counts.buffer.flush(), 3)
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 5)
+        self.assertEqual(view_counts.buffer.pending(), 0)
+
+        year_week = novel_cards.current_year_week()
+        self.assertEqual(
+            {count.novel_id: count.views for count in NovelViewCount.objects.all()}, {novels[0].id: 12, novels[1].id: 1}
+        )
+        self.assertEqual(WeeklyNovelView.objects.get(novel=novels[0], year_week=year_week).views, 2)
+        self.assertEqual(NovelCard.objects.get(novel=novels[0]).total_views, 12)
+
+    @override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600, VIEW_COUNT_MAX_BUFFERED=2)
+    def test_the_buffer_is_capped_while_the_database_is_unreachable(self):
+        novels = [Novel.objects.create(title=f'Unwritten {index}', slug=f'unwritten-{index}') for index in range(3)]
+        with mock.patch.object(view_counts, 'write_views', side_effect=Exception('database is down')):
+            for novel in novels + novels[:1]:
+                view_counts.record_view(novel.id)
+            self.assertEqual(view_counts.buffer.flush(), 0)
+            view_counts.record_view(novels[2].id)
+        # The views of the novels already buffered are kept, the others dropped
+        self.assertEqual(view_counts.buffer.pending(), 3)
+        with self.assertLogs('lncrawler_api', 'WARNING'):
+            self.assertEqual(view_counts.buffer.flush(), 3)
+        self.assertEqual(
+            {count.novel_id: count.views for count in NovelViewCount.objects.all()}, {novels[0].id: 2, novels[1].id: 1}
+        )
+
+
+class ShardedViewCountTest(TestCase):
+    @override_settings(VIEW_COUNT_SHARDS=4)
+    def test_sharded_views_are_folded_into_the_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            novel = Novel.objects.create(title='Viral', slug='viral')
+        view_count = NovelViewCount.objects.create(novel=novel, views=5)
+        for _ in range(20):
+            view_count.increment()
+            WeeklyNovelView.increment_for_novel(novel)
+        view_counts.write_views({(novel.id, '202001'): 3})
+
+        # The counts are the aggregate of the last fold
+        self.assertEqual(NovelViewCount.objects.get(novel=novel).views, 5)
+        self.assertEqual(sum(NovelViewShard.objects.filter(novel=novel, year_week='').values_list('views', flat=True)), 23)
+
+        call_command('fold_view_shards', stdout=StringIO())
+        self.assertEqual(NovelViewCount.objects.get(novel=novel).views, 28)
+        self.assertEqual(WeeklyNovelView.objects.get(novel=novel, year_week=novel_cards.current_year_week()).views, 20)
+        self.assertEqual(WeeklyNovelView.objects.get(novel=novel, year_week='202001').views, 3)
+        self.assertEqual(NovelCard.objects.get(novel=novel).total_views, 28)
+        self.assertFalse(NovelViewShard.objects.filter(views__gt=0).exists())
+
+    @override_settings(VIEW_COUNT_SHARDS=4)
+    def test_the_fold_deletes_the_shards_of_the_past_weeks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            novel = Novel.objects.create(title='Viral', slug='viral')
+        this_week = novel_cards.current_year_week()
+        view_counts.write_views({(novel.id, '202001'): 3, (novel.id, this_week): 2})
+        self.assertEqual(view_counts.fold_shards(), 10)
+
+        # The all-time and current week shards are kept for the next views, the past week is gone
+        self.assertEqual(set(NovelViewShard.objects.values_list('year_week', flat=True)), {'', this_week})
+        self.assertEqual(WeeklyNovelView.objects.get(novel=novel, year_week='202001').views, 3)
+
+        # Views of a past week flushed after the fold are folded and deleted by the next one
+        view_counts.write_views({(novel.id, '202001'): 1})
+        self.assertEqual(view_counts.fold_shards(), 2)
+        self.assertFalse(NovelViewShard.objects.filter(year_week='202001').exists())
+        self.assertEqual(WeeklyNovelView.objects.get(novel=novel, year_week='202001').views, 4)
+        self.assertEqual(NovelViewCount.objects.get(novel=novel).views, 6)
+
+
+class ChapterIndexTest(TestCase):
+    def setUp(self):
+        chapter_index.clear()
+
+    def test_navigation_skips_the_chapters_without_content(self):
+        user = get_user_model().objects.create_user(username='reader', password='secret', email='reader@example.com')
+        site = ExternalSource.objects.create(source_name='site.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            novel = Novel.objects.create(title='Indexed', slug='indexed')
+            source = NovelFromSource.objects.create(
+                novel=novel, title='Indexed', source_url='https://site.com/indexed/', external_source=site, source_slug='indexed',
+            )
+        Chapter.objects.bulk_create([
+            Chapter(novel_from_source=source, chapter_id=number, url=f'https://site.com/indexed/{number}', title=f'Chapter {number}', has_content=number != 3)
+            for number in range(1, 6)
+        ])
+        chapters = {chapter.chapter_id: chapter for chapter in Chapter.objects.select_related('novel_from_source')}
+
+        serializer = ChapterContentSerializer()
+        self.assertEqual(serializer.get_next_chapter(chapters[2]), 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(serializer.get_prev_chapter(chapters[4]), 2)
+            self.assertIsNone(serializer.get_next_chapter(chapters[5]))
+
+        history = ReadingHistory.objects.create(user=user, novel=novel, source=source, last_read_chapter=chapters[2])
+        self.assertEqual(DetailedReadingHistorySerializer(history).data['next_chapter']['chapter_id'], 4)
+        self.client.force_login(user)
+        results = self.client.get('/users/reading-history/').json()['results']
+        self.assertEqual(results[0]['reading_history']['next_chapter']['chapter_id'], 4)
+
+        # An import sets the last chapter update of the source, the next read builds the index again
+        Chapter.objects.create(novel_from_source=source, chapter_id=6, url='https://site.com/indexed/6', title='Chapter 6')
+        Chapter.objects.filter(novel_from_source=source, chapter_id=6).update(has_content=True)
+        source.last_chapter_update = timezone.now()
+        source.save(update_fields=['last_chapter_update'])
+        self.assertEqual(serializer.get_next_chapter(Chapter.objects.select_related('novel_from_source').get(pk=chapters[5].pk)), 6)
+
+
+class ScheduledDownloadsTest(TransactionTestCase):
+    """
+    refresh_ongoing_novels and retry_failed_chapters, with the downloads replaced by instant jobs
+    """
+
+    def setUp(self):
+        self.site = ExternalSource.objects.create(source_name='site.com')
+        self.novel = Novel.objects.create(title='Scheduled', slug='scheduled')
+
+    def add_source(self, slug, **fields):
+        return NovelFromSource.objects.create(
+            novel=self.novel, title=slug, source_url=f'https://site.com/{slug}/', external_source=self.site,
+            source_slug=slug, status='Ongoing', **fields
+        )
+
+    def run_downloads(self, command, **options):
+        started = []
+
+        def start(novel_url, **kwargs):
+            started.append(novel_url)
+            return {'status': 'success', 'job_id': novel_url}
+
+        completed = mock.Mock(status=Job.STATUS_DOWNLOAD_COMPLETED)
+        with mock.patch.object(DownloaderService, 'start_direct_download', side_effect=start), \
+                mock.patch.object(DownloaderService, 'wait_for_download', return_value=completed):
+            call_command(command, workers=1, stdout=StringIO(), stderr=StringIO(), **options)
+        return started
+
+    def test_refresh_intervals_follow_the_release_cadence(self):
+        source = self.add_source('cadence', refresh_interval=4 * 3600)
+        # A failed refresh keeps the interval
+        source.schedule_next_refresh(None)
+        self.assertEqual(source.refresh_interval, 4 * 3600)
+        self.assertIsNone(source.last_refresh_at)
+
+        # Nothing new: the interval grows
+        source.schedule_next_refresh(0)
+        self.assertEqual(source.refresh_interval, 4 * 3600 * NovelFromSource.REFRESH_BACKOFF)
+
+        # 5 chapters in 10 hours with a 3 hours interval: (3 + 10 / 5) / 2 = 2.5 hours
+        source.refresh_interval = 3 * 3600
+        source.last_refresh_at = timezone.now() - timedelta(hours=10)
+        source.schedule_next_refresh(5)
+        self.assertAlmostEqual(source.refresh_interval, 9000, delta=5)
+        self.assertAlmostEqual((source.next_refresh_at - timezone.now()).total_seconds(), 9000, delta=5)
+
+        # The delay of the chapter retries doubles until everything recovered
+        source.schedule_chapter_retry(4)
+        source.schedule_chapter_retry(4)
+        self.assertEqual(source.chapter_retry_count, 2)
+        self.assertAlmostEqual((source.next_chapter_retry_at - timezone.now()).total_seconds(), 4 * 3600, delta=5)
+        source.schedule_chapter_retry(0)
+        self.assertEqual((source.chapter_retry_count, source.next_chapter_retry_at), (0, None))
+
+    def test_refresh_takes_the_most_overdue_sources_within_the_budgets(self):
+        now = timezone.now()
+        never = self.add_source('never')
+        overdue = self.add_source('overdue', next_refresh_at=now - timedelta(days=2))
+        self.add_source('late', next_refresh_at=now - timedelta(hours=1))
+        self.add_source('not-due', next_refresh_at=now + timedelta(hours=1))
+        completed = self.add_source('completed', next_refresh_at=now - timedelta(days=3))
+        NovelFromSource.objects.filter(pk=completed.pk).update(status='Completed')
+
+        # Out of time before the first source: nothing is started and everything stays due
+        self.assertEqual(self.run_downloads('refresh_ongoing_novels', budget=10, time_budget=0), [])
+        self.assertIsNone(NovelFromSource.objects.get(pk=never.pk).next_refresh_at)
+
+        # Never refreshed first, then the most overdue
+        started = self.run_downloads('refresh_ongoing_novels', budget=2)
+        self.assertEqual(started, [never.source_url, overdue.source_url])
+        self.assertGreater(NovelFromSource.objects.get(pk=never.pk).next_refresh_at, now)
+        self.assertEqual(self.run_downloads('refresh_ongoing_novels', budget=10), ['https://site.com/late/'])
+
+    def test_retries_run_in_lanes_per_host(self):
+        hosts = [mock.Mock(external_source=mock.Mock(source_name=name)) for name in ('a', 'a', 'a', 'b')]
+        self.assertEqual(RetryFailedChaptersCommand.split_lanes(hosts, 1), [hosts[:3], hosts[3:]])
+        self.assertEqual(RetryFailedChaptersCommand.split_lanes(hosts, 2), [[hosts[0], hosts[2]], [hosts[1]], [hosts[3]]])
+
+        with tempfile.TemporaryDirectory() as output_path, override_settings(LNCRAWL_OUTPUT_PATH=output_path):
+            sources = [self.add_source(slug, source_path=slug) for slug in ('first', 'second')]
+            for source in sources:
+                Chapter.objects.create(novel_from_source=source, chapter_id=1, url=source.source_url, title='Chapter 1')
+
+            self.assertEqual(self.run_downloads('retry_failed_chapters', time_budget=0), [])
+            self.assertEqual(NovelFromSource.objects.get(pk=sources[0].pk).chapter_retry_count, 0)
+
+            # Nothing recovered on disk: the next retry is scheduled later
+            started = self.run_downloads('retry_failed_chapters')
+            self.assertEqual(sorted(started), sorted(source.source_url for source in sources))
+            self.assertEqual(NovelFromSource.objects.get(pk=sources[0].pk).chapter_retry_count, 1)
+            self.assertEqual(self.run_downloads('retry_failed_chapters'), [])
+
+        totals = SourceMetrics.totals(timezone.localdate())
+        self.assertEqual(
+            [(row['source_name'], row['chapter_retries'], row['chapters_recovered'], row['retry_recovery_rate']) for row in totals],
+            [('site.com', 2, 0, 0.0)],
+        )
+
+
+class JobLeaseTest(TestCase):
+    def test_the_lease_is_renewed_through_database_errors(self):
+        lease = JobLease('job')
+        lease.duration = 0.03
+        lease.RETRY_DELAY = 0.01
+        # Renewed once after an error, then taken over by another worker
+        with mock.patch.object(lease, '_renew', side_effect=[Exception('connection reset'), 1, 0]) as renew, \
+                self.assertLogs('lncrawler_api', 'WARNING') as logs:
+            lease._keep_alive()
+        self.assertEqual(renew.call_count, 3)
+        self.assertIn('Lost the lease', logs.output[-1])
+
+    @override_settings(DOWNLOADER_MAX_RESUMES=2)
+    def test_jobs_of_dead_workers_are_resumed_once(self):
+        past = timezone.now() - timedelta(minutes=5)
+        dead = Job.objects.create(
+            status=Job.STATUS_DOWNLOADING, novel_url='site.com/novel/dead', lease_owner='gone-1', lease_expires_at=past,
+            selected_novel={'url': 'https://site.com/novel/dead'},
+        )
+        alive = Job.objects.create(
+            status=Job.STATUS_DOWNLOADING, novel_url='site.com/novel/alive', lease_owner='other-1',
+            lease_expires_at=timezone.now() + timedelta(minutes=1),
+        )
+        exhausted = Job.objects.create(
+            status=Job.STATUS_DOWNLOADING, novel_url='site.com/novel/exhausted', lease_owner='gone-1',
+            lease_expires_at=past, resume_count=2,
+        )
+        # A search that never got a lease and stopped updating
+        search = Job.objects.create(status=Job.STATUS_SEARCHING, query='lost search')
+        Job.objects.filter(id=search.id).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        started = threading.Semaphore(0)
+        with mock.patch.object(DownloaderService, '_run_download_process', side_effect=lambda *args: started.release()) as download, \
+                mock.patch.object(DownloaderService, '_run_search_process', side_effect=lambda *args: started.release()) as search_process:
+            self.assertEqual(DownloaderService.recover_jobs(), 2)
+            # The resumed jobs hold a lease now, the next recovery leaves them alone
+            self.assertEqual(DownloaderService.recover_jobs(), 0)
+            # The jobs run in their own threads
+            self.assertTrue(started.acquire(timeout=5) and started.acquire(timeout=5))
+
+        download.assert_called_once_with(dead.id, 'https://site.com/novel/dead', True)
+        search_process.assert_called_once_with(search.id, 'lost search')
+        dead.refresh_from_db()
+        self.assertEqual((dead.lease_owner, dead.resume_count), (WORKER_ID, 1))
+        self.assertEqual(Job.objects.get(id=alive.id).lease_owner, 'other-1')
+        self.assertEqual(Job.objects.get(id=exhausted.id).status, Job.STATUS_FAILED)
+
+
+def parse_events(chunks):
+    """(event, data) of the Server-Sent Events of a stream, without the retry and keepalive lines"""
+    events = []
+    for block in ''.join(chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in chunks).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@mock.patch.object(job_events, 'POLL_INTERVAL', 0.01)
+class JobEventsStreamTest(TestCase):
+    def test_the_stream_follows_the_job_until_it_finishes(self):
+        job = Job.objects.create(status=Job.STATUS_DOWNLOADING, total_items=4)
+        stream = job_events.stream_sync(str(job.id))
+        self.assertTrue(next(stream).startswith('retry: '))
+        self.assertEqual(parse_events([next(stream)]), [('status', mock.ANY)])
+
+        Job.objects.filter(id=job.id).update(progress=2)
+        ((event, data),) = parse_events([next(stream)])
+        self.assertEqual((event, data['progress_percentage']), ('progress', 50))
+
+        Job.objects.filter(id=job.id).update(progress=4, status=Job.STATUS_DOWNLOAD_COMPLETED)
+        ((event, data),) = parse_events([next(stream)])
+        self.assertEqual((event, data['job_status']), ('status', Job.STATUS_DOWNLOAD_COMPLETED))
+        # A finished job ends the stream
+        self.assertEqual(list(stream), [])
+
+    def test_the_endpoint_streams_server_sent_events(self):
+        job = Job.objects.create(status=Job.STATUS_FAILED, error_message='Source is down')
+        response = self.client.get(f'/downloader/jobs/{job.id}/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        ((event, data),) = parse_events(response.streaming_content)
+        self.assertEqual((event, data['job_status'], data['error']), ('status', Job.STATUS_FAILED, 'Source is down'))
+
+        self.assertEqual(self.client.get('/downloader/jobs/not-a-job/events/').status_code, 404)
+        missing = parse_events(self.client.get(f'/downloader/jobs/{uuid.uuid4()}/events/').streaming_content)
+        self.assertEqual(missing, [('status', {'job_status': 'not_found', 'error': 'Job not found'})])
+
+    async def test_watchers_of_a_job_share_one_feed(self):
+        job = await Job.objects.acreate(status=Job.STATUS_SEARCH_COMPLETED)
+        streams = [job_events.stream_async(str(job.id)) for _ in range(2)]
+        for stream in streams:
+            self.assertTrue((await anext(stream)).startswith('retry: '))
+        self.assertEqual(len(job_events.hub.feeds), 1)
+        for stream in streams:
+            events = parse_events([chunk async for chunk in stream])
+            self.assertEqual(events, [('status', mock.ANY)])
+        self.assertEqual(job_events.hub.feeds, {})
+
+
+class SearchCacheTest(TestCase):
+    RESULTS = {'status': 'success', 'results': [{'title': 'Solo Leveling', 'sources': []}]}
+
+    def test_identical_queries_share_the_results_until_the_ttl(self):
+        self.assertEqual(settings.CACHES[search_cache.CACHE_ALIAS]['TIMEOUT'], settings.DOWNLOADER_SEARCH_CACHE_TTL)
+        self.assertTrue(search_cache.store_results('Solo Leveling', self.RESULTS))
+        # Case and whitespace are folded
+        self.assertEqual(search_cache.get_cached_results('  SOLO   leveling '), self.RESULTS)
+        self.assertIsNone(search_cache.get_cached_results('Solo Leveling 2'))
+
+        expired = timezone.now() + timedelta(seconds=settings.DOWNLOADER_SEARCH_CACHE_TTL + 1)
+        with mock.patch('django.core.cache.backends.db.tz_now', return_value=expired):
+            self.assertIsNone(search_cache.get_cached_results('Solo Leveling'))
+
+    def test_failed_and_empty_searches_are_not_cached(self):
+        self.assertFalse(search_cache.store_results('down', {'status': 'error', 'message': 'Timed out'}))
+        self.assertFalse(search_cache.store_results('nothing', {'status': 'success', 'results': []}))
+        self.assertIsNone(search_cache.get_cached_results('down'))
+
+    def test_a_cached_search_completes_without_crawling(self):
+        search_cache.store_results('Solo Leveling', self.RESULTS)
+        with mock.patch.object(DownloaderService, '_run_search_process') as search_process:
+            job = DownloaderService.start_search('solo leveling')
+        search_process.assert_not_called()
+        self.assertEqual((job.status, job.search_results), (Job.STATUS_SEARCH_COMPLETED, self.RESULTS))
+
+
+class SingleFlightDownloadTest(TestCase):
+    def setUp(self):
+        # The download threads only report that they started
+        self.started = threading.Semaphore(0)
+        self.waited = 0
+        patcher = mock.patch.object(DownloaderService, '_run_download_process', side_effect=lambda *args: self.started.release())
+        self.download = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertDownloadsStarted(self, count):
+        """Wait for the download threads, count in total"""
+        while self.waited < count:
+            self.assertTrue(self.started.acquire(timeout=5))
+            self.waited += 1
+        self.assertEqual(self.download.call_count, count)
+
+    def test_only_one_download_of_a_novel_is_in_flight(self):
+        Job.objects.create(status=Job.STATUS_DOWNLOADING, novel_url='site.com/novel/one')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(status=Job.STATUS_DOWNLOADING, novel_url='site.com/novel/one')
+        # Finished downloads of the same novel are not limited
+        for _ in range(2):
+            Job.objects.create(status=Job.STATUS_DOWNLOAD_COMPLETED, novel_url='site.com/novel/one')
+
+    def test_requests_for_the_same_novel_join_the_existing_download(self):
+        first = DownloaderService.start_direct_download('https://www.Site.com/novel/two/')
+        second = DownloaderService.start_direct_download('http://site.com/novel/two')
+        self.assertNotIn('shared', first)
+        self.assertEqual((second['job_id'], second['shared']), (first['job_id'], True))
+        self.assertDownloadsStarted(1)
+
+        # A recent complete download is reused, unless the caller needs a new one
+        Job.objects.filter(id=first['job_id']).update(status=Job.STATUS_DOWNLOAD_COMPLETED)
+        self.assertEqual(DownloaderService.start_direct_download('https://site.com/novel/two')['job_id'], first['job_id'])
+        retry = DownloaderService.start_direct_download('https://site.com/novel/two', reuse_recent=False)
+        self.assertNotEqual(retry['job_id'], first['job_id'])
+        self.assertDownloadsStarted(2)
+
+    def test_a_lost_claim_joins_the_winner(self):
+        winner = Job.objects.create(status=Job.STATUS_DOWNLOADING, novel_url='site.com/novel/three')
+        find_shared_download = DownloaderService._find_shared_download
+        checks = []
+
+        def claimed_in_between(normalized_url, include_recent=True):
+            # The other request claims the novel after this one looked for a download to share
+            checks.append(normalized_url)
+            if len(checks) == 1:
+                return None, None
+            return find_shared_download(normalized_url, include_recent)
+
+        with mock.patch.object(DownloaderService, '_find_shared_download', side_effect=claimed_in_between):
+            result = DownloaderService.start_direct_download('https://site.com/novel/three')
+        self.assertEqual((result['job_id'], result['shared']), (str(winner.id), True))
+        self.assertEqual(Job.objects.filter(novel_url='site.com/novel/three').count(), 1)
+        self.download.assert_not_called()
+
+
+class UpdateModeTest(TestCase):
+    def test_only_new_and_failed_chapters_are_fetched(self):
+        site = ExternalSource.objects.create(source_name='site.com')
+        novel = Novel.objects.create(title='Updated', slug='updated')
+        source = NovelFromSource.objects.create(
+            novel=novel, title='Updated', source_url='https://site.com/updated/', external_source=site, source_slug='updated',
+        )
+        def add_chapters(*numbers, has_content):
+            # save() would check the content on disk
+            Chapter.objects.bulk_create([
+                Chapter(
+                    novel_from_source=source, chapter_id=number, url=f'https://site.com/updated/{number}', title=f'Chapter {number}',
+                    has_content=has_content,
+                )
+                for number in numbers
+            ])
+
+        add_chapters(1, has_content=True)
+        add_chapters(2, has_content=False)
+        listed = [{'id': number} for number in range(1, 5)]
+
+        with tempfile.TemporaryDirectory() as output_path:
+            # Chapter 4 was downloaded by a run that was never imported
+            os.makedirs(os.path.join(output_path, 'json'))
+            with open(os.path.join(output_path, 'json', '00004.json'), 'w', encoding='utf-8') as f:
+                json.dump({'id': 4, 'body': 'word ' * 1000}, f)
+
+            pending_ids, fetch_ids = DownloaderService._find_chapters_to_update(source.source_url, listed, output_path)
+            # The failed and new chapters are imported, only those not on disk are fetched
+            self.assertEqual((pending_ids, fetch_ids), ([2, 3, 4], [2, 3]))
+
+            Chapter.objects.filter(novel_from_source=source).update(has_content=True)
+            add_chapters(3, 4, has_content=True)
+            self.assertEqual(DownloaderService._find_chapters_to_update(source.source_url, listed, output_path), ([], []))
+
+            # Nothing pending: the job completes without downloading anything
+            job = Job.objects.create(status=Job.STATUS_DOWNLOADING, selected_novel={'url': source.source_url})
+            DownloaderService._complete_up_to_date(job, output_path)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.output_slug, job.total_items), (Job.STATUS_DOWNLOAD_COMPLETED, 'updated/updated', 0))
+
+
+class JobRetentionTest(TestCase):
+    RESULTS = {
+        'status': 'success',
+        'results': [{'title': f'Novel {index}', 'sources': [{'url': f'https://site.com/novel-{index}/'}]} for index in range(3)],
+    }
+
+    def job(self, status, days_ago, **fields):
+        job = Job.objects.create(status=status, search_results=self.RESULTS, **fields)
+        Job.objects.filter(id=job.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return job
+
+    def test_old_jobs_are_compacted_then_deleted(self):
+        old = self.job(Job.STATUS_SEARCH_COMPLETED, 10)
+        SearchSourceResult.objects.create(job=old, source_url='https://site.com/', results=self.RESULTS['results'])
+        recent = self.job(Job.STATUS_SEARCH_COMPLETED, 1)
+        running = self.job(Job.STATUS_DOWNLOADING, 10, novel_url='site.com/novel/running')
+        expired = self.job(Job.STATUS_FAILED, 40)
+
+        call_command('compact_jobs', days=7, retention_days=30, stdout=StringIO())
+
+        old.refresh_from_db()
+        self.assertEqual(old.search_results, {'status': 'success', 'compacted': True, 'result_count': 3})
+        self.assertEqual(old.get_full_search_results(), self.RESULTS)
+        self.assertFalse(old.source_results.exists())
+        self.assertEqual(JobArchive.objects.get().job_id, old.id)
+        for job in (recent, running):
+            job.refresh_from_db()
+            self.assertIsNone(job.compacted_at)
+            self.assertEqual(job.search_results, self.RESULTS)
+        self.assertFalse(Job.objects.filter(id=expired.id).exists())
+
+        # A compacted job can still be downloaded from its search results
+        with mock.patch.object(DownloaderService, 'start_direct_download', return_value={'status': 'success'}) as start:
+            DownloaderService.start_download(old.id, novel_index=2)
+        start.assert_called_once_with('https://site.com/novel-2/', old)
+
+    def test_the_job_list_pages_by_keyset(self):
+        created_at = timezone.now()
+        jobs = [Job.objects.create(status=Job.STATUS_SEARCH_COMPLETED, query=f'query {index}', search_results=self.RESULTS) for index in range(5)]
+        # Jobs created at the same time are ordered by id
+        Job.objects.filter(id__in=[job.id for job in jobs[:3]]).update(created_at=created_at)
+        expected = [str(job.id) for job in Job.objects.order_by('-created_at', '-id')]
+
+        seen = []
+        cursor = ''
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(f'/downloader/jobs/?limit=2&cursor={cursor}').json()
+            # One query per page, without the results blobs
+            (select,) = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+            self.assertNotIn('search_results', select)
+            seen += [job['id'] for job in page['jobs']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+        self.assertEqual(self.client.get('/downloader/jobs/?status=downloading').json()['jobs'], [])
+        self.assertEqual(self.client.get('/downloader/jobs/?cursor=not-a-cursor').status_code, 400)
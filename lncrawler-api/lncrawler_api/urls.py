@@ -101,7 +101,9 @@ urlpatterns = [
     
     path('downloader/jobs/cancel/<str:job_id>/', views.cancel_job, name='cancel_job'),
     path('downloader/jobs/', views.list_jobs, name='list_jobs'),
+    path('downloader/metrics/', views.downloader_metrics, name='downloader_metrics'),
     path('downloader/jobs/<str:job_id>/', views.job_details, name='job_details'),
+    path('downloader/jobs/<str:job_id>/events/', views.job_events_stream, name='job_events_stream'),
 
     # CSRF token endpoint
     path('csrf-token/', get_csrf_token, name='csrf_token'),
@@ -0,0 +1,213 @@
+"""
+Compressed per-source chapter store.
+
+Chapters are members `json/NNNNN.json` of a single LZMA compressed zip file (json.zip) next to meta.json.
+Unlike json.7z, one chapter can be read without extracting the others. Downloads write into it as the
+crawler saves each chapter, together with a manifest (json.manifest.json) holding the title, content flag
+and word count of every chapter, so an import never needs to open the chapters themselves.
+
+The chapters are kept in memory and written every FLUSH_EVERY chapters and when the download ends.
+A flush appends them to a copy of the zip, closes it and moves it over json.zip, then records them in
+the manifest: json.zip is always a complete archive, and the manifest only lists chapters it holds.
+A crash loses at most the chapters saved since the last flush, which the next update download fetches again.
+"""
+import os
+import json
+import shutil
+import logging
+import threading
+import warnings
+import zipfile
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+logger = logging.getLogger('lncrawler_api')
+
+STORE_FILE = "json.zip"
+MANIFEST_FILE = "json.manifest.json"
+FLUSH_EVERY = 100
+FAILED_BODY = "<p><i>Failed to download chapter body</i></p>"
+FAIL_MESSAGE = "Failed to download chapter body"
+
+
+def _member_name(chapter_id: int) -> str:
+    return f"json/{int(chapter_id):05}.json"
+
+
+def store_path(source_absolute_path) -> Path:
+    return Path(source_absolute_path) / STORE_FILE
+
+
+def chapter_entry(chapter: dict) -> dict:
+    """Manifest entry of a chapter"""
+    body = chapter.get("body") or ""
+    return {
+        "title": chapter.get("title", ""),
+        "has_content": len(body) > 0 and FAIL_MESSAGE not in body,
+        "word_count": body.count(" "),
+    }
+
+
+@lru_cache(maxsize=64)
+def _load_manifest(path: str, mtime_ns: int) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("chapters", {})
+
+
+def read_manifest(source_absolute_path) -> dict:
+    """
+    Returns the manifest of the store as a dict of chapter id (str) -> entry, empty if there is no store
+    """
+    path = Path(source_absolute_path) / MANIFEST_FILE
+    try:
+        return _load_manifest(str(path), path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read the chapter manifest {path}: {e}")
+        return {}
+
+
+def read_chapter(source_absolute_path, chapter_id: int):
+    """
+    Returns the chapter from the store, or None if the store does not contain it
+    """
+    path = store_path(source_absolute_path)
+    if not path.exists():
+        return None
+    try:
+        with zipfile.ZipFile(path) as store:
+            return json.loads(store.read(_member_name(chapter_id)))
+    except KeyError:
+        return None
+    except (zipfile.BadZipFile, OSError, ValueError) as e:
+        logger.error(f"Could not read chapter {chapter_id} from {path}: {e}")
+        return None
+
+
+class ChapterStoreWriter:
+    """
+    Appends chapters to the store of a source and keeps its manifest up to date
+    A chapter written again (retry of a failed chapter) shadows the previous copy
+    """
+
+    def __init__(self, source_absolute_path, flush_every=FLUSH_EVERY):
+        self.source_path = Path(source_absolute_path)
+        self.source_path.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self.manifest = dict(read_manifest(self.source_path))
+        self.written = 0
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, chapter: dict):
+        data = json.dumps(chapter, ensure_ascii=False)
+        with self._lock:
+            self._pending.append((int(chapter["id"]), data, chapter_entry(chapter)))
+            self.written += 1
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        path = store_path(self.source_path)
+        tmp_path = path.with_suffix(".tmp")
+        # A zip opened for appending is unreadable until it is closed, the archive in place stays complete
+        if path.exists():
+            shutil.copyfile(path, tmp_path)
+        elif tmp_path.exists():
+            tmp_path.unlink()
+        with zipfile.ZipFile(tmp_path, "a", compression=zipfile.ZIP_LZMA) as store:
+            with warnings.catch_warnings():
+                # Duplicate names are expected, the last member of a name is the one read
+                warnings.simplefilter("ignore", UserWarning)
+                for chapter_id, data, _ in self._pending:
+                    store.writestr(_member_name(chapter_id), data)
+        os.replace(tmp_path, path)
+
+        # Recorded once the chapters are in json.zip
+        for chapter_id, _, entry in self._pending:
+            self.manifest[str(chapter_id)] = entry
+        manifest_path = self.source_path / MANIFEST_FILE
+        tmp_manifest_path = manifest_path.with_suffix(".tmp")
+        with open(tmp_manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"chapters": self.manifest}, f, ensure_ascii=False)
+        os.replace(tmp_manifest_path, manifest_path)
+        self._pending = []
+
+    def close(self):
+        with self._lock:
+            self._flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# Writers of the downloads in progress, by absolute output path
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _install_save_hook():
+    """
+    Wrap the JSON output stage of the crawler so that chapters saved under an output path
+    with a registered writer go to the store instead of json/NNNNN.json
+    Returns False if the crawler package does not have that stage
+    """
+    try:
+        from lncrawl.core import downloader
+    except ImportError:
+        return False
+
+    save_chapter = getattr(downloader, "_save_chapter", None)
+    if save_chapter is None:
+        return False
+    if getattr(save_chapter, "write_through", False):
+        return True
+
+    def _save_chapter(app, chapter):
+        with _writers_lock:
+            writer = _writers.get(os.path.abspath(str(app.output_path)))
+        if writer is None:
+            return save_chapter(app, chapter)
+
+        # Same formatting as the JSON files written by the crawler
+        if not chapter.get("body"):
+            chapter["body"] = FAILED_BODY
+        title = str(chapter.get("title") or "").replace("<", "&lt;").replace(">", "&gt;")
+        title = f"<h1>{title}</h1>"
+        if not chapter["body"].startswith(title):
+            chapter["body"] = title + chapter["body"]
+        writer.add(chapter)
+
+    _save_chapter.write_through = True
+    downloader._save_chapter = _save_chapter
+    return True
+
+
+@contextmanager
+def write_through(output_path):
+    """
+    While active, the chapters the crawler saves under output_path are written into its store
+    Yields the writer, or None if the crawler output can not be redirected (it then writes JSON files as usual)
+    """
+    if not _install_save_hook():
+        logger.warning("Crawler JSON output stage not found, chapters will be written as files")
+        yield None
+        return
+
+    key = os.path.abspath(str(output_path))
+    writer = ChapterStoreWriter(output_path)
+    with _writers_lock:
+        _writers[key] = writer
+    try:
+        yield writer
+    finally:
+        with _writers_lock:
+            _writers.pop(key, None)
+        writer.close()
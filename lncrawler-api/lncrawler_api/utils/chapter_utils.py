@@ -2,6 +2,7 @@ import json
 import subprocess
 import shutil
 from pathlib import Path
+from . import chapter_store
 
 COMPRESSION_LEVEL = 3
 COMPRESSION_ALGORITHM = "LZMA2"
@@ -48,8 +49,14 @@ def extract_tar_7zip_folder(tar_file_path: Path):
 def get_chapter(source_absolute_path: str, chapter_number: int) -> dict:
     """
     Returns the chapter with the given number. If the chapter is compressed, it will extract it first.
+    Chapters in the chapter store are read directly, without extracting anything.
     """
     try:
+        if not (Path(source_absolute_path) / "json" / f"{chapter_number:05}.json").exists():
+            stored_chapter = chapter_store.read_chapter(source_absolute_path, chapter_number)
+            if stored_chapter is not None:
+                return stored_chapter
+
         compressed_path = Path(source_absolute_path) / "json.7z"
         if compressed_path.exists():
             # Extract the tar file if it exists
@@ -87,6 +94,11 @@ def check_chapter_has_content(source_absolute_path: str, chapter_number: int) ->
                     content = f.read()
                     return fail_message not in content
 
+        # The manifest of the chapter store already knows if the chapter has content
+        entry = chapter_store.read_manifest(source_absolute_path).get(str(chapter_number))
+        if entry is not None:
+            return entry["has_content"]
+
         chapter = get_chapter(source_absolute_path, chapter_number)
         if chapter:
             body = chapter.get("body", None)
@@ -0,0 +1,183 @@
+"""
+Local stand-in for a novel site, and the crawler reading it.
+
+FakeNovelSite serves a synthetic site (search page, novel pages, chapter pages) with a configurable
+number of chapters, chapter size and latency, so the downloader can be measured and tested without
+hitting real sites. register_fake_crawler adds a crawler for it to the crawler package used by the bot.
+"""
+import html
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, quote
+
+WORDS = (
+    "the cultivator raised his sword as the ancient sect gathered beneath the crimson moon while "
+    "disciples whispered of a hidden realm beyond the nine heavens and the system chimed once more"
+).split()
+
+
+def chapter_body(novel_id, chapter_id, size):
+    """Deterministic chapter text of about `size` bytes, split in paragraphs"""
+    paragraphs = []
+    length = 0
+    index = novel_id * 7919 + chapter_id
+    while length < size:
+        paragraph = " ".join(WORDS[(index + i) % len(WORDS)] for i in range(60))
+        paragraphs.append(f"<p>{paragraph}.</p>")
+        length += len(paragraph) + 8
+        index += 1
+    return "".join(paragraphs)
+
+
+class FakeNovelSite:
+    """
+    Synthetic novel site on 127.0.0.1
+    - /search?q=<query>: the novels whose title contains the query
+    - /novel/<n>/: title, author, synopsis and the chapter list of novel n
+    - /novel/<n>/chapter-<i>/: the text of chapter i
+    Every response waits `latency` seconds, searches wait `search_latency` seconds
+    """
+
+    def __init__(self, novels=1, chapters=100, chapter_size=8000, latency=0.0, search_latency=None,
+                 title="Benchmark Novel"):
+        self.novels = novels
+        self.chapters = chapters
+        self.chapter_size = chapter_size
+        self.latency = latency
+        self.search_latency = latency if search_latency is None else search_latency
+        self.title = title
+        self.requests = 0
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests += 1
+                parts = urlsplit(self.path)
+                time.sleep(site.search_latency if parts.path.startswith("/search") else site.latency)
+                status, body = site.render(parts.path, parse_qs(parts.query))
+                body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def novel_title(self, novel_id):
+        return f"{self.title} {novel_id}"
+
+    def novel_url(self, novel_id):
+        return f"{self.url}novel/{novel_id}/"
+
+    def render(self, path, query):
+        segments = [segment for segment in path.split("/") if segment]
+        if not segments:
+            return 200, f"<html><body><h1>{html.escape(self.title)}</h1></body></html>"
+
+        if segments[0] == "search":
+            term = (query.get("q") or [""])[0].lower()
+            links = "".join(
+                f'<a class="novel" href="/novel/{n}/">{html.escape(self.novel_title(n))}</a>'
+                for n in range(1, self.novels + 1)
+                if term in self.novel_title(n).lower()
+            )
+            return 200, f"<html><body>{links}</body></html>"
+
+        if segments[0] == "novel" and len(segments) >= 2 and segments[1].isdigit():
+            novel_id = int(segments[1])
+            if not 1 <= novel_id <= self.novels:
+                return 404, "Not found"
+
+            if len(segments) == 2:
+                chapters = "".join(
+                    f'<li><a class="chapter" href="/novel/{novel_id}/chapter-{i}/">Chapter {i}</a></li>'
+                    for i in range(1, self.chapters + 1)
+                )
+                return 200, (
+                    f"<html><body><h1>{html.escape(self.novel_title(novel_id))}</h1>"
+                    f'<p class="author">Fake Author</p>'
+                    f'<div class="synopsis"><p>Synthetic novel served by a local fake source.</p></div>'
+                    f"<ul>{chapters}</ul></body></html>"
+                )
+
+            chapter = segments[2].replace("chapter-", "")
+            if len(segments) == 3 and chapter.isdigit() and 1 <= int(chapter) <= self.chapters:
+                body = chapter_body(novel_id, int(chapter), self.chapter_size)
+                return 200, f'<html><body><h2>Chapter {chapter}</h2><div id="content">{body}</div></body></html>'
+
+        return 404, "Not found"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def make_fake_crawler(site_url):
+    """
+    Build a crawler class of the crawler package for the fake site at site_url
+    Raises ImportError if the crawler package is not available
+    """
+    from lncrawl.core.crawler import Crawler
+    from lncrawl.models import Chapter, SearchResult, Volume
+
+    class FakeSourceCrawler(Crawler):
+        base_url = [site_url]
+
+        def initialize(self):
+            # The home URL given by prepare_crawler does not keep the port
+            self.home_url = site_url
+
+        def search_novel(self, query):
+            soup = self.get_soup(f"{site_url}search?q={quote(query)}")
+            return [
+                SearchResult(title=a.text.strip(), url=self.absolute_url(a["href"]), info="")
+                for a in soup.select("a.novel")
+            ]
+
+        def read_novel_info(self):
+            soup = self.get_soup(self.novel_url)
+            self.novel_title = soup.select_one("h1").text.strip()
+            self.novel_author = soup.select_one(".author").text.strip()
+            self.novel_synopsis = str(soup.select_one(".synopsis"))
+            self.volumes.append(Volume(id=1))
+            for chapter_id, a in enumerate(soup.select("a.chapter"), start=1):
+                self.chapters.append(
+                    Chapter(id=chapter_id, volume=1, title=a.text.strip(), url=self.absolute_url(a["href"]))
+                )
+
+        def download_chapter_body(self, chapter):
+            soup = self.get_soup(chapter["url"])
+            return self.cleaner.extract_contents(soup.select_one("#content"))
+
+    return FakeSourceCrawler
+
+
+def register_fake_crawler(site):
+    """
+    Make the crawler package (and so the bot) handle the URLs of the fake site
+    Crawlers are looked up by link and by host name: only one fake site can be registered at a time
+    """
+    from lncrawl.core.sources import crawler_list
+
+    crawler = make_fake_crawler(site.url)
+    crawler_list[site.url] = crawler
+    crawler_list[urlsplit(site.url).hostname] = crawler
+    return crawler
@@ -63,10 +63,18 @@ def sanitize(text: str) -> str:
     return text
 
 
-def get_novel_output_path(source, novel) -> str:
+def get_source_name(url: str) -> str:
+    """
+    Name of the source of a URL, as used for the source folders and ExternalSource.source_name
+    """
+    return sanitize(url.split("/")[2]).lower()
+
+
+def get_novel_output_path(source, novel, novel_path=None) -> str:
     """
     Get the output path for a novel based on its source and name.
     The path format is BASE / NOVEL / SOURCE
+    If novel_path (folder of a library novel, relative to BASE) is given, the source is put in it
     """
     # settings.py LNCRAWL_OUTPUT_PATH
     BASE_DIR = settings.LNCRAWL_OUTPUT_PATH
@@ -86,6 +94,8 @@ def get_novel_output_path(source, novel) -> str:
         
     # Apply novel naming rules
     novel = novel_naming_rules(novel)
+    if novel_path:
+        novel = novel_path
     
     # Create the novel directory if it doesn't exist
     novel_dir = os.path.join(BASE_DIR, novel)
@@ -2,13 +2,22 @@ from django.shortcuts import render
 
 # Create your views here.
 
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+import uuid
+import base64
+from datetime import timedelta
 
 from ..services import DownloaderService
-from ..models import Job
+from ..services import job_events
+from ..services import db_pool
+from ..models import Job, SourceMetrics
 
 
 @csrf_exempt
@@ -28,7 +37,9 @@ def start_search(request):
                 status=400,
             )
         
-        job = DownloaderService.start_search(query)
+        # "refresh" forces a new crawl instead of reusing cached results
+        use_cache = not data.get("refresh", False)
+        job = DownloaderService.start_search(query, use_cache=use_cache)
 
         return JsonResponse(
             {"status": "success", "message": "Search started", "job_id": str(job.id)}
@@ -53,9 +64,18 @@ def get_search_status(request, job_id):
 
 @require_http_methods(["GET"])
 def get_search_results(request, job_id):
-    """Get the results of a search job"""
+    """
+    Get the results of a search job
+    With ?cursor=<n> (0 for the first call), return the results of the sources that answered since that cursor
+    """
     try:
-        results = DownloaderService.get_search_results(job_id)
+        cursor = request.GET.get("cursor")
+        if cursor is not None:
+            try:
+                cursor = max(0, int(cursor))
+            except ValueError:
+                return JsonResponse({"status": "error", "message": "Invalid cursor"}, status=400)
+        results = DownloaderService.get_search_results(job_id, cursor=cursor)
         return JsonResponse(results)
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
@@ -69,12 +89,18 @@ def start_download(request, job_id):
         data = json.loads(request.body)
         novel_index = int(data.get("novel_index", 0))
         source_index = int(data.get("source_index", 0))
+        # Download even if the library already has the novel from this source
+        force = bool(data.get("force", False))
+        # Add the source to the similar library novel the previous call asked about
+        accept_match = bool(data.get("accept_match", False))
 
         # Always use JSON format and download all chapters
         result = DownloaderService.start_download(
             job_id,
             novel_index=novel_index,
-            source_index=source_index
+            source_index=source_index,
+            force=force,
+            accept_match=accept_match
         )
 
         return JsonResponse(result)
@@ -119,11 +145,67 @@ def cancel_job(request, job_id):
 
 @require_http_methods(["GET"])
 def list_jobs(request):
-    """List all jobs"""
+    """
+    List the jobs, newest first, without their results
+    Paginated by keyset: pass the next_cursor of a page as ?cursor= to get the next one
+    Optional: ?limit= (default 50, at most 200) and ?status=
+    """
     try:
-        jobs = Job.objects.all().order_by("-created_at")
+        try:
+            limit = min(max(int(request.GET.get("limit", 50)), 1), 200)
+        except ValueError:
+            limit = 50
+
+        jobs = Job.objects.only(*Job.LIST_FIELDS).order_by("-created_at", "-id")
+        status = request.GET.get("status")
+        if status:
+            jobs = jobs.filter(status=status)
+
+        cursor = request.GET.get("cursor")
+        if cursor:
+            try:
+                created_at, job_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+                created_at = parse_datetime(created_at)
+                job_id = uuid.UUID(job_id)
+            except (ValueError, TypeError):
+                return JsonResponse({"status": "error", "message": "Invalid cursor"}, status=400)
+            jobs = jobs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=job_id))
+
+        page = list(jobs[:limit + 1])
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            next_cursor = base64.urlsafe_b64encode(f"{last.created_at.isoformat()}|{last.id}".encode()).decode()
+
         return JsonResponse(
-            {"status": "success", "jobs": [job.to_dict() for job in jobs]}
+            {"status": "success", "jobs": [job.to_list_dict() for job in page], "next_cursor": next_cursor}
+        )
+    except Exception as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+def downloader_metrics(request):
+    """
+    Search and download metrics of every source over the last ?days= days (default 7, at most 90),
+    and the database connections of the downloader
+    """
+    try:
+        try:
+            days = min(max(int(request.GET.get("days", 7)), 1), 90)
+        except ValueError:
+            days = 7
+
+        since = timezone.localdate() - timedelta(days=days - 1)
+        return JsonResponse(
+            {
+                "status": "success",
+                "days": days,
+                "since": since.isoformat(),
+                "sources": SourceMetrics.totals(since),
+                "connections": db_pool.connection_stats(),
+            }
         )
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
@@ -144,6 +226,30 @@ def job_details(request, job_id):
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
 
 
+@require_http_methods(["GET"])
+def job_events_stream(request, job_id):
+    """Stream the status transitions and progress of a job as Server-Sent Events"""
+    try:
+        job_id = str(uuid.UUID(job_id))
+    except ValueError:
+        return JsonResponse(
+            {"status": "error", "message": f"Job with ID {job_id} not found"},
+            status=404,
+        )
+
+    # Under ASGI the stream is async and shared between the watchers of a job,
+    # so idle watchers do not hold a server thread
+    if isinstance(request, ASGIRequest):
+        stream = job_events.stream_async(job_id)
+    else:
+        stream = job_events.stream_sync(job_id)
+
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Tell nginx not to buffer the stream
+    return response
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def start_direct_download(request):
@@ -151,6 +257,8 @@ def start_direct_download(request):
     try:
         data = json.loads(request.body)
         novel_url = data.get("novel_url")
+        # Only fetch the chapters that are not in the library yet
+        update_only = bool(data.get("update", False))
 
         if not novel_url or not novel_url.startswith('http'):
             return JsonResponse(
@@ -162,7 +270,7 @@ def start_direct_download(request):
             )
         
         # Use the existing direct download method from the service
-        result = DownloaderService.start_direct_download(novel_url)
+        result = DownloaderService.start_direct_download(novel_url, update_only=update_only)
         return JsonResponse(result)
     
     except json.JSONDecodeError:
@@ -4,40 +4,37 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.core.paginator import Paginator
-from django.db.models import F, Avg, Q, Count, Value, Max, Min
-from django.db.models.functions import Coalesce
+from django.db.models import Q, Count
 from ..models import (
     Novel,
+    NovelCard,
     NovelRating,
     Tag,
     Author,
     FeaturedNovel,
-    NovelFromSource,
 )
-from ..models.reviews_models import Review
 from ..utils import get_client_ip
-from datetime import datetime
 from ..serializers import (
-    BasicNovelSerializer,
+    NovelCardSerializer,
     DetailedNovelSerializer,
-    NovelSourceSerializer,
 
 )
-from ..serializers.reviews_serializers import ReviewListSerializer
+from ..services.home_page import home_page_for
+from ..services.public_documents import novel_detail_for
 
 @api_view(["GET"])
 def list_novels(request):
     """
     List all novels with pagination
     """
-    novels = Novel.objects.all().order_by("title")
+    novels = NovelCard.objects.order_by("title")
     page_number = request.GET.get("page", 1)
     page_size = request.GET.get("page_size", 20)
 
     paginator = Paginator(novels, page_size)
     page_obj = paginator.get_page(page_number)
 
-    serializer = BasicNovelSerializer(page_obj, many=True, context={"request": request})
+    serializer = NovelCardSerializer(page_obj, many=True, context={"request": request})
 
     return Response(
         {
@@ -54,9 +51,8 @@ def novel_detail_by_slug(request, novel_slug):
     """
     Get details for a specific novel using its slug
     """
-    novel = get_object_or_404(Novel, slug=novel_slug)
-    serializer = DetailedNovelSerializer(novel, context={"request": request})
-    return Response(serializer.data)
+    novel = get_object_or_404(Novel.objects.select_related('card'), slug=novel_slug)
+    return Response(novel_detail_for(request, novel))
 
 
 
@@ -92,13 +88,12 @@ def rate_novel(request, novel_slug):
     )
 
     # Get updated average rating
-    avg_rating = novel.ratings.aggregate(avg_rating=Avg("rating"))["avg_rating"]
-    rating_count = novel.ratings.count()
+    novel.refresh_from_db(fields=["rating_avg", "rating_count"])
 
     return Response(
         {
-            "avg_rating": round(avg_rating, 1) if avg_rating else None,
-            "rating_count": rating_count,
+            "avg_rating": round(novel.rating_avg, 1) if novel.rating_count else None,
+            "rating_count": novel.rating_count,
             "user_rating": rating_value,
         }
     )
@@ -157,78 +152,51 @@ def search_novels(request):
     if language:
         novels_query = novels_query.filter(sources__language=language).distinct()
 
+    # The cards hold the counters and sort fields, the filters on the sources are applied to the novels
+    cards_query = NovelCard.objects.all()
+    if query or tags or exclude_tags or authors or status or language:
+        cards_query = cards_query.filter(novel__in=novels_query)
+
     # Filter by minimum rating
     if min_rating and min_rating.isdigit():
         min_rating_val = float(min_rating)
         # Get novels with average rating >= min_rating
-        novels_with_min_rating = Novel.objects.annotate(
-            avg_rating=Avg("ratings__rating")
-        ).filter(avg_rating__gte=min_rating_val)
-        novels_query = novels_query.filter(id__in=novels_with_min_rating)
-
-    # Get current ISO year and week for trending
-    current_date = datetime.now()
-    current_year_week = (
-        f"{current_date.isocalendar()[0]}{current_date.isocalendar()[1]:02d}"
-    )
+        cards_query = cards_query.filter(rating_count__gt=0, rating_avg__gte=min_rating_val)
 
     # Apply sorting
     if sort_by == "rating":
-        # Sort by rating requires annotation
-        novels_query = novels_query.annotate(
-            avg_rating=Coalesce(Avg("ratings__rating"), Value(0.0))
-        )
-        order_field = "-avg_rating" if sort_order == "desc" else "avg_rating"
-        novels_query = novels_query.order_by(order_field, "title")
+        # The average rating is stored on the card, 0 for novels without rating
+        order_field = "-rating_avg" if sort_order == "desc" else "rating_avg"
+        cards_query = cards_query.order_by(order_field, "title")
     elif sort_by == "title":
         order_field = "-title" if sort_order == "desc" else "title"
-        novels_query = novels_query.order_by(order_field)
+        cards_query = cards_query.order_by(order_field)
     elif sort_by == "date_added":
         order_field = "-created_at" if sort_order == "desc" else "created_at"
-        novels_query = novels_query.order_by(order_field)
+        cards_query = cards_query.order_by(order_field)
     elif sort_by == "popularity":
         # Use total view count for popularity
-        novels_query = novels_query.annotate(
-            total_views=Coalesce(F('view_count__views'), Value(0))
-        )
         order_field = "-total_views" if sort_order == "desc" else "total_views"
-        novels_query = novels_query.order_by(order_field, "title")
+        cards_query = cards_query.order_by(order_field, "title")
     elif sort_by == "trending":
         # Use weekly view count for trending
-        novels_query = novels_query.annotate(
-            week_views=Coalesce(
-                Avg(
-                    "weekly_views__views",
-                    filter=Q(weekly_views__year_week=current_year_week),
-                ),
-                Value(0.0),
-            )
-        )
-        order_field = "-week_views" if sort_order == "desc" else "week_views"
-        novels_query = novels_query.order_by(order_field, "title")
+        order_field = "-weekly_views" if sort_order == "desc" else "weekly_views"
+        cards_query = cards_query.order_by(order_field, "title")
     elif sort_by == "last_updated":
-        # Annotate with the most recent last_updated date among all sources
+        # Most recent chapter update among all sources, or least recent one in ascending order
         if sort_order == "desc":
-            novels_query = novels_query.annotate(
-                last_update=Max('sources__last_chapter_update')
-            )
-            order_field = "-last_update"
-            novels_query = novels_query.order_by(order_field, "title")
+            cards_query = cards_query.order_by("-last_chapter_update", "title")
         else:
-            novels_query = novels_query.annotate(
-                last_update=Min('sources__last_chapter_update')
-            )
-            order_field = "last_update"
-            novels_query = novels_query.order_by(order_field, "title")
+            cards_query = cards_query.order_by("first_chapter_update", "title")
     else:
         # Default sorting by title
-        novels_query = novels_query.order_by("title")
+        cards_query = cards_query.order_by("title")
 
     # Pagination
-    paginator = Paginator(novels_query, page_size)
+    paginator = Paginator(cards_query, page_size)
     page_obj = paginator.get_page(page_number)
 
-    serializer = BasicNovelSerializer(page_obj, many=True, context={"request": request})
+    serializer = NovelCardSerializer(page_obj, many=True, context={"request": request})
 
     return Response(
         {
@@ -330,77 +298,6 @@ def random_featured_novel(request):
 def home_page(request):
     """
     Get all data needed for the home page in a single request
+    Served from the snapshot refreshed by the scheduler (see services/home_page.py)
     """
-    from datetime import datetime
-    
-    # Get current ISO year and week for trending
-    current_date = datetime.now()
-    current_year_week = (
-        f"{current_date.isocalendar()[0]}{current_date.isocalendar()[1]:02d}"
-    )
-    
-    # Base queryset with common annotations
-    base_queryset = Novel.objects.select_related().prefetch_related(
-        'sources', 'ratings', 'view_count', 'weekly_views'
-    )
-    
-    # Top novels (most popular)
-    top_novels = (
-        base_queryset.annotate(
-            total_views=Coalesce(F('view_count__views'), Value(0))
-        )
-        .order_by('-total_views', 'title')[:12]
-    )
-    
-    # Trending novels (weekly views)
-    trending_novels = (
-        base_queryset.annotate(
-            week_views=Coalesce(
-                Avg(
-                    "weekly_views__views",
-                    filter=Q(weekly_views__year_week=current_year_week),
-                ),
-                Value(0.0),
-            )
-        )
-        .order_by('-week_views', 'title')[:12]
-    )
-    
-    # Top rated novels
-    top_rated_novels = (
-        base_queryset.annotate(
-            avg_rating=Coalesce(Avg("ratings__rating"), Value(0.0))
-        )
-        .order_by('-avg_rating', 'title')[:12]
-    )
-    
-    # Get featured novel
-    featured_novel_data = None
-    featured_count = FeaturedNovel.objects.count()
-    if featured_count > 0:
-        import random
-        random_index = random.randint(0, featured_count - 1)
-        featured = FeaturedNovel.objects.select_related('novel').all()[random_index]
-        featured_novel_data = {
-            'novel': DetailedNovelSerializer(featured.novel, context={"request": request}).data,
-            'description': featured.description,
-            'featured_since': featured.created_at,
-        }
-    
-    # for the recently updated it's a list of NovelFromSource insead of Novel that we want
-    recently_updated = NovelFromSource.objects.order_by('-last_chapter_update')[:12]
-    
-    # Get recent reviews (4 most recent instead of 5)
-    recent_reviews = Review.objects.select_related('user', 'novel').prefetch_related('reactions__user').order_by('-created_at')[:4]
-    
-    # Serialize all the data
-    response_data = {
-        'top_novels': BasicNovelSerializer(top_novels, many=True, context={"request": request}).data,
-        'trending_novels': BasicNovelSerializer(trending_novels, many=True, context={"request": request}).data,
-        'top_rated_novels': BasicNovelSerializer(top_rated_novels, many=True, context={"request": request}).data,
-        'recently_updated': NovelSourceSerializer(recently_updated, many=True, context={"request": request}).data,
-        'featured_novel': featured_novel_data,
-        'recent_reviews': ReviewListSerializer(recent_reviews, many=True, context={"request": request}).data,
-    }
-    
-    return Response(response_data)
+    return Response(home_page_for(request))
@@ -24,7 +24,7 @@ def list_all_reading_lists(request):
     user_id = request.GET.get("user_id")
     search = request.GET.get("search", "")
     
-    query_set = ReadingList.objects.all()
+    query_set = ReadingListSerializer.setup_queryset(ReadingList.objects.all(), request)
     
     if user_id:
         query_set = query_set.filter(user_id=user_id)
@@ -64,7 +64,7 @@ def get_user_reading_lists(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    query_set = ReadingList.objects.filter(user_id=user_id)
+    query_set = ReadingListSerializer.setup_queryset(ReadingList.objects.filter(user_id=user_id), request)
     
     query_set = query_set.order_by('-created_at')
         
@@ -86,7 +86,9 @@ def reading_list_detail(request, list_id):
     """
     Get details of a specific reading list including all its items.
     """
-    reading_list = get_object_or_404(ReadingList, id=list_id)
+    reading_list = get_object_or_404(
+        DetailedReadingListSerializer.setup_queryset(ReadingList.objects.all(), request), id=list_id
+    )
     serializer = DetailedReadingListSerializer(reading_list, context={"request": request})
     return Response(serializer.data)
 
@@ -7,12 +7,14 @@ from django.core.paginator import Paginator
 import os
 from urllib.parse import quote
 
-from ..models import Novel, SourceVote, NovelViewCount, WeeklyNovelView
-from ..serializers import NovelSourceSerializer, ChapterSerializer, ChapterContentSerializer
+from ..models import Novel, SourceVote
+from ..serializers import ChapterSerializer, ChapterContentSerializer
 from ..serializers.sources_serializers import GalleryImageSerializer
 from django.db.models import F, Avg, Q, Count, Value, Max, Min
 from django.db.models.functions import Coalesce
 from ..utils import get_client_ip
+from ..services.view_counts import record_view
+from ..services.public_documents import source_detail_for
 from django.conf import settings
 
 
@@ -21,12 +23,11 @@ def source_detail(request, novel_slug, source_slug):
     """
     Get details for a specific novel source
     """
-    novel = get_object_or_404(Novel, slug=novel_slug)
+    novel = get_object_or_404(Novel.objects.select_related('card'), slug=novel_slug)
     source = get_object_or_404(novel.sources, source_slug=source_slug)
 
-    serializer = NovelSourceSerializer(source, context={"request": request})
+    data = source_detail_for(request, novel, source)
     # Add novel info to the response
-    data = serializer.data
     data.update(
         {
             "novel_id": str(novel.id),
@@ -135,12 +136,8 @@ def chapter_content_by_number(request, novel_slug, source_slug, chapter_number):
             {"error": "Chapter content not available"}, status=status.HTTP_404_NOT_FOUND
         )
 
-    # Increment view count for the novel
-    view_count, created = NovelViewCount.objects.get_or_create(novel=novel)
-    view_count.increment()
-
-    # Increment weekly view count
-    WeeklyNovelView.increment_for_novel(novel)
+    # Count the view, written to the all-time and weekly view counts by the next flush
+    record_view(novel.id)
 
     serializer = ChapterContentSerializer(chapter)
     return Response(serializer.data)
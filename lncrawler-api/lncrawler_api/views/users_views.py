@@ -6,9 +6,9 @@ from django.shortcuts import get_object_or_404
 from django.core.paginator import Paginator
 
 from ..models.users_models import NovelBookmark, ReadingHistory
-from ..models.novels_models import Novel, NovelSimilarity
+from ..models.novels_models import Novel, NovelCard, NovelSimilarity
 from ..models.sources_models import NovelFromSource, Chapter
-from ..serializers.novels_serializers import BasicNovelSerializer
+from ..serializers.novels_serializers import NovelCardSerializer
 from ..serializers.users_serializers import DetailedReadingHistorySerializer
 from ..models.novels_models import NovelViewCount
 
@@ -57,12 +57,13 @@ def list_bookmarked_novels(request):
     
     # Get recommendations based on bookmarked novels
     recommendations = get_novel_recommendations(request.user, bookmarked_novels, max_recommendations=12)
-    recommendation_serializer = BasicNovelSerializer(recommendations, many=True, context={"request": request})
+    recommendation_serializer = NovelCardSerializer(recommendations, many=True, context={"request": request})
     
-    paginator = Paginator(bookmarked_novels, page_size)
+    bookmarked_cards = NovelCard.objects.filter(novel__bookmarked_by_users__user=request.user).order_by('title')
+    paginator = Paginator(bookmarked_cards, page_size)
     page_obj = paginator.get_page(page_number)
 
-    serializer = BasicNovelSerializer(page_obj, many=True, context={"request": request})
+    serializer = NovelCardSerializer(page_obj, many=True, context={"request": request})
 
     return Response(
         {
@@ -80,7 +81,7 @@ def get_novel_recommendations(user, bookmarked_novels, max_recommendations=12):
     Optimized version that reduces database queries and performs most calculations at DB level.
     """
     if not bookmarked_novels.exists():
-        return []
+        return NovelCard.objects.none()
 
     bookmarked_ids = list(bookmarked_novels.values_list('id', flat=True))
     
@@ -114,11 +115,11 @@ def get_novel_recommendations(user, bookmarked_novels, max_recommendations=12):
     # Now fetch all novels in a single query, preserving order efficiently
     from django.db.models import Case, When, IntegerField
     preserved_order = Case(
-        *[When(pk=pk, then=pos) for pos, pk in enumerate(recommended_ids)],
+        *[When(novel_id=pk, then=pos) for pos, pk in enumerate(recommended_ids)],
         output_field=IntegerField()
     )
     
-    recommendations = Novel.objects.filter(pk__in=recommended_ids).order_by(preserved_order)
+    recommendations = NovelCard.objects.filter(novel_id__in=recommended_ids).order_by(preserved_order)
     
     return recommendations
 
@@ -132,12 +133,14 @@ def list_reading_history(request):
     page_size = request.GET.get("page_size", 20)
 
     # Get novels with reading history for the current user
-    novels_with_history = Novel.objects.filter(reading_histories__user=request.user).order_by('-reading_histories__last_read_at')
+    cards_with_history = NovelCard.objects.filter(
+        novel__reading_histories__user=request.user
+    ).order_by('-novel__reading_histories__last_read_at')
     
-    paginator = Paginator(novels_with_history, page_size)
+    paginator = Paginator(cards_with_history, page_size)
     page_obj = paginator.get_page(page_number)
 
-    serializer = BasicNovelSerializer(page_obj, many=True, context={"request": request})
+    serializer = NovelCardSerializer(page_obj, many=True, context={"request": request})
 
     return Response(
         {
@@ -13,6 +13,9 @@ echo "Database is ready!"
 echo "Applying migrations..."
 python manage.py migrate --noinput
 
+echo "Creating cache tables..."
+python manage.py createcachetable
+
 # echo "Migration status after applying..."
 # python manage.py showmigrations
 
@@ -29,6 +32,9 @@ if [ "$DEBUG" = "True" ]; then
   # Use Django development server in debug mode
   python manage.py runserver 0.0.0.0:8000
 else
+  # The job progress streams (Server-Sent Events) are long lived, they are served by an ASGI process
+  # on port 8001 (see nginx-proxy) so that they do not hold the threads of the API workers
+  uvicorn api_project.asgi:application --host 0.0.0.0 --port 8001 --workers 1 &
   # Use Gunicorn for production
   gunicorn api_project.wsgi:application -c gunicorn.conf.py
 fi
@@ -1,5 +1,5 @@
 import { useState } from 'react';
-import { useParams, useNavigate } from 'react-router-dom';
+import { useParams, useNavigate, Link } from 'react-router-dom';
 import {
   Box,
   Typography,
@@ -10,7 +10,7 @@ import {
   Container
 } from '@mui/material';
 import { downloadService } from '@services/api';
-import { DownloadParams } from '@models/downloader_types';
+import { DownloadParams, ExistingNovel } from '@models/downloader_types';
 import DownloadStepper from './DownloadStepper';
 
 const DownloadForm = () => {
@@ -23,10 +23,11 @@ const DownloadForm = () => {
   
   const [loading, setLoading] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
+  const [existingNovel, setExistingNovel] = useState<ExistingNovel | null>(null);
+  // The library novel has a similar title, the user decides whether it is the same novel
+  const [similarNovel, setSimilarNovel] = useState<boolean>(false);
 
-  const handleSubmit = async (e: React.FormEvent) => {
-    e.preventDefault();
-    
+  const startDownload = async (force: boolean, acceptMatch: boolean = false) => {
     if (!jobId) return;
     
     setLoading(true);
@@ -35,13 +36,23 @@ const DownloadForm = () => {
     try {
       const downloadParams: DownloadParams = {
         novel_index: parseInt(novelIndex, 10),
-        source_index: parseInt(sourceIndex, 10)
+        source_index: parseInt(sourceIndex, 10),
+        force,
+        accept_match: acceptMatch
       };
       
       const response = await downloadService.startDownload(jobId, downloadParams);
       
-      if (response.status === 'success') {
-        navigate(`/download/status/${jobId}`);
+      if (response.status === 'success' && response.duplicate) {
+        // The library already has this novel from this source, nothing was downloaded
+        setExistingNovel(response.existing_novel);
+        setSimilarNovel(false);
+      } else if (response.status === 'success' && response.confirm_required) {
+        setExistingNovel(response.existing_novel);
+        setSimilarNovel(true);
+      } else if (response.status === 'success') {
+        // The download may have been attached to another job already downloading this novel
+        navigate(`/download/status/${response.job_id || jobId}`);
       } else {
         setError(response.message || 'Failed to start download');
       }
@@ -53,6 +64,11 @@ const DownloadForm = () => {
     }
   };
 
+  const handleSubmit = (e: React.FormEvent) => {
+    e.preventDefault();
+    startDownload(false);
+  };
+
   return (
     <Container maxWidth="md">
       <DownloadStepper activeStep="download" />
@@ -62,6 +78,39 @@ const DownloadForm = () => {
         </Typography>
         
         {error && <Alert severity="error" sx={{ mb: 2 }}>{error}</Alert>}
+
+        {existingNovel && (
+          <Alert
+            severity="info"
+            sx={{ mb: 2 }}
+            action={
+              <Box sx={{ display: 'flex', gap: 1 }}>
+                <Button
+                  color="inherit"
+                  size="small"
+                  component={Link}
+                  to={existingNovel.source_slug
+                    ? `/novels/${existingNovel.slug}/${existingNovel.source_slug}`
+                    : `/novels/${existingNovel.slug}`}
+                >
+                  Open
+                </Button>
+                {similarNovel && (
+                  <Button color="inherit" size="small" onClick={() => startDownload(false, true)} disabled={loading}>
+                    Add to it
+                  </Button>
+                )}
+                <Button color="inherit" size="small" onClick={() => startDownload(true)} disabled={loading}>
+                  {similarNovel ? 'New novel' : 'Download anyway'}
+                </Button>
+              </Box>
+            }
+          >
+            {similarNovel
+              ? `The library has a novel with a similar title: ${existingNovel.title}. Is it the same novel?`
+              : `${existingNovel.title} is already in the library from this source.`}
+          </Alert>
+        )}
         
         <Box component="form" onSubmit={handleSubmit}>
           <Typography variant="body1" sx={{ mb: 3 }}>
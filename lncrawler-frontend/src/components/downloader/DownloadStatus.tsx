@@ -49,19 +49,54 @@ const DownloadStatus = () => {
   };
 
   useEffect(() => {
+    if (!jobId) return;
     fetchStatus();
     
-    // Set up polling for status updates
-    const intervalId = setInterval(() => {
-      if (status?.download_completed) {
-        clearInterval(intervalId);
-        return;
+    // Status updates are pushed by the server, polling is only a fallback
+    let intervalId: ReturnType<typeof setInterval> | undefined;
+    const startPolling = () => {
+      if (!intervalId) {
+        intervalId = setInterval(fetchStatus, POLLING_INTERVAL);
       }
+    };
+    
+    if (typeof EventSource === 'undefined') {
+      startPolling();
+      return () => clearInterval(intervalId);
+    }
+    
+    const source = new EventSource(downloadService.getJobEventsUrl(jobId), { withCredentials: true });
+    
+    source.addEventListener('progress', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      setStatus(prev => prev && {
+        ...prev,
+        progress: data.progress,
+        total_chapters: data.total_items,
+        progress_percentage: data.progress_percentage,
+      });
+    });
+    
+    source.addEventListener('status', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      // Transitions carry more than progress (selected novel, results), reload the full status
       fetchStatus();
-    }, POLLING_INTERVAL);
+      if (['download_completed', 'failed', 'not_found'].includes(data.job_status)) {
+        source.close();
+      }
+    });
+    
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        startPolling();
+      }
+    };
     
-    return () => clearInterval(intervalId);
-  }, [jobId, status?.download_completed]);
+    return () => {
+      source.close();
+      clearInterval(intervalId);
+    };
+  }, [jobId]);
 
   if (loading && !status) {
     return (
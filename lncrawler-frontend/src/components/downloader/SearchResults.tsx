@@ -1,5 +1,5 @@
-import { useState, useEffect } from 'react';
-import { useParams, Link } from 'react-router-dom';
+import { useState, useEffect, useRef } from 'react';
+import { useParams, Link, useNavigate } from 'react-router-dom';
 import {
   Box,
   Typography,
@@ -15,8 +15,8 @@ import {
   LinearProgress,
   Container
 } from '@mui/material';
-import { searchService } from '@services/api';
-import { SearchStatus, SearchResults as SearchResultsType } from '@models/downloader_types';
+import { searchService, downloadService } from '@services/api';
+import { SearchStatus, SearchResults as SearchResultsType, PartialSourceResult } from '@models/downloader_types';
 import DownloadStepper from './DownloadStepper';
 
 const POLLING_INTERVAL = 2000; // 2 seconds
@@ -27,6 +27,44 @@ const SearchResults = () => {
   const [results, setResults] = useState<SearchResultsType | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  // Results of the sources that already answered, shown while the search is running
+  const [partialSources, setPartialSources] = useState<PartialSourceResult[]>([]);
+  const [directDownloading, setDirectDownloading] = useState<string | null>(null);
+  const cursorRef = useRef(0);
+  const navigate = useNavigate();
+
+  // Fetch only the source results stored since the last call
+  const fetchPartialResults = async () => {
+    if (!jobId) return;
+
+    try {
+      const partial = await searchService.getPartialSearchResults(jobId, cursorRef.current);
+      cursorRef.current = partial.cursor;
+      if (partial.sources && partial.sources.length > 0) {
+        setPartialSources(prev => [...prev, ...partial.sources]);
+      }
+    } catch (err) {
+      console.error('Error fetching partial search results:', err);
+    }
+  };
+
+  // A novel found before the end of the search can be downloaded right away from its URL
+  const handleDirectDownload = async (url: string) => {
+    setDirectDownloading(url);
+    try {
+      const response = await downloadService.startDirectDownload(url);
+      if (response.status === 'success' && response.job_id) {
+        navigate(`/download/status/${response.job_id}`);
+      } else {
+        setError(response.message || 'Failed to start download');
+      }
+    } catch (err) {
+      console.error('Error starting download:', err);
+      setError('Failed to start download. Please try again later.');
+    } finally {
+      setDirectDownloading(null);
+    }
+  };
 
   // Function to check search status
   const checkSearchStatus = async () => {
@@ -40,6 +78,8 @@ const SearchResults = () => {
         // If search is complete, get the results
         const resultsResponse = await searchService.getSearchResults(jobId);
         setResults(resultsResponse);
+      } else if (!statusResponse.search_completed) {
+        await fetchPartialResults();
       }
       
       // Set loading to false after the first successful status check.
@@ -63,6 +103,8 @@ const SearchResults = () => {
       setStatus(null);  // Reset status
       setResults(null); // Reset results
       setError(null);   // Reset error
+      setPartialSources([]);
+      cursorRef.current = 0;
       checkSearchStatus();
     }
     // Intentionally not depending on checkSearchStatus to avoid re-runs from its definition changing
@@ -144,6 +186,28 @@ const SearchResults = () => {
           <Typography variant="body2" color="text.secondary">
             Please wait while we search for your novel. This may take a few moments.
           </Typography>
+
+          {partialSources.some(source => source.results.length > 0) && (
+            <Card sx={{ mt: 3, width: '100%' }}>
+              <CardContent>
+                <Typography variant="h6">Found so far</Typography>
+                <List>
+                  {partialSources.flatMap(source => source.results).map((novel, novelIndex) => (
+                    <Box key={`partial-${novelIndex}`}>
+                      {novelIndex > 0 && <Divider />}
+                      <ListItemButton
+                        onClick={() => handleDirectDownload(novel.url)}
+                        disabled={directDownloading !== null}
+                      >
+                        <ListItemText primary={novel.title} secondary={novel.url} />
+                        {directDownloading === novel.url && <CircularProgress size={20} />}
+                      </ListItemButton>
+                    </Box>
+                  ))}
+                </List>
+              </CardContent>
+            </Card>
+          )}
           
           <Button 
             variant="outlined" 
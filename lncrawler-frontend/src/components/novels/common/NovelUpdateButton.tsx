@@ -33,7 +33,7 @@ const NovelUpdateButton: React.FC<NovelUpdateButtonProps> = ({ sourceUrl, novelT
     setIsLoading(true);
     setError(null);
     try {
-      const response = await downloadService.startDirectDownload(sourceUrl);
+      const response = await downloadService.startDirectDownload(sourceUrl, true);
       if (response.job_id) {
         setUpdateJobId(response.job_id);
         setIsPolling(true);
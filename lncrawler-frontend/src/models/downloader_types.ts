@@ -39,16 +39,50 @@ export interface SearchResults {
   results: SearchResult[];
 }
 
+export interface PartialSourceResult {
+  cursor: number;
+  source_url: string;
+  results: { title: string; url: string; info: string }[];
+  error: string | null;
+}
+
+export interface PartialSearchResults {
+  status: string;
+  message?: string | null;
+  search_completed: boolean;
+  cursor: number;
+  progress: number;
+  total_items: number;
+  sources: PartialSourceResult[];
+}
+
 // Download-related types
 export interface DownloadParams {
   novel_index: number;
   source_index: number;
+  // Download even if the library already has the novel from this source
+  force?: boolean;
+  // Add the source to the similar library novel returned with confirm_required
+  accept_match?: boolean;
+}
+
+// Library novel a download was matched with by title
+export interface ExistingNovel {
+  slug: string;
+  title: string;
+  similarity: number;
+  source_slug: string | null;
 }
 
 export interface DownloadResponse {
   status: string;
   message: string;
-  job_id: string;
+  job_id?: string;
+  // Set when the library already has the novel from this source, nothing was downloaded
+  duplicate?: boolean;
+  // Set when the library has a novel with a similar title, nothing was downloaded until the user decides
+  confirm_required?: boolean;
+  existing_novel?: ExistingNovel;
 }
 
 export interface DownloadStatus {
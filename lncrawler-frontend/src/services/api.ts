@@ -1,6 +1,6 @@
 import axios from 'axios';
 
-const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8185';
+export const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8185';
 
 // More robust function to get CSRF token from cookies
 const getCsrfToken = (): string | null => {
@@ -1,4 +1,4 @@
-import api from './api';
+import api, { API_BASE_URL } from './api';
 
 export const downloadService = {
   startDownload: async (
@@ -6,6 +6,8 @@ export const downloadService = {
     params: { 
       novel_index: number; 
       source_index: number;
+      force?: boolean;
+      accept_match?: boolean;
     }
   ) => {
     const response = await api.post(`/downloader/download/start/${jobId}/`, params);
@@ -13,8 +15,9 @@ export const downloadService = {
   },
   
   // New method for direct URL downloads
-  startDirectDownload: async (novelUrl: string) => {
-    const response = await api.post('/downloader/download/start-direct/', { novel_url: novelUrl });
+  // With update set, only the chapters missing from the library are fetched
+  startDirectDownload: async (novelUrl: string, update: boolean = false) => {
+    const response = await api.post('/downloader/download/start-direct/', { novel_url: novelUrl, update });
     return response.data;
   },
   
@@ -27,4 +30,7 @@ export const downloadService = {
     const response = await api.get(`/downloader/download/results/${jobId}/`);
     return response.data;
   },
+
+  // Server-Sent Events stream of the job status and progress
+  getJobEventsUrl: (jobId: string) => `${API_BASE_URL}/downloader/jobs/${jobId}/events/`,
 };
@@ -6,8 +6,9 @@ export const jobService = {
     return response.data;
   },
   
-  listJobs: async () => {
-    const response = await api.get('/downloader/jobs/');
+  // Newest jobs first, pass the next_cursor of a page to get the following one
+  listJobs: async (cursor?: string, limit?: number) => {
+    const response = await api.get('/downloader/jobs/', { params: { cursor, limit } });
     return response.data;
   },
   
@@ -23,4 +23,10 @@ export const searchService = {
     const response = await api.get(`/downloader/search/results/${jobId}/`);
     return response.data;
   },
+
+  // Results of the sources that answered after the cursor, available while the search is running
+  getPartialSearchResults: async (jobId: string, cursor: number) => {
+    const response = await api.get(`/downloader/search/results/${jobId}/`, { params: { cursor } });
+    return response.data;
+  },
 };